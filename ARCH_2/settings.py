@@ -12,12 +12,20 @@ https://docs.djangoproject.com/en/5.1/ref/settings/
 
 from pathlib import Path
 import os
-from dotenv import load_dotenv
-load_dotenv()
 
 # Build paths inside the project like this: BASE_DIR / 'subdir'.
 BASE_DIR = Path(__file__).resolve().parent.parent
 
+# Variables from a .env file next to manage.py; python-dotenv is only
+# imported when the file exists.
+if (BASE_DIR / ".env").is_file():
+    from dotenv import load_dotenv
+    load_dotenv(BASE_DIR / ".env")
+
+# "fast" leaves out the development-only apps for quicker cold starts of
+# servers and manage.py commands in pipelines; "full" loads everything.
+STARTUP_PROFILE = os.getenv("DJANGO_STARTUP_PROFILE", "full")
+
 
 # Quick-start development settings - unsuitable for production
 # See https://docs.djangoproject.com/en/5.1/howto/deployment/checklist/
@@ -42,21 +50,32 @@ INSTALLED_APPS = [
     "django.contrib.sessions",
     "django.contrib.messages",
     "django.contrib.staticfiles",
-    'django.contrib.sites',
     'registration_app',
-    'django_extensions',
     'django.core.mail',
     'shop',
 
 ]
 
+# Development-only apps: django-extensions (shell_plus, show_urls, ...) and
+# the sites framework, which the shop itself does not use (see DOMAIN).
+DEV_APPS = [
+    'django.contrib.sites',
+    'django_extensions',
+]
+if STARTUP_PROFILE != "fast":
+    INSTALLED_APPS += DEV_APPS
+
 MIDDLEWARE = [
+    "shop.staticfiles.StaticFilesMiddleware",
+    "shop.metrics.MetricsMiddleware",
     "django.middleware.security.SecurityMiddleware",
     "django.contrib.sessions.middleware.SessionMiddleware",
     "django.middleware.common.CommonMiddleware",
     "django.middleware.csrf.CsrfViewMiddleware",
-    "django.contrib.auth.middleware.AuthenticationMiddleware",
+    "registration_app.middleware.AuthenticationMiddleware",
+    "shop.profiler.SamplingProfilerMiddleware",
     "django.contrib.messages.middleware.MessageMiddleware",
+    "shop.wizard.WizardStateMiddleware",
     "django.middleware.clickjacking.XFrameOptionsMiddleware",
 ]
 
@@ -88,6 +107,14 @@ STATICFILES_DIRS = [
     os.path.join(BASE_DIR, 'static'),
 ]
 
+# collectstatic writes content-hashed names, a manifest and gzip copies,
+# served with long-lived caching by shop.staticfiles.StaticFilesMiddleware.
+STORAGES = {
+    "default": {"BACKEND": "django.core.files.storage.FileSystemStorage"},
+    "staticfiles": {"BACKEND": "shop.staticfiles.CompressedManifestStaticFilesStorage"},
+}
+SHOP_STATIC_MAX_AGE = 60  # seconds browsers may cache static files without a hashed name
+
 # Database
 # https://docs.djangoproject.com/en/5.1/ref/settings/#databases
 
@@ -95,9 +122,34 @@ DATABASES = {
     "default": {
         "ENGINE": "django.db.backends.sqlite3",
         "NAME": BASE_DIR / "db.sqlite3",
+        # Keep connections open between requests and check them before reuse.
+        # Set DJANGO_CONN_MAX_AGE=0 when serving over ASGI, where every request
+        # runs its database work in a fresh thread.
+        "CONN_MAX_AGE": int(os.getenv("DJANGO_CONN_MAX_AGE", "60")),
+        "CONN_HEALTH_CHECKS": True,
+        # Take the write lock when a transaction starts, so concurrent writers
+        # (e.g. fulfillment worker threads) wait for it instead of failing
+        # with "database is locked" when upgrading a read transaction.
+        "OPTIONS": {"transaction_mode": "IMMEDIATE"},
     }
 }
 
+# Threads that may hold a checked-out connection at once (see shop/singleton.py)
+SHOP_DB_POOL_SIZE = int(os.getenv("SHOP_DB_POOL_SIZE", "10"))
+SHOP_DB_POOL_TIMEOUT = 30  # seconds to wait for a free connection
+
+
+# Authentication
+# Logged-in users are loaded from a cache instead of auth_user on every
+# request (see registration_app/backends.py). It is the only backend, so a
+# failed login hashes the password once; sessions created with ModelBackend
+# are switched to it by registration_app.middleware.AuthenticationMiddleware.
+AUTHENTICATION_BACKENDS = [
+    'registration_app.backends.CachedModelBackend',
+]
+AUTH_USER_CACHE_ALIAS = 'default'
+AUTH_USER_CACHE_TIMEOUT = 60  # seconds; bounds staleness in other processes with a per-process cache
+
 
 # Password validation
 # https://docs.djangoproject.com/en/5.1/ref/settings/#auth-password-validators
@@ -152,7 +204,81 @@ DEFAULT_AUTO_FIELD = "django.db.models.BigAutoField"
 # Session settings
 SESSION_ENGINE = 'django.contrib.sessions.backends.db'  # Default, uses database
 SESSION_COOKIE_AGE = 1209600  # 2 weeks, in seconds
-SESSION_SAVE_EVERY_REQUEST = True  # Save the session data on every request
+SESSION_SAVE_EVERY_REQUEST = False  # Only write the session when its data changes (e.g. login/logout)
 
 
 SITE_ID = 1
+
+
+# Seconds between catalog version checks in each worker (see shop/catalog.py)
+SHOP_CATALOG_CHECK_INTERVAL = 5
+
+# Where the shop wizard keeps the in-progress configuration: 'cookie' (signed
+# cookie, no server writes), 'cache' (SHOP_WIZARD_CACHE_ALIAS) or 'session'.
+SHOP_WIZARD_STORE = 'cookie'
+SHOP_WIZARD_CACHE_ALIAS = 'default'
+SHOP_WIZARD_MAX_AGE = 60 * 60 * 24  # 1 day, in seconds
+
+# Cache holding rendered order page fragments (see shop/fragments.py)
+SHOP_FRAGMENT_CACHE_ALIAS = 'default'
+SHOP_FRAGMENT_CACHE_TIMEOUT = 60 * 60  # 1 hour, in seconds
+
+# Rows per INSERT statement in the bulk order methods of shop/facade.py
+SHOP_BULK_BATCH_SIZE = 500
+
+# Route the shop URLs to the async views (shop/async_views.py) when serving over ASGI
+SHOP_ASYNC_VIEWS = os.getenv("SHOP_ASYNC_VIEWS", "").lower() in ("1", "true", "yes")
+
+# Email (order confirmations are sent by the fulfillment worker). Printed to
+# the console unless DJANGO_EMAIL_BACKEND selects e.g. the SMTP backend.
+EMAIL_BACKEND = os.getenv("DJANGO_EMAIL_BACKEND", "django.core.mail.backends.console.EmailBackend")
+EMAIL_HOST = os.getenv("SMTP_HOST", "localhost")
+EMAIL_PORT = int(os.getenv("SMTP_PORT", "25"))
+
+# Order fulfillment worker (see shop/fulfillment.py, run with `manage.py fulfillment_worker`)
+SHOP_FULFILLMENT_THREADS = int(os.getenv("SHOP_FULFILLMENT_THREADS", "4"))
+SHOP_FULFILLMENT_BATCH_SIZE = 20  # jobs claimed per poll
+SHOP_FULFILLMENT_POLL_INTERVAL = 1  # seconds to wait when no job is due
+SHOP_FULFILLMENT_LEASE = 60  # seconds before a claimed job may be taken over by another worker
+SHOP_FULFILLMENT_MAX_ATTEMPTS = 5
+SHOP_FULFILLMENT_RETRY_DELAY = 2  # seconds before the first retry, doubled on each attempt
+SHOP_FULFILLMENT_MAX_RETRY_DELAY = 300  # seconds
+
+# Rows per transaction of the retention command (see shop/retention.py)
+SHOP_RETENTION_CHUNK_SIZE = 500
+
+# Per-view metrics served at /metrics to staff users (see shop/metrics.py).
+# Scrapers authenticate with "Authorization: Bearer <SHOP_METRICS_TOKEN>".
+SHOP_METRICS_TOKEN = os.getenv("SHOP_METRICS_TOKEN", "")
+SHOP_METRICS_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)  # seconds
+
+# Sampling profiler (see shop/profiler.py): profiles this fraction of the
+# requests, plus staff requests sending the header. Collapsed stack files
+# for flamegraph tools are written to SHOP_PROFILER_DIR.
+SHOP_PROFILER_SAMPLE_RATE = float(os.getenv("SHOP_PROFILER_SAMPLE_RATE", "0"))
+SHOP_PROFILER_HEADER = "X-Profile"
+SHOP_PROFILER_INTERVAL = 0.005  # seconds between stack samples
+SHOP_PROFILER_DIR = os.getenv("SHOP_PROFILER_DIR", str(BASE_DIR / "profiles"))
+SHOP_PROFILER_MAX_FILES = 200  # newest profiles kept on disk
+
+# Pre-forking server (see shop/server.py, run with `manage.py serve`)
+SHOP_SERVE_WORKERS = int(os.getenv("SHOP_SERVE_WORKERS", "0"))  # 0: one per CPU
+SHOP_SERVE_THREADS = int(os.getenv("SHOP_SERVE_THREADS", "1"))  # request threads per worker
+SHOP_SERVE_MAX_REQUESTS = 1000  # requests before a worker is replaced, 0 for never
+SHOP_SERVE_MAX_REQUESTS_JITTER = 100  # random extra requests, so workers are not replaced together
+SHOP_SERVE_TIMEOUT = 30  # seconds without heartbeat before a worker is killed
+SHOP_SERVE_GRACEFUL_TIMEOUT = 30  # seconds workers get to finish their requests on stop or reload
+
+# Median milliseconds from process start to the first response allowed by
+# `manage.py benchmark startup` before it fails
+SHOP_STARTUP_BUDGET_MS = int(os.getenv("SHOP_STARTUP_BUDGET_MS", "1500"))
+
+# Streaming order export at /shop/export/orders/ and `manage.py export_orders`
+# (see shop/export.py), for staff users and partners sending
+# "Authorization: Bearer <SHOP_EXPORT_TOKEN>".
+SHOP_EXPORT_TOKEN = os.getenv("SHOP_EXPORT_TOKEN", "")
+SHOP_EXPORT_CHUNK_SIZE = 2000  # orders read per query
+
+# Admin lists of computers and orders are counted exactly up to this many
+# rows; larger tables use the database row estimate (see shop/pagination.py).
+SHOP_ADMIN_COUNT_LIMIT = 10_000
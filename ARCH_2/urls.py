@@ -17,11 +17,12 @@ Including another URLconf
 
 from django.contrib import admin
 from django.urls import path, include
-from .views import home
+from .views import home, metrics
 
 urlpatterns = [
     path("admin/", admin.site.urls),
     path('accounts/', include('registration_app.urls')),
     path('shop/', include('shop.urls')),
+    path("metrics", metrics, name="metrics"),
     path("",home),
 ]
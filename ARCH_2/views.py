@@ -1,8 +1,27 @@
+import hmac
+
+from django.conf import settings
+from django.http import HttpResponse, HttpResponseForbidden
 from django.shortcuts import render
 from django.views.decorators.http import require_safe
 
+from shop.metrics import render_metrics
+
 
 @require_safe
 def home(request):
     return render(request, 'base.html')
 
+
+@require_safe
+def metrics(request):
+    """
+    Per-view metrics in the Prometheus text format, for staff users or
+    scrapers sending ``Authorization: Bearer <SHOP_METRICS_TOKEN>``.
+    """
+    token = getattr(settings, 'SHOP_METRICS_TOKEN', '')
+    authorization = request.headers.get('Authorization', '')
+    scraper = bool(token) and hmac.compare_digest(authorization, f'Bearer {token}')
+    if not scraper and not (request.user.is_active and request.user.is_staff):
+        return HttpResponseForbidden()
+    return HttpResponse(render_metrics(), content_type='text/plain; version=0.0.4; charset=utf-8')
@@ -6,3 +6,8 @@ class RegistrationConfig(AppConfig):
     """Configuration class for the registration app."""
     default_auto_field = "django.db.models.BigAutoField"
     name = "registration_app"
+
+    def ready(self):
+        """Connect the user receivers (cached users, normalized emails)."""
+        from .signals import connect_signals
+        connect_signals()
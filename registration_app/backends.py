@@ -0,0 +1,47 @@
+from django.conf import settings
+from django.contrib.auth.backends import ModelBackend
+from django.core.cache import caches
+
+
+CACHED_BACKEND = 'registration_app.backends.CachedModelBackend'
+# Stored in sessions created before CachedModelBackend was introduced.
+LEGACY_BACKEND = 'django.contrib.auth.backends.ModelBackend'
+
+
+class CachedModelBackend(ModelBackend):
+    """
+    ModelBackend that loads the user of a session from a cache, so requests
+    of logged-in users need no auth_user query.
+
+    Snapshots are kept for AUTH_USER_CACHE_TIMEOUT seconds and dropped when
+    the user is saved (password change, deactivation, last_login), deleted
+    or logs out. With a per-process cache, other processes only see such
+    changes once their snapshot expires; use a shared cache backend to
+    apply them everywhere at once. Queryset update() calls bypass the
+    invalidation.
+    """
+
+    def get_user(self, user_id):
+        """Return the active user with the given id, from the cache when possible."""
+        cache = _cache()
+        key = user_cache_key(user_id)
+        user = cache.get(key)
+        if user is None:
+            user = super().get_user(user_id)
+            if user is not None:
+                cache.set(key, user, getattr(settings, 'AUTH_USER_CACHE_TIMEOUT', 60))
+        return user
+
+
+def user_cache_key(user_id):
+    """Return the cache key of a user snapshot."""
+    return f'auth:user:{user_id}'
+
+
+def invalidate_cached_user(user_id):
+    """Drop the cached snapshot of a user."""
+    _cache().delete(user_cache_key(user_id))
+
+
+def _cache():
+    return caches[getattr(settings, 'AUTH_USER_CACHE_ALIAS', 'default')]
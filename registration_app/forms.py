@@ -1,6 +1,7 @@
 from django import forms
 from django.contrib.auth.models import User
 from django.contrib.auth.forms import UserCreationForm
+from .models import NormalizedEmail
 
 
 class RegistrationForm(UserCreationForm):
@@ -15,9 +16,11 @@ class RegistrationForm(UserCreationForm):
         model = User
         fields = ('username', 'email', 'password1', 'password2')
 
+    duplicate_email_message = "This email is already registered."
+
     def clean_email(self):
-        """Validate the email field to ensure it is unique."""
+        """Validate the email field to ensure it is unique, ignoring case."""
         email = self.cleaned_data.get('email')
-        if User.objects.filter(email=email).exists():
-            raise forms.ValidationError("This email is already registered.")
+        if NormalizedEmail.is_taken(email):
+            raise forms.ValidationError(self.duplicate_email_message)
         return email
\ No newline at end of file
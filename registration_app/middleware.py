@@ -0,0 +1,24 @@
+from django.conf import settings
+from django.contrib.auth import BACKEND_SESSION_KEY
+from django.contrib.auth.middleware import AuthenticationMiddleware as DjangoAuthenticationMiddleware
+
+from .backends import CACHED_BACKEND, LEGACY_BACKEND
+
+
+class AuthenticationMiddleware(DjangoAuthenticationMiddleware):
+    """
+    AuthenticationMiddleware that keeps sessions created with ModelBackend
+    logged in after it was dropped from AUTHENTICATION_BACKENDS.
+
+    Only backends listed in AUTHENTICATION_BACKENDS can load the user of a
+    session, and listing ModelBackend next to CachedModelBackend would make
+    every failed login hash the password twice. Such sessions are switched
+    to CachedModelBackend instead, once, on their next request.
+    """
+
+    def process_request(self, request):
+        session = getattr(request, 'session', None)
+        if (session is not None and session.get(BACKEND_SESSION_KEY) == LEGACY_BACKEND
+                and LEGACY_BACKEND not in settings.AUTHENTICATION_BACKENDS):
+            session[BACKEND_SESSION_KEY] = CACHED_BACKEND
+        super().process_request(request)
@@ -0,0 +1,41 @@
+# Generated by Django 5.1.7 on 2026-10-18 11:45
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+def backfill_normalized_emails(apps, schema_editor):
+    """
+    Store the normalized email of existing users. When several users share an
+    address up to case, only the oldest account keeps it.
+    """
+    User = apps.get_model('auth', 'User')
+    NormalizedEmail = apps.get_model('registration_app', 'NormalizedEmail')
+    seen = set()
+    rows = []
+    for user_id, email in User.objects.order_by('pk').values_list('pk', 'email').iterator():
+        email = (email or '').strip().lower()
+        if email and email not in seen:
+            seen.add(email)
+            rows.append(NormalizedEmail(user_id=user_id, email=email))
+    NormalizedEmail.objects.bulk_create(rows, batch_size=1000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('auth', '0012_alter_user_first_name_max_length'),
+        ('registration_app', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='NormalizedEmail',
+            fields=[
+                ('user', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='normalized_email', serialize=False, to=settings.AUTH_USER_MODEL)),
+                ('email', models.CharField(max_length=254, unique=True)),
+            ],
+        ),
+        migrations.RunPython(backfill_normalized_emails, migrations.RunPython.noop),
+    ]
@@ -1,9 +1,20 @@
+import logging
 from django.db import models
 from django.contrib.auth.models import User
 import uuid
 from django.utils import timezone
 from datetime import timedelta
 
+logger = logging.getLogger(__name__)
+
+
+class ConfirmationTokenQuerySet(models.QuerySet):
+    """QuerySet for confirmation tokens."""
+
+    def valid(self):
+        """Tokens that are unused and not yet expired (see is_valid)."""
+        return self.filter(is_used=False, expires_at__gt=timezone.now())
+
 
 class ConfirmationToken(models.Model):
     """Confirmation token for user registration."""
@@ -14,6 +25,17 @@ class ConfirmationToken(models.Model):
     expires_at = models.DateTimeField()
     is_used = models.BooleanField(default=False)
 
+    objects = ConfirmationTokenQuerySet.as_manager()
+
+    class Meta:
+        indexes = [
+            # Partial indexes: only unused tokens are ever looked up by expiry.
+            models.Index(fields=['expires_at'], condition=models.Q(is_used=False),
+                         name='token_valid_expires_idx'),
+            models.Index(fields=['user', 'expires_at'], condition=models.Q(is_used=False),
+                         name='token_user_valid_idx'),
+        ]
+
     def save(self, *args, **kwargs):
         """Override save method to set expiration date."""
         if not self.pk:
@@ -26,4 +48,52 @@ class ConfirmationToken(models.Model):
 
     def __str__(self):
         """String representation of the token."""
-        return f"Token for {self.user.username}"
\ No newline at end of file
+        return f"Token for {self.user.username}"
+
+
+def normalize_email(email):
+    """Return the form of an email address used for uniqueness checks."""
+    return (email or '').strip().lower()
+
+
+class NormalizedEmail(models.Model):
+    """
+    Lowercased email address of a user, kept in sync with User.email on save.
+    The unique index makes registration checks an index lookup and rejects
+    case-variant duplicates at the database level, even under races.
+    Users without an email address have no row, and neither have users whose
+    address another user already holds: the legacy case-variant duplicates
+    the backfill migration skipped.
+    """
+
+    user = models.OneToOneField(User, on_delete=models.CASCADE, primary_key=True, related_name='normalized_email')
+    email = models.CharField(max_length=254, unique=True)
+
+    @classmethod
+    def is_taken(cls, email, exclude_user=None):
+        """Check whether another user already registered this email address."""
+        taken = cls.objects.filter(email=normalize_email(email))
+        if exclude_user is not None:
+            taken = taken.exclude(user=exclude_user)
+        return taken.exists()
+
+    @classmethod
+    def sync(cls, user):
+        """
+        Store the normalized email of a saved user, or drop it when empty or
+        held by another user. Returns whether the user has a row.
+        """
+        email = normalize_email(user.email)
+        if email and cls.is_taken(email, exclude_user=user):
+            logger.warning('User %s shares the email address of another user; not storing it.', user.pk)
+            email = ''
+        if not email:
+            cls.objects.filter(user=user).delete()
+            return False
+        if not cls.objects.filter(user=user).update(email=email):
+            cls.objects.create(user=user, email=email)
+        return True
+
+    def __str__(self):
+        """String representation of the normalized email."""
+        return self.email
@@ -1,5 +1,7 @@
 from django.contrib.auth import authenticate, login
 from django.contrib.auth.models import User
+from django.db import IntegrityError, transaction
+from .models import NormalizedEmail
 
 
 class UserAuthService:
@@ -28,7 +30,22 @@ class UserAuthService:
     def register_user(form):
         """
         Register a new user from a valid registration form.
-
-
+        Returns None and adds a form error when the email address was
+        registered concurrently: either the unique index on NormalizedEmail
+        rejects it, or the other registration committed first and the new
+        user got no NormalizedEmail row. The password is hashed before the
+        transaction starts, so the write lock is not held while hashing.
         """
-        return form.save()
\ No newline at end of file
+        user = form.save(commit=False)
+        try:
+            with transaction.atomic():
+                user.save()
+                form.save_m2m()
+                if NormalizedEmail.is_taken(user.email, exclude_user=user):
+                    raise IntegrityError('Email address registered concurrently.')
+                return user
+        except IntegrityError:
+            if not NormalizedEmail.is_taken(form.cleaned_data['email']):
+                raise
+            form.add_error('email', form.duplicate_email_message)
+            return None
\ No newline at end of file
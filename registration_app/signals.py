@@ -0,0 +1,32 @@
+from django.contrib.auth import get_user_model
+from django.contrib.auth.signals import user_logged_out
+from django.db.models.signals import post_delete, post_save
+
+from .backends import invalidate_cached_user
+from .models import NormalizedEmail
+
+
+def user_saved(sender, instance, update_fields=None, **kwargs):
+    """Drop the cached user and keep the normalized email in sync."""
+    invalidate_cached_user(instance.pk)
+    if update_fields is None or 'email' in update_fields:
+        NormalizedEmail.sync(instance)
+
+
+def user_deleted(sender, instance, **kwargs):
+    """Drop the cached user."""
+    invalidate_cached_user(instance.pk)
+
+
+def user_logged_out_receiver(sender, request, user, **kwargs):
+    """Drop the cached user on logout."""
+    if user is not None:
+        invalidate_cached_user(user.pk)
+
+
+def connect_signals():
+    """Connect the user receivers; called from RegistrationConfig.ready()."""
+    user_model = get_user_model()
+    post_save.connect(user_saved, sender=user_model, dispatch_uid='registration_app.signals.user_saved')
+    post_delete.connect(user_deleted, sender=user_model, dispatch_uid='registration_app.signals.user_deleted')
+    user_logged_out.connect(user_logged_out_receiver, dispatch_uid='registration_app.signals.user_logged_out')
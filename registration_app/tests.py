@@ -1,8 +1,19 @@
+from datetime import timedelta
+from unittest import skipUnless
 from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+from django.core.cache import cache
+from django.db import connection
+from django.utils import timezone
 from django.urls import reverse
 from django.contrib.auth.models import User
 from unittest.mock import patch
-from django.contrib.auth import get_user_model
+from django.contrib.auth import BACKEND_SESSION_KEY, get_user_model
+from shop.utils.query_plan import QueryPlanAssertions
+from .backends import user_cache_key
+from .forms import RegistrationForm
+from .models import ConfirmationToken, NormalizedEmail, normalize_email
+from .services import UserAuthService
 
 
 class AuthViewsTest(TestCase):
@@ -87,3 +98,158 @@ class AuthViewsTest(TestCase):
 
         self.assertTemplateUsed(response, 'registration_app/register.html')
         mock_get_form.assert_called_once()
+
+
+@skipUnless(connection.vendor == 'sqlite', 'EXPLAIN QUERY PLAN checks need SQLite.')
+class ConfirmationTokenTests(QueryPlanAssertions, TestCase):
+
+    def setUp(self):
+        self.user = User.objects.create_user(username='tokenuser', password='securepass123')
+        self.token = ConfirmationToken.objects.create(user=self.user)
+        ConfirmationToken.objects.create(user=self.user, is_used=True)
+        expired = ConfirmationToken.objects.create(user=self.user)
+        ConfirmationToken.objects.filter(pk=expired.pk).update(expires_at=timezone.now() - timedelta(hours=1))
+
+    def test_valid_matches_is_valid(self):
+        valid = list(ConfirmationToken.objects.valid())
+        self.assertEqual(valid, [self.token])
+        self.assertEqual(
+            [token for token in ConfirmationToken.objects.all() if token.is_valid()], valid
+        )
+
+    def test_validity_checks_use_partial_indexes(self):
+        plan = self.assertUsesIndexes(ConfirmationToken.objects.valid())
+        self.assertTrue(any('token_valid_expires_idx' in line for line in plan), plan)
+        plan = self.assertUsesIndexes(ConfirmationToken.objects.valid().filter(user=self.user))
+        self.assertTrue(any('token_user_valid_idx' in line for line in plan), plan)
+        self.assertUsesIndexes(ConfirmationToken.objects.valid().filter(token=self.token.token))
+
+
+class CachedModelBackendTests(TestCase):
+
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user(username='cacheduser', password='securepass123')
+        self.client.login(username='cacheduser', password='securepass123')
+        self.index_url = reverse('index')
+
+    def user_queries(self):
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(self.index_url)
+        self.assertEqual(response.status_code, 200)
+        return [query['sql'] for query in queries if '"auth_user"' in query['sql']]
+
+    def test_logged_in_requests_skip_the_user_query(self):
+        self.assertEqual(len(self.user_queries()), 1)
+        self.assertEqual(self.user_queries(), [])
+        self.assertEqual(self.client.session[BACKEND_SESSION_KEY], 'registration_app.backends.CachedModelBackend')
+
+    def test_failed_login_checks_the_password_once(self):
+        with patch('django.contrib.auth.backends.ModelBackend.authenticate', autospec=True,
+                   return_value=None) as backend_authenticate:
+            self.assertIsNone(UserAuthService.authenticate_user('nobody', 'wrongpass'))
+        self.assertEqual(backend_authenticate.call_count, 1)
+
+    def test_legacy_model_backend_sessions_stay_logged_in(self):
+        client = self.client_class()
+        client.force_login(self.user, backend='django.contrib.auth.backends.ModelBackend')
+        self.assertEqual(client.get(self.index_url).status_code, 200)
+        self.assertEqual(client.session[BACKEND_SESSION_KEY], 'registration_app.backends.CachedModelBackend')
+
+    def test_password_change_logs_out_other_sessions(self):
+        self.user_queries()
+        self.user.set_password('changedpass456')
+        self.user.save()
+        response = self.client.get(self.index_url)
+        self.assertRedirects(response, f"{reverse('registration_app:login')}?next={self.index_url}",
+                             fetch_redirect_response=False)
+
+    def test_deactivation_and_deletion_take_effect_immediately(self):
+        self.user_queries()
+        self.user.is_active = False
+        self.user.save()
+        self.assertEqual(self.client.get(self.index_url).status_code, 302)
+        self.assertIsNone(cache.get(user_cache_key(self.user.pk)))
+
+        self.user.is_active = True
+        self.user.save()
+        self.user_queries()
+        self.user.delete()
+        self.assertIsNone(cache.get(user_cache_key(self.user.pk)))
+
+    def test_logout_drops_the_snapshot(self):
+        self.user_queries()
+        self.assertIsNotNone(cache.get(user_cache_key(self.user.pk)))
+        self.client.get(reverse('registration_app:logout'))
+        self.assertIsNone(cache.get(user_cache_key(self.user.pk)))
+
+
+class NormalizedEmailTests(QueryPlanAssertions, TestCase):
+
+    def setUp(self):
+        self.user = User.objects.create_user(username='emailuser', password='securepass123',
+                                             email='Someone@Example.com')
+
+    def registration_form(self, username, email):
+        return RegistrationForm({'username': username, 'email': email,
+                                 'password1': 'Str0ng-passphrase', 'password2': 'Str0ng-passphrase'})
+
+    def test_email_is_kept_in_sync(self):
+        self.assertEqual(NormalizedEmail.objects.get(user=self.user).email, 'someone@example.com')
+        self.user.email = 'other@example.com'
+        self.user.save()
+        self.assertEqual(NormalizedEmail.objects.get(user=self.user).email, 'other@example.com')
+        self.user.email = ''
+        self.user.save()
+        self.assertFalse(NormalizedEmail.objects.filter(user=self.user).exists())
+
+    def test_saves_without_email_changes_skip_the_sync(self):
+        self.user.last_login = timezone.now()
+        with CaptureQueriesContext(connection) as queries:
+            self.user.save(update_fields=['last_login'])
+        self.assertFalse(any('registration_app_normalizedemail' in query['sql'] for query in queries))
+
+    def test_form_rejects_case_variants(self):
+        form = self.registration_form('newuser', 'someone@EXAMPLE.com ')
+        self.assertFalse(form.is_valid())
+        self.assertIn('email', form.errors)
+        self.assertTrue(self.registration_form('newuser', 'new@example.com').is_valid())
+
+    def test_concurrent_registration_is_rejected(self):
+        form = self.registration_form('racer', 'race@example.com')
+        self.assertTrue(form.is_valid())
+        User.objects.create_user(username='winner', password='securepass123', email='RACE@example.com')
+
+        with self.assertLogs('registration_app.models', 'WARNING'):
+            self.assertIsNone(UserAuthService.register_user(form))
+        self.assertIn('email', form.errors)
+        self.assertFalse(User.objects.filter(username='racer').exists())
+
+    def test_legacy_case_duplicates_can_still_be_saved(self):
+        duplicate = User.objects.create_user(username='legacy', password='securepass123',
+                                             email='other@example.com')
+        # As left by the backfill migration: only the oldest account holds the address.
+        User.objects.filter(pk=duplicate.pk).update(email='SOMEONE@example.com')
+        NormalizedEmail.objects.filter(user=duplicate).delete()
+        duplicate.refresh_from_db()
+
+        duplicate.set_password('N3w-passphrase')
+        with self.assertLogs('registration_app.models', 'WARNING'):
+            duplicate.save()
+            duplicate.is_active = False
+            duplicate.save()
+        self.assertFalse(NormalizedEmail.objects.filter(user=duplicate).exists())
+        self.assertEqual(NormalizedEmail.objects.get(user=self.user).email, 'someone@example.com')
+
+        self.client.force_login(User.objects.create_superuser('root', 'root@example.com', 'securepass123'))
+        with self.assertLogs('registration_app.models', 'WARNING'):
+            response = self.client.post(reverse('admin:auth_user_change', args=[duplicate.pk]), {
+                'username': 'legacy', 'email': 'SOMEONE@example.com', 'is_active': 'on',
+                'date_joined_0': '2026-01-01', 'date_joined_1': '00:00:00',
+            })
+        self.assertEqual(response.status_code, 302)
+        self.assertTrue(User.objects.get(pk=duplicate.pk).is_active)
+
+    @skipUnless(connection.vendor == 'sqlite', 'EXPLAIN QUERY PLAN checks need SQLite.')
+    def test_email_check_uses_the_unique_index(self):
+        self.assertUsesIndexes(NormalizedEmail.objects.filter(email=normalize_email('a@example.com')))
@@ -10,6 +10,9 @@ from .services import UserAuthService
 LOGIN_TEMPLATE = 'registration_app/login.html'
 REGISTER_TEMPLATE = 'registration_app/register.html'
 
+# Backend recorded in the session of newly registered users (see settings.AUTHENTICATION_BACKENDS)
+AUTH_BACKEND = 'registration_app.backends.CachedModelBackend'
+
 
 class LoginView(View):
     """View handling user login process."""
@@ -66,8 +69,9 @@ class RegisterView(View):
 
         if form.is_valid():
             user = UserAuthService.register_user(form)
-            login(request, user)
-            messages.success(request, "Registration successful!")
-            return redirect('index')
+            if user is not None:
+                login(request, user, backend=AUTH_BACKEND)
+                messages.success(request, "Registration successful!")
+                return redirect('index')
 
         return render(request, REGISTER_TEMPLATE, {'form': form})
\ No newline at end of file
@@ -1,3 +1,126 @@
 from django.contrib import admin
 
-# Register your models here.
+from .catalog import get_catalog
+from .models import CatalogComponent, Computer, Order
+from .pagination import EstimatedCountPaginator
+
+
+@admin.register(CatalogComponent)
+class CatalogComponentAdmin(admin.ModelAdmin):
+    """
+    Admin for editing catalog prices. Saving, list edits and deleting
+    selected components all bump the catalog version.
+    """
+    list_display = ('component_type', 'key', 'label', 'price', 'is_active', 'position')
+    list_filter = ('component_type', 'is_active')
+    list_editable = ('label', 'price', 'is_active', 'position')
+    search_fields = ('key', 'label')
+
+
+class ProcessorListFilter(admin.SimpleListFilter):
+    """
+    Processor filter offering the catalog processors, instead of reading
+    the distinct values of the computer table.
+    """
+    title = 'processor'
+    parameter_name = 'processor'
+
+    def lookups(self, request, model_admin):
+        return get_catalog().choices[CatalogComponent.PROCESSOR]
+
+    def queryset(self, request, queryset):
+        if self.value():
+            return queryset.filter(processor=self.value())
+        return queryset
+
+
+class DeviceTypeListFilter(admin.SimpleListFilter):
+    """
+    Laptop/desktop filter. It compares is_laptop with IN: Django tests a
+    boolean column bare (``WHERE is_laptop``), which SQLite cannot serve
+    from an index.
+    """
+    title = 'device type'
+    parameter_name = 'is_laptop'
+
+    def lookups(self, request, model_admin):
+        return [('1', 'Laptop'), ('0', 'Desktop')]
+
+    def queryset(self, request, queryset):
+        if self.value() in ('0', '1'):
+            return queryset.filter(is_laptop__in=[self.value() == '1'])
+        return queryset
+
+
+class StatusListFilter(admin.SimpleListFilter):
+    """
+    Order status filter offering Order.STATUSES, instead of reading the
+    distinct values of the order table.
+    """
+    title = 'status'
+    parameter_name = 'status'
+
+    def lookups(self, request, model_admin):
+        return [(status, status) for status in Order.STATUSES]
+
+    def queryset(self, request, queryset):
+        if self.value():
+            return queryset.filter(status=self.value())
+        return queryset
+
+
+def status_action(status):
+    """
+    Return an admin action moving the selected orders to ``status`` with a
+    single UPDATE.
+    """
+    def action(modeladmin, request, queryset):
+        updated = queryset.set_status(status)
+        modeladmin.message_user(request, f'{updated} orders marked as {status}.')
+    action.__name__ = f'mark_{status.lower()}'
+    return admin.action(description=f'Mark selected orders as {status}', permissions=['change'])(action)
+
+
+class LargeTableAdmin(admin.ModelAdmin):
+    """
+    Base admin for tables with millions of rows: pages are estimated rather
+    than counted (see shop/pagination.py), newest rows first, and only
+    sortable by id, so every page is read in primary key order.
+    """
+    paginator = EstimatedCountPaginator
+    show_full_result_count = False
+    ordering = ('-id',)
+    sortable_by = ('id',)
+
+
+@admin.register(Computer)
+class ComputerAdmin(LargeTableAdmin):
+    """
+    Admin for computers. Owners are loaded with the list query and picked
+    by id; the filters use the processor and is_laptop indexes.
+    """
+    list_display = ('id', 'created_at', 'owner', 'case_type', 'processor', 'memory', 'storage',
+                    'graphics_card', 'is_laptop', 'price')
+    list_select_related = ('owner',)
+    list_filter = (DeviceTypeListFilter, ProcessorListFilter)
+    raw_id_fields = ('owner',)
+
+
+@admin.register(Order)
+class OrderAdmin(LargeTableAdmin):
+    """
+    Admin for orders. Users and computers are loaded with the list query and
+    picked by id; the status filter uses the status index. Status actions
+    change all selected orders with one UPDATE through set_status(), which
+    also invalidates their cached order page fragments.
+    """
+    list_display = ('id', 'order_date', 'status', 'user', 'computer', 'price')
+    list_select_related = ('user', 'computer')
+    list_filter = (StatusListFilter,)
+    raw_id_fields = ('user', 'computer')
+    readonly_fields = ('status_version',)
+    actions = [status_action(status) for status in Order.STATUSES]
+
+    @admin.display(description='price')
+    def price(self, order):
+        return order.computer.price
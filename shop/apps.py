@@ -4,3 +4,7 @@ from django.apps import AppConfig
 class ShopConfig(AppConfig):
     default_auto_field = "django.db.models.BigAutoField"
     name = "shop"
+
+    def ready(self):
+        # Count the SQL queries of every connection for the per-view metrics.
+        from . import metrics  # noqa: F401
@@ -0,0 +1,376 @@
+"""
+Async variants of the views in shop/views.py, used when SHOP_ASYNC_VIEWS is set.
+
+Database access goes through Django's async ORM API. Sync-only pieces (user
+loading, session backed messages and wizard stores, transactions) are
+crossed at the boundaries below with ``await`` or ``sync_to_async``.
+"""
+import json
+from functools import partial, wraps
+
+from asgiref.sync import sync_to_async
+from django.contrib import messages
+from django.contrib.auth.decorators import login_required
+from django.contrib.messages.storage.cookie import CookieStorage
+from django.http import HttpResponseForbidden, JsonResponse, StreamingHttpResponse
+from django.shortcuts import render, redirect
+from django.views.decorators.http import require_http_methods, require_POST, require_safe
+from .catalog import aget_catalog
+from .export import CONTENT_TYPES, astream_export, export_filename, export_queryset, has_export_token
+from .facade import ComputerShopFacade, InvalidConfiguration
+from .fragments import arender_computer_spec
+from .forms import (CaseSelectionForm, ProcessorSelectionForm, MemorySelectionForm,
+                    StorageSelectionForm, GraphicsSelectionForm, ColorSelectionForm,
+                    PeripheralsSelectionForm, DeviceTypeSelectionForm, OrderConfigurationForm,
+                    ConfigurationSearchForm, OrderExportForm)
+from .pricing import aprice_configuration
+from .utils.db import get_db_connection
+from .wizard import aget_wizard_state, set_wizard_state, update_wizard_state, clear_wizard_state
+
+
+def prepare_async_request(view):
+    """
+    Resolve the user with the async auth API and refresh the catalog snapshot
+    before the view runs, so forms, templates and wizard stores used by the
+    view never load them synchronously.
+    """
+    @wraps(view)
+    async def wrapper(request, *args, **kwargs):
+        request.user = await request.auser()
+        await aget_catalog()
+        return await view(request, *args, **kwargs)
+    return wrapper
+
+
+async def arender(request, template_name, context=None):
+    """
+    Render a template from an async view. Messages that may have overflowed
+    into the session are loaded in a worker thread first.
+    """
+    if CookieStorage.cookie_name in request.COOKIES:
+        await sync_to_async(len)(messages.get_messages(request))
+    return render(request, template_name, context)
+
+
+async def check_computer_builder_session(request, key, redirect_url='case_selection'):
+    """
+    Checks if a specific key exists in the wizard state of the current user.
+    If the key is missing, redirects the user to the specified URL with an error message.
+    """
+    await sync_to_async(get_db_connection)()
+    if key not in await aget_wizard_state(request):
+        await sync_to_async(messages.error)(request, "Please start from the beginning")
+        return redirect(redirect_url)
+    return None
+
+
+@require_safe
+@login_required
+@prepare_async_request
+async def index(request):
+    """
+    Renders the index page of the shop.
+    """
+    return await arender(request, 'shop/index.html')
+
+
+@require_http_methods(["GET", "POST"])
+@login_required
+@prepare_async_request
+async def case_selection(request):
+    """
+    Handles the case selection step in the computer building process.
+    """
+    await sync_to_async(get_db_connection)()
+    await aget_wizard_state(request)
+    form = CaseSelectionForm(request.POST or None)
+    if request.method == 'POST' and form.is_valid():
+        set_wizard_state(request, {'case_type': form.cleaned_data['case_type']})
+        return redirect('processor_selection')
+    return await arender(request, 'shop/case_selection.html', {'form': form})
+
+
+@require_http_methods(["GET", "POST"])
+@login_required
+@prepare_async_request
+async def processor_selection(request):
+    """
+    Handles the processor selection step in the computer building process.
+    """
+    result = await check_computer_builder_session(request, 'case_type')
+    if result:
+        return result
+
+    form = ProcessorSelectionForm(request.POST or None)
+    if request.method == 'POST' and form.is_valid():
+        update_wizard_state(request, processor=form.cleaned_data['processor'])
+        return redirect('memory_selection')
+    return await arender(request, 'shop/processor_selection.html', {'form': form})
+
+
+@require_http_methods(["GET", "POST"])
+@login_required
+@prepare_async_request
+async def memory_selection(request):
+    """
+    Handles the memory selection step in the computer building process.
+    """
+    result = await check_computer_builder_session(request, 'case_type')
+    if result:
+        return result
+
+    form = MemorySelectionForm(request.POST or None)
+    if form.is_valid():
+        update_wizard_state(request, memory=int(form.cleaned_data['memory']))
+        return redirect('storage_selection')
+    return await arender(request, 'shop/memory_selection.html', {'form': form})
+
+
+@require_http_methods(["GET", "POST"])
+@login_required
+@prepare_async_request
+async def storage_selection(request):
+    """
+    Handles the storage selection step in the computer building process.
+    """
+    result = await check_computer_builder_session(request, 'case_type')
+    if result:
+        return result
+
+    form = StorageSelectionForm(request.POST or None)
+    if form.is_valid():
+        update_wizard_state(request, storage=int(form.cleaned_data['storage']))
+        return redirect('graphics_selection')
+    return await arender(request, 'shop/storage_selection.html', {'form': form})
+
+
+@require_http_methods(["GET", "POST"])
+@login_required
+@prepare_async_request
+async def graphics_selection(request):
+    """
+    Handles the graphics card selection step in the computer building process.
+    """
+    result = await check_computer_builder_session(request, 'case_type')
+    if result:
+        return result
+
+    form = GraphicsSelectionForm(request.POST or None)
+    if form.is_valid():
+        update_wizard_state(request, graphics_card=form.cleaned_data['graphics_card'])
+        return redirect('color_selection')
+    return await arender(request, 'shop/graphics_selection.html', {'form': form})
+
+
+@require_http_methods(["GET", "POST"])
+@login_required
+@prepare_async_request
+async def color_selection(request):
+    """
+    Handles the color selection step in the computer building process.
+    """
+    result = await check_computer_builder_session(request, 'case_type')
+    if result:
+        return result
+
+    form = ColorSelectionForm(request.POST or None)
+    if form.is_valid():
+        update_wizard_state(request, color=form.cleaned_data['color'])
+        return redirect('peripherals_selection')
+    return await arender(request, 'shop/color_selection.html', {'form': form})
+
+
+@require_http_methods(["GET", "POST"])
+@login_required
+@prepare_async_request
+async def peripherals_selection(request):
+    """
+    Handles the peripherals selection step in the computer building process.
+    """
+    result = await check_computer_builder_session(request, 'case_type')
+    if result:
+        return result
+
+    form = PeripheralsSelectionForm(request.POST or None)
+    if form.is_valid():
+        update_wizard_state(request, peripherals=[key for key, value in form.cleaned_data.items() if value])
+        return redirect('device_type_selection')
+    return await arender(request, 'shop/peripherals_selection.html', {'form': form})
+
+
+@require_http_methods(["GET", "POST"])
+@login_required
+@prepare_async_request
+async def device_type_selection(request):
+    """
+    Handles the device type selection step in the computer building process.
+    """
+    result = await check_computer_builder_session(request, 'case_type')
+    if result:
+        return result
+
+    form = DeviceTypeSelectionForm(request.POST or None)
+    if form.is_valid():
+        update_wizard_state(request, is_laptop=form.cleaned_data['is_laptop'])
+        return redirect('summary')
+    return await arender(request, 'shop/device_type_selection.html', {'form': form})
+
+
+@require_http_methods(["GET", "POST"])
+@login_required
+@prepare_async_request
+async def summary(request):
+    """
+    Displays a summary of the computer configuration and allows the user to place an order.
+    """
+    result = await check_computer_builder_session(request, 'case_type')
+    if result:
+        return result
+
+    config = await aget_wizard_state(request)
+    if request.method == 'POST':
+        try:
+            order = await ComputerShopFacade.aorder_computer(request.user, **config)
+        except InvalidConfiguration as exc:
+            await sync_to_async(messages.error)(request, f"{exc} Please choose your peripherals again.")
+            return redirect('peripherals_selection')
+        clear_wizard_state(request)
+        return redirect('order_success', order_id=order.id)
+
+    try:
+        memory = int(config['memory'])
+        storage = int(config['storage'])
+    except ValueError:
+        memory = 8
+        storage = 512
+
+    estimated_price = await aprice_configuration({
+        'case_type': config['case_type'],
+        'processor': config['processor'],
+        'memory': memory,
+        'storage': storage,
+        'graphics_card': config['graphics_card'],
+        'color': config['color'],
+        'peripherals': config['peripherals'],
+        'is_laptop': config['is_laptop'],
+    })
+
+    context = config.copy()
+    context['estimated_price'] = estimated_price
+    return await arender(request, 'shop/summary.html', context)
+
+
+@require_http_methods(["GET", "POST"])
+@login_required
+@prepare_async_request
+async def order_success(request, order_id):
+    """
+    Displays the order success page with details of the placed order.
+    """
+    await sync_to_async(get_db_connection)()
+    order = await ComputerShopFacade.aget_order(request.user, order_id)
+    return await arender(request, 'shop/order_success.html', {
+        'order': order,
+        'computer_spec': await arender_computer_spec(
+            order, partial(ComputerShopFacade.aget_order_computer_details, order)
+        ),
+    })
+
+
+@require_http_methods(["GET", "POST"])
+@login_required
+@prepare_async_request
+async def my_orders(request):
+    """
+    Displays a list of the user's orders with enhanced computer details.
+    """
+    await sync_to_async(get_db_connection)()
+    enhanced_orders = await ComputerShopFacade.aget_user_orders_with_details(request.user)
+    return await arender(request, 'shop/my_orders.html', {'enhanced_orders': enhanced_orders})
+
+
+@require_http_methods(["GET", "POST"])
+@login_required
+@prepare_async_request
+async def order_detail(request, order_id):
+    """
+    Displays the details of a specific order.
+    """
+    await sync_to_async(get_db_connection)()
+    order = await ComputerShopFacade.aget_order(request.user, order_id)
+    return await arender(request, 'shop/order_detail.html', {
+        'order': order,
+        'computer_spec': await arender_computer_spec(
+            order, partial(ComputerShopFacade.aget_order_computer_details, order)
+        ),
+    })
+
+
+@require_POST
+async def api_create_order(request):
+    """
+    Creates a computer from a JSON configuration and places an order for it in
+    one request. See shop.views.api_create_order.
+    """
+    user = await request.auser()
+    if not user.is_authenticated:
+        return JsonResponse({'error': 'Authentication required.'}, status=401)
+
+    try:
+        payload = json.loads(request.body)
+    except (ValueError, UnicodeDecodeError):
+        return JsonResponse({'error': 'Request body must be valid JSON.'}, status=400)
+    if not isinstance(payload, dict):
+        return JsonResponse({'error': 'Request body must be a JSON object.'}, status=400)
+
+    await aget_catalog()
+    form = OrderConfigurationForm(payload)
+    if not form.is_valid():
+        return JsonResponse({'errors': form.errors.get_json_data()}, status=400)
+
+    await sync_to_async(get_db_connection)()
+    try:
+        order = await ComputerShopFacade.aorder_computer(user, **form.get_configuration())
+    except InvalidConfiguration as exc:
+        return JsonResponse({'error': str(exc)}, status=400)
+    return JsonResponse(
+        {'order_id': order.id, 'price': order.computer.price, 'status': order.status},
+        status=201
+    )
+
+
+@require_safe
+async def api_search_configurations(request):
+    """
+    Returns the best configurations within a budget as JSON. See
+    shop.views.api_search_configurations.
+    """
+    await aget_catalog()
+    form = ConfigurationSearchForm(request.GET)
+    if not form.is_valid():
+        return JsonResponse({'errors': form.errors.get_json_data()}, status=400)
+    search = form.get_search()
+    return JsonResponse({
+        'budget': search['budget'],
+        'objective': search['objective'],
+        'results': await ComputerShopFacade.asearch_configurations(**search),
+    })
+
+
+@require_safe
+async def export_orders(request):
+    """
+    Streams orders joined with their computers as CSV or JSON Lines. See
+    shop.views.export_orders.
+    """
+    user = await request.auser()
+    if not has_export_token(request) and not (user.is_active and user.is_staff):
+        return HttpResponseForbidden()
+    form = OrderExportForm(request.GET)
+    if not form.is_valid():
+        return JsonResponse({'errors': form.errors.get_json_data()}, status=400)
+    output_format, filters = form.get_export()
+    response = StreamingHttpResponse(astream_export(export_queryset(**filters), output_format),
+                                     content_type=CONTENT_TYPES[output_format])
+    response.headers['Content-Disposition'] = f'attachment; filename="{export_filename(output_format)}"'
+    return response
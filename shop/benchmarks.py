@@ -0,0 +1,1410 @@
+"""
+Micro-benchmarks for the shop app, run with ``python manage.py benchmark <name>``.
+"""
+import os
+import random
+import tempfile
+import time
+from contextlib import contextmanager
+
+from django.db import connection
+from django.urls import reverse
+
+from .builder import ConcreteComputerBuilder
+from .catalog import get_catalog
+
+
+BENCHMARKS = {}
+
+
+class Benchmark:
+    """
+    Base class for a named benchmark exposed by the benchmark command.
+    """
+    name = None
+    help = ''
+
+    def add_arguments(self, parser):
+        """
+        Add benchmark specific command line options.
+        """
+
+    def run(self, out, **options):
+        """
+        Run the benchmark and write the report lines through ``out``.
+        """
+        raise NotImplementedError
+
+
+def register(benchmark_class):
+    """
+    Class decorator adding a benchmark to the registry.
+    """
+    BENCHMARKS[benchmark_class.name] = benchmark_class()
+    return benchmark_class
+
+
+def best_of(func, repeat=5):
+    """
+    Return the fastest wall time of ``repeat`` runs of ``func``, in seconds.
+    """
+    timings = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        func()
+        timings.append(time.perf_counter() - started)
+    return min(timings)
+
+
+def percentile(samples, fraction):
+    """
+    Return the nearest-rank percentile of a list of samples.
+    """
+    ordered = sorted(samples)
+    if not ordered:
+        return 0.0
+    return ordered[min(len(ordered) - 1, max(0, round(fraction * len(ordered)) - 1))]
+
+
+def random_configurations(count, seed=0):
+    """
+    Return ``count`` random full configurations drawn from the catalog.
+    """
+    rng = random.Random(seed)
+    prices = get_catalog().prices
+    options = {
+        'case_type': list(prices['case']),
+        'processor': list(prices['processor']),
+        'memory': list(prices['memory']),
+        'storage': list(prices['storage']),
+        'graphics_card': list(prices['graphics']),
+        'color': list(prices['color']),
+    }
+    peripherals = list(prices['peripheral'])
+    return [
+        dict(
+            {key: rng.choice(values) for key, values in options.items()},
+            peripherals=[name for name in peripherals if rng.random() < 0.5],
+            is_laptop=rng.random() < 0.5,
+        )
+        for _ in range(count)
+    ]
+
+
+@contextmanager
+def scratch_database():
+    """
+    Run the block against a freshly migrated throwaway test database, so
+    benchmarks never write into the real one. SQLite test databases are kept
+    in a temporary file rather than in memory so commits pay their real cost.
+    """
+    from django.test.utils import setup_test_environment, teardown_test_environment
+    from .catalog import invalidate_catalog
+
+    test_settings = connection.settings_dict.setdefault('TEST', {})
+    old_test_name = test_settings.get('NAME')
+    with tempfile.TemporaryDirectory() as directory:
+        if connection.vendor == 'sqlite' and not old_test_name:
+            test_settings['NAME'] = os.path.join(directory, 'benchmark.sqlite3')
+        setup_test_environment()
+        old_name = connection.creation.create_test_db(verbosity=0, autoclobber=True, serialize=False)
+        invalidate_catalog()
+        try:
+            yield
+        finally:
+            invalidate_catalog()
+            connection.creation.destroy_test_db(old_name, verbosity=0)
+            teardown_test_environment()
+            test_settings['NAME'] = old_test_name
+
+
+class StatementCounter:
+    """
+    Database execute wrapper counting statements by verb and table, and
+    the seconds spent executing them.
+    Use with ``connection.execute_wrapper(counter)``.
+    """
+
+    def __init__(self):
+        self.statements = []
+        self.seconds = 0.0
+
+    def __call__(self, execute, sql, params, many, context):
+        self.statements.append(sql)
+        started = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.seconds += time.perf_counter() - started
+
+    def touching(self, table):
+        """
+        Return the number of statements referencing a table.
+        """
+        return sum(1 for sql in self.statements if f'"{table}"' in sql)
+
+    def writes(self, table=None):
+        """
+        Return the number of INSERT/UPDATE/DELETE statements, optionally on one table.
+        """
+        return sum(
+            1 for sql in self.statements
+            if sql.lstrip().split(None, 1)[0].upper() in ('INSERT', 'UPDATE', 'DELETE')
+            and (table is None or f'"{table}"' in sql)
+        )
+
+
+WIZARD_STEPS = (
+    ('case_selection', lambda config: {'case_type': config['case_type']}),
+    ('processor_selection', lambda config: {'processor': config['processor']}),
+    ('memory_selection', lambda config: {'memory': str(config['memory'])}),
+    ('storage_selection', lambda config: {'storage': str(config['storage'])}),
+    ('graphics_selection', lambda config: {'graphics_card': config['graphics_card']}),
+    ('color_selection', lambda config: {'color': config['color']}),
+    ('peripherals_selection', lambda config: {name: 'on' for name in config['peripherals']}),
+    ('device_type_selection', lambda config: {'is_laptop': 'on'} if config['is_laptop'] else {}),
+)
+
+
+def drive_wizard(client, config):
+    """
+    Post every wizard step for ``config`` with a logged-in test client, then
+    view the summary and place the order. Returns the summary POST response.
+    """
+    for url_name, data in WIZARD_STEPS:
+        # Browsers always submit the CSRF field, so a step with every checkbox
+        # cleared still posts a bound form.
+        client.post(reverse(url_name), dict(data(config), csrfmiddlewaretoken='unchecked'))
+    client.get(reverse('summary'))
+    return client.post(reverse('summary'))
+
+
+def price_with_fluent_chain(config):
+    """
+    Price a full configuration the way views did before the price lattice.
+    """
+    return (ConcreteComputerBuilder().build_case(config['case_type'])
+            .install_processor(config['processor'])
+            .install_memory(config['memory'])
+            .install_storage(config['storage'])
+            .install_graphics(config['graphics_card'])
+            .apply_color(config['color'])
+            .add_peripherals(config['peripherals'])
+            .set_device_type(config['is_laptop'])
+            .calculate_price()
+            .get_computer()['price'])
+
+
+@register
+class PricingBenchmark(Benchmark):
+    """
+    Compare the fluent builder chain with the precompiled price lattice.
+    """
+    name = 'pricing'
+    help = 'Price lookups: fluent builder chain vs. price lattice.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--count', type=int, default=20000,
+                            help='Number of configurations priced per run.')
+
+    def run(self, out, **options):
+        from .pricing import PriceLattice
+
+        configs = random_configurations(options['count'])
+        catalog = get_catalog()
+        compile_time = best_of(lambda: PriceLattice(catalog), repeat=3)
+        lattice = catalog.lattice
+
+        builder_time = best_of(lambda: [price_with_fluent_chain(config) for config in configs])
+        lattice_time = best_of(lambda: [lattice.price(config) for config in configs])
+
+        count = len(configs)
+        out(f'lattice entries:   {len(lattice.table):>12,} ({lattice.table.itemsize * len(lattice.table) / 2 ** 20:.1f} MiB)')
+        out(f'lattice compile:   {compile_time * 1000:>12.1f} ms')
+        out(f'fluent chain:      {builder_time / count * 1e6:>12.2f} us/config')
+        out(f'price lattice:     {lattice_time / count * 1e6:>12.2f} us/config')
+        out(f'speedup:           {builder_time / lattice_time:>12.1f}x')
+
+
+@register
+class PriceManyBenchmark(Benchmark):
+    """
+    Compare per-configuration builder pricing with vectorized batch pricing.
+    """
+    name = 'price_many'
+    help = 'Batch pricing: builder loop vs. price_many at several batch sizes.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--sizes', default='10000,100000,1000000',
+                            help='Comma separated batch sizes.')
+        parser.add_argument('--repeat', type=int, default=3,
+                            help='Runs per measurement; the fastest is reported.')
+
+    def run(self, out, **options):
+        from .pricing import get_price_lattice, price_many
+
+        lattice = get_price_lattice()
+        out(f"{'configs':>10} {'builder loop':>14} {'price_many':>12} {'encode':>10} "
+            f"{'lookup':>10} {'speedup':>8}")
+        for size in [int(size) for size in options['sizes'].split(',')]:
+            configs = random_configurations(size)
+            codes = lattice.encode_many(configs)
+
+            builder_time = best_of(lambda: [price_with_fluent_chain(config) for config in configs],
+                                   options['repeat'])
+            batch_time = best_of(lambda: price_many(configs), options['repeat'])
+            encode_time = best_of(lambda: lattice.encode_many(configs), options['repeat'])
+            lookup_time = best_of(lambda: lattice.price_codes(codes), options['repeat'])
+
+            out(f'{size:>10,} {builder_time * 1000:>11.1f} ms {batch_time * 1000:>9.1f} ms '
+                f'{encode_time * 1000:>7.1f} ms {lookup_time * 1000:>7.1f} ms '
+                f'{builder_time / batch_time:>7.1f}x')
+
+
+@register
+class WizardWritesBenchmark(Benchmark):
+    """
+    Count database writes per completed order for each wizard state store.
+    """
+    name = 'wizard_writes'
+    help = 'Session and total DB writes per completed wizard order, per wizard store.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--orders', type=int, default=20,
+                            help='Orders placed through the wizard per store.')
+
+    def run(self, out, **options):
+        from django.contrib.auth.models import User
+        from django.test import Client, override_settings
+        from .wizard import WIZARD_STORES
+
+        orders = options['orders']
+        configs = random_configurations(orders)
+        out(f"{'store':>8} {'session writes/order':>22} {'all writes/order':>18} {'ms/order':>10}")
+        with scratch_database():
+            for store in WIZARD_STORES:
+                with override_settings(SHOP_WIZARD_STORE=store, SESSION_SAVE_EVERY_REQUEST=False):
+                    user = User.objects.create_user(username=f'bench-{store}', password='bench-pass')
+                    client = Client()
+                    client.force_login(user)
+                    counter = StatementCounter()
+                    started = time.perf_counter()
+                    with connection.execute_wrapper(counter):
+                        for config in configs:
+                            drive_wizard(client, config)
+                    elapsed = time.perf_counter() - started
+                out(f'{store:>8} {counter.writes("django_session") / orders:>22.1f} '
+                    f'{counter.writes() / orders:>18.1f} {elapsed / orders * 1000:>10.1f}')
+
+            with override_settings(SHOP_WIZARD_STORE='session', SESSION_SAVE_EVERY_REQUEST=True):
+                user = User.objects.create_user(username='bench-legacy', password='bench-pass')
+                client = Client()
+                client.force_login(user)
+                counter = StatementCounter()
+                started = time.perf_counter()
+                with connection.execute_wrapper(counter):
+                    for config in configs:
+                        drive_wizard(client, config)
+                elapsed = time.perf_counter() - started
+            out(f'{"legacy":>8} {counter.writes("django_session") / orders:>22.1f} '
+                f'{counter.writes() / orders:>18.1f} {elapsed / orders * 1000:>10.1f}'
+                '  (session store, SESSION_SAVE_EVERY_REQUEST=True)')
+
+
+@register
+class AuthQueriesBenchmark(Benchmark):
+    """
+    Count queries per wizard request with and without the cached user backend.
+    """
+    name = 'auth_queries'
+    help = 'Queries per wizard request: ModelBackend vs. registration_app CachedModelBackend.'
+
+    backends = (
+        ('model', 'django.contrib.auth.backends.ModelBackend'),
+        ('cached', 'registration_app.backends.CachedModelBackend'),
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--orders', type=int, default=20,
+                            help='Orders placed through the wizard per backend.')
+
+    def run(self, out, **options):
+        from django.contrib.auth.models import User
+        from django.test import Client, override_settings
+
+        configs = random_configurations(options['orders'])
+        requests = len(configs) * (len(WIZARD_STEPS) + 2)
+        out(f"{'backend':>8} {'queries/req':>12} {'auth_user/req':>14} {'session/req':>12} {'ms/req':>8}")
+        with scratch_database():
+            for label, backend in self.backends:
+                with override_settings(AUTHENTICATION_BACKENDS=[backend]):
+                    user = User.objects.create_user(username=f'bench-auth-{label}', password='bench-pass')
+                    client = Client()
+                    client.force_login(user, backend=backend)
+                    drive_wizard(client, configs[0])  # warm up
+                    counter = StatementCounter()
+                    started = time.perf_counter()
+                    with connection.execute_wrapper(counter):
+                        for config in configs:
+                            drive_wizard(client, config)
+                    elapsed = time.perf_counter() - started
+                out(f'{label:>8} {len(counter.statements) / requests:>12.2f} '
+                    f'{counter.touching("auth_user") / requests:>14.2f} '
+                    f'{counter.touching("django_session") / requests:>12.2f} {elapsed / requests * 1000:>8.2f}')
+
+
+@register
+class SignupBenchmark(Benchmark):
+    """
+    Measure the registration email check and signup latency on a large user table.
+    """
+    name = 'signup'
+    help = 'Signup latency with the old auth_user email scan vs. the NormalizedEmail index.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--users', type=int, default=1_000_000,
+                            help='Existing users in the table.')
+        parser.add_argument('--signups', type=int, default=200,
+                            help='Signups (and email checks) measured per path.')
+
+    def run(self, out, **options):
+        from django import forms
+        from django.contrib.auth.models import User
+        from django.db import transaction
+        from django.test import override_settings
+        from registration_app.forms import RegistrationForm
+        from registration_app.models import NormalizedEmail
+        from registration_app.services import UserAuthService
+
+        class ScanningRegistrationForm(RegistrationForm):
+            # The email check before NormalizedEmail existed.
+            def clean_email(self):
+                email = self.cleaned_data.get('email')
+                if User.objects.filter(email=email).exists():
+                    raise forms.ValidationError(self.duplicate_email_message)
+                return email
+
+        users, signups = options['users'], options['signups']
+        # Cheap password hashing so the database work is what gets measured.
+        fast_hashing = override_settings(PASSWORD_HASHERS=['django.contrib.auth.hashers.MD5PasswordHasher'])
+        with scratch_database(), fast_hashing:
+            started = time.perf_counter()
+            with transaction.atomic():
+                for first in range(0, users, 10_000):
+                    batch = range(first, min(users, first + 10_000))
+                    User.objects.bulk_create(
+                        User(username=f'user{index}', email=f'user{index}@example.com', password='!')
+                        for index in batch
+                    )
+                NormalizedEmail.objects.bulk_create(
+                    (NormalizedEmail(user_id=user_id, email=email)
+                     for user_id, email in User.objects.values_list('pk', 'email').iterator(chunk_size=10_000)),
+                    batch_size=10_000,
+                )
+            out(f'created {users:,} users in {time.perf_counter() - started:.1f}s')
+
+            def check_scan(email):
+                return User.objects.filter(email=email).exists()
+
+            out(f"{'path':>22} {'p50 ms':>8} {'p99 ms':>8} {'mean ms':>8}")
+            paths = [
+                ('email check: scan', lambda index: check_scan(f'new{index}@example.com')),
+                ('email check: index', lambda index: NormalizedEmail.is_taken(f'new{index}@example.com')),
+                ('signup: scan', lambda index: self.signup(ScanningRegistrationForm, UserAuthService,
+                                                           f'scan{index}')),
+                ('signup: index', lambda index: self.signup(RegistrationForm, UserAuthService, f'index{index}')),
+            ]
+            for label, path in paths:
+                latencies = []
+                for index in range(signups):
+                    started = time.perf_counter()
+                    path(index)
+                    latencies.append(time.perf_counter() - started)
+                out(f'{label:>22} {percentile(latencies, 0.5) * 1000:>8.3f} '
+                    f'{percentile(latencies, 0.99) * 1000:>8.3f} {sum(latencies) / len(latencies) * 1000:>8.3f}')
+
+    @staticmethod
+    def signup(form_class, service, username):
+        form = form_class({'username': username, 'email': f'{username}@example.com',
+                           'password1': 'Str0ng-passphrase', 'password2': 'Str0ng-passphrase'})
+        if not form.is_valid() or service.register_user(form) is None:
+            raise AssertionError(form.errors)
+
+
+@register
+class OrderApiBenchmark(Benchmark):
+    """
+    Compare placing orders through the HTML wizard with the JSON order endpoint.
+    """
+    name = 'order_api'
+    help = 'Orders/sec, requests/sec and p99 latency: wizard flow vs. POST /shop/api/orders/.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--orders', type=int, default=200,
+                            help='Orders placed through each flow.')
+
+    def run(self, out, **options):
+        import json
+        from django.contrib.auth.models import User
+        from django.test import Client
+
+        configs = random_configurations(options['orders'])
+        with scratch_database():
+            user = User.objects.create_user(username='bench-api', password='bench-pass')
+            client = Client()
+            client.force_login(user)
+
+            def wizard_order(config):
+                drive_wizard(client, config)
+
+            def api_order(config):
+                client.post(reverse('api_create_order'), json.dumps(config), content_type='application/json')
+
+            out(f"{'flow':>8} {'requests/order':>15} {'orders/s':>10} {'requests/s':>11} "
+                f"{'p50 ms':>8} {'p99 ms':>8}")
+            for flow, place_order, requests_per_order in (
+                ('wizard', wizard_order, len(WIZARD_STEPS) + 2),
+                ('api', api_order, 1),
+            ):
+                latencies = []
+                started = time.perf_counter()
+                for config in configs:
+                    order_started = time.perf_counter()
+                    place_order(config)
+                    latencies.append(time.perf_counter() - order_started)
+                elapsed = time.perf_counter() - started
+                orders_per_second = len(configs) / elapsed
+                out(f'{flow:>8} {requests_per_order:>15} {orders_per_second:>10.1f} '
+                    f'{orders_per_second * requests_per_order:>11.1f} '
+                    f'{percentile(latencies, 0.5) * 1000:>8.2f} {percentile(latencies, 0.99) * 1000:>8.2f}')
+
+
+@register
+class BulkOrdersBenchmark(Benchmark):
+    """
+    Compare placing many orders one by one with the facade bulk methods.
+    """
+    name = 'bulk_orders'
+    help = 'Orders/sec for a large order: per-item create_computer/place_order vs. bulk inserts.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--orders', type=int, default=2000,
+                            help='Computers ordered per run.')
+        parser.add_argument('--batch-sizes', default='100,500,1000',
+                            help='Comma separated INSERT batch sizes for the bulk path.')
+        parser.add_argument('--identical', action='store_true',
+                            help='Order one configuration many times instead of random ones.')
+
+    def run(self, out, **options):
+        from django.contrib.auth.models import User
+        from .facade import ComputerShopFacade
+
+        count = options['orders']
+        configs = random_configurations(count)
+        if options['identical']:
+            configs = configs[:1] * count
+
+        def per_item(user):
+            for config in configs:
+                computer = ComputerShopFacade.create_computer(user, **config)
+                ComputerShopFacade.place_order(user, computer)
+
+        def atomic_per_item(user):
+            for config in configs:
+                ComputerShopFacade.order_computer(user, **config)
+
+        paths = [('per item', per_item), ('order_computer', atomic_per_item)]
+        for batch_size in [int(size) for size in options['batch_sizes'].split(',')]:
+            paths.append((f'bulk/{batch_size}', lambda user, batch_size=batch_size:
+                          ComputerShopFacade.order_computers_bulk(user, configs, batch_size)))
+
+        with scratch_database():
+            out(f"{'path':>15} {'statements':>11} {'seconds':>9} {'orders/s':>10}")
+            for label, place_orders in paths:
+                user = User.objects.create_user(username=f'bench-{label}', password='bench-pass')
+                counter = StatementCounter()
+                started = time.perf_counter()
+                with connection.execute_wrapper(counter):
+                    place_orders(user)
+                elapsed = time.perf_counter() - started
+                out(f'{label:>15} {len(counter.statements):>11,} {elapsed:>9.2f} {count / elapsed:>10.1f}')
+
+
+async def asgi_get(application, path, headers):
+    """
+    Send one GET request straight to an ASGI application and return the
+    response status code.
+    """
+    import asyncio
+
+    scope = {
+        'type': 'http', 'asgi': {'version': '3.0'}, 'http_version': '1.1',
+        'method': 'GET', 'scheme': 'http', 'path': path, 'raw_path': path.encode(),
+        'query_string': b'', 'root_path': '', 'headers': headers,
+        'client': ('127.0.0.1', 50000), 'server': ('testserver', 80),
+    }
+    requested = False
+    response = {}
+
+    async def receive():
+        nonlocal requested
+        if requested:
+            await asyncio.Future()  # the client never disconnects
+        requested = True
+        return {'type': 'http.request', 'body': b'', 'more_body': False}
+
+    async def send(message):
+        if message['type'] == 'http.response.start':
+            response['status'] = message['status']
+
+    await application(scope, receive, send)
+    return response.get('status')
+
+
+@register
+class AsyncViewsBenchmark(Benchmark):
+    """
+    Compare the sync and async shop views served by Django's ASGI handler
+    under concurrent load.
+    """
+    name = 'async_views'
+    help = 'Requests/sec and latency of the order pages over ASGI: sync vs. async views.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--requests', type=int, default=400,
+                            help='Requests sent per stack and concurrency level.')
+        parser.add_argument('--concurrency', default='1,10,50',
+                            help='Comma separated numbers of concurrent clients.')
+        parser.add_argument('--orders', type=int, default=20,
+                            help='Orders of the benchmark user.')
+
+    def run(self, out, **options):
+        import asyncio
+        from types import ModuleType
+        from django.conf import settings
+        from django.contrib.auth.models import User
+        from django.core.handlers.asgi import ASGIHandler
+        from django.test import Client, override_settings
+        from django.urls import include, path
+        from . import async_views, views
+        from .facade import ComputerShopFacade
+        from .urls import shop_urlpatterns
+
+        async def load(application, paths, headers, concurrency):
+            pending = iter(paths)
+            latencies = []
+            statuses = set()
+
+            async def client():
+                for url in pending:
+                    started = time.perf_counter()
+                    statuses.add(await asgi_get(application, url, headers))
+                    latencies.append(time.perf_counter() - started)
+
+            started = time.perf_counter()
+            await asyncio.gather(*(client() for _ in range(concurrency)))
+            return time.perf_counter() - started, latencies, statuses
+
+        with scratch_database():
+            # ASGI runs each request's database work in a fresh thread, so
+            # persistent connections would only pile up.
+            max_age = connection.settings_dict['CONN_MAX_AGE']
+            connection.settings_dict['CONN_MAX_AGE'] = 0
+            try:
+                user = User.objects.create_user(username='bench-async', password='bench-pass')
+                orders = ComputerShopFacade.order_computers_bulk(user, random_configurations(options['orders']))
+                client = Client()
+                client.force_login(user)
+                session_id = client.cookies[settings.SESSION_COOKIE_NAME].value
+                headers = [(b'cookie', f'{settings.SESSION_COOKIE_NAME}={session_id}'.encode())]
+                urls = [reverse('my_orders')] + [reverse('order_detail', args=[order.id]) for order in orders]
+                paths = [urls[position % len(urls)] for position in range(options['requests'])]
+
+                out(f"{'stack':>6} {'clients':>8} {'requests/s':>11} {'p50 ms':>8} {'p99 ms':>8}")
+                for stack, module in (('sync', views), ('async', async_views)):
+                    urlconf = ModuleType(f'{stack}_urlconf')
+                    urlconf.urlpatterns = [
+                        path('accounts/', include('registration_app.urls')),
+                        path('shop/', include(shop_urlpatterns(module))),
+                    ]
+                    with override_settings(ROOT_URLCONF=urlconf):
+                        application = ASGIHandler()
+                        asyncio.run(load(application, paths[:10], headers, 1))  # warm up
+                        for concurrency in [int(value) for value in options['concurrency'].split(',')]:
+                            elapsed, latencies, statuses = asyncio.run(
+                                load(application, paths, headers, concurrency)
+                            )
+                            if statuses != {200}:
+                                raise RuntimeError(f'Unexpected response statuses: {sorted(statuses)}')
+                            out(f'{stack:>6} {concurrency:>8} {len(paths) / elapsed:>11.1f} '
+                                f'{percentile(latencies, 0.5) * 1000:>8.2f} '
+                                f'{percentile(latencies, 0.99) * 1000:>8.2f}')
+            finally:
+                connection.settings_dict['CONN_MAX_AGE'] = max_age
+
+
+@register
+class OrderFragmentsBenchmark(Benchmark):
+    """
+    Measure order page latency with and without the computer spec fragment cache.
+    """
+    name = 'order_fragments'
+    help = 'Latency of refreshing order_detail/order_success: fragment cache off vs. on.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--requests', type=int, default=500,
+                            help='Page refreshes per page and mode.')
+
+    def run(self, out, **options):
+        from django.contrib.auth.models import User
+        from django.test import Client, override_settings
+        from .facade import ComputerShopFacade
+        from .fragments import (fragment_cache_stats, reset_fragment_cache_stats, render_computer_spec,
+                                _render)
+
+        caches_setting = {
+            'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'},
+            'off': {'BACKEND': 'django.core.cache.backends.dummy.DummyCache'},
+        }
+        with scratch_database(), override_settings(CACHES=caches_setting):
+            user = User.objects.create_user(username='bench-fragments', password='bench-pass')
+            order = ComputerShopFacade.order_computer(user, **random_configurations(1)[0])
+            client = Client()
+            client.force_login(user)
+
+            out(f"{'page':>14} {'cache':>6} {'mean ms':>8} {'p50 ms':>8} {'p99 ms':>8} {'hit rate':>9}")
+            for url_name in ('order_detail', 'order_success'):
+                url = reverse(url_name, args=[order.id])
+                for alias in ('off', 'default'):
+                    with override_settings(SHOP_FRAGMENT_CACHE_ALIAS=alias):
+                        client.get(url)  # warm up
+                        reset_fragment_cache_stats()
+                        latencies = []
+                        for _ in range(options['requests']):
+                            started = time.perf_counter()
+                            client.get(url)
+                            latencies.append(time.perf_counter() - started)
+                        stats = fragment_cache_stats()
+                    mode = 'on' if alias == 'default' else 'off'
+                    out(f'{url_name:>14} {mode:>6} {sum(latencies) / len(latencies) * 1000:>8.3f} '
+                        f'{percentile(latencies, 0.5) * 1000:>8.3f} {percentile(latencies, 0.99) * 1000:>8.3f} '
+                        f'{stats["hits"] / max(1, stats["hits"] + stats["misses"]):>9.0%}')
+
+            order, computer = ComputerShopFacade.get_order_with_details(user, order.id)
+            count = options['requests']
+            render_time = best_of(lambda: [_render(order, computer) for _ in range(count)])
+            cached_time = best_of(lambda: [render_computer_spec(order, lambda: computer) for _ in range(count)])
+            out(f'spec fragment: rendered {render_time / count * 1e6:.1f} us, '
+                f'cached {cached_time / count * 1e6:.1f} us')
+
+
+@register
+class FulfillmentBenchmark(Benchmark):
+    """
+    Measure fulfillment worker throughput for different thread pool sizes.
+    """
+    name = 'fulfillment'
+    help = 'Jobs/sec of the fulfillment worker draining a queue of orders, per pool size.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--orders', type=int, default=500,
+                            help='Orders queued per run; each one runs every pipeline step.')
+        parser.add_argument('--threads', default='1,2,4,8',
+                            help='Comma separated worker pool sizes.')
+        parser.add_argument('--batch-size', type=int, default=20,
+                            help='Jobs claimed per poll.')
+        parser.add_argument('--step-latency', type=float, default=0.0,
+                            help='Seconds each step waits, standing in for payment or mail round trips.')
+
+    def run(self, out, **options):
+        from unittest import mock
+        from django.contrib.auth.models import User
+        from django.test import override_settings
+        from .facade import ComputerShopFacade
+        from .fulfillment import STEPS, FulfillmentWorker
+        from .models import FulfillmentJob
+
+        latency = options['step_latency']
+        if latency:
+            steps = {name: (lambda order, step=step: (time.sleep(latency), step(order)))
+                     for name, step in STEPS.items()}
+        else:
+            steps = {}
+        configs = random_configurations(options['orders'])
+        # Retry lock contention quickly instead of with production backoffs.
+        fast_retries = override_settings(SHOP_FULFILLMENT_RETRY_DELAY=0.01, SHOP_FULFILLMENT_MAX_RETRY_DELAY=0.1,
+                                         SHOP_FULFILLMENT_MAX_ATTEMPTS=50)
+
+        with scratch_database(), fast_retries, mock.patch.dict(STEPS, steps):
+            out(f"{'threads':>7} {'jobs':>6} {'seconds':>8} {'jobs/s':>8} {'orders/s':>9} "
+                f"{'retried':>8} {'failed':>7}")
+            for threads in [int(count) for count in options['threads'].split(',')]:
+                user = User.objects.create_user(username=f'bench-fulfillment-{threads}', password='bench-pass',
+                                                email='bench@example.com')
+                ComputerShopFacade.order_computers_bulk(user, configs)
+                worker = FulfillmentWorker(threads=threads, batch_size=options['batch_size'])
+                pending = FulfillmentJob.objects.filter(state__in=[FulfillmentJob.QUEUED, FulfillmentJob.RUNNING])
+                started = time.perf_counter()
+                while pending.exists():
+                    worker.run(until_idle=True, poll_interval=0)
+                elapsed = time.perf_counter() - started
+                stats = worker.stats()
+                jobs = stats['done'] + stats['failed']
+                out(f'{threads:>7} {jobs:>6} {elapsed:>8.2f} {jobs / elapsed:>8.1f} '
+                    f'{len(configs) / elapsed:>9.1f} {stats["retried"]:>8} {stats["failed"]:>7}')
+
+
+@register
+class MetricsBenchmark(Benchmark):
+    """
+    Measure the request overhead of the per-view metrics middleware.
+    """
+    name = 'metrics'
+    help = 'Latency of the order pages without and with shop.metrics.MetricsMiddleware.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--requests', type=int, default=100,
+                            help='Requests per run.')
+        parser.add_argument('--rounds', type=int, default=20,
+                            help='Runs per stack, alternated; the fastest run is reported.')
+        parser.add_argument('--orders', type=int, default=20,
+                            help='Orders of the benchmark user.')
+
+    def run(self, out, **options):
+        from django.conf import settings
+        from django.contrib.auth.models import User
+        from django.http import HttpResponse
+        from django.test import Client, RequestFactory, override_settings
+        from django.urls import resolve
+        from . import metrics
+        from .facade import ComputerShopFacade
+
+        middleware = 'shop.metrics.MetricsMiddleware'
+        without = [name for name in settings.MIDDLEWARE if name != middleware]
+        with scratch_database():
+            user = User.objects.create_user(username='bench-metrics', password='bench-pass')
+            orders = ComputerShopFacade.order_computers_bulk(user, random_configurations(options['orders']))
+            urls = [reverse('my_orders')] + [reverse('order_detail', args=[order.id]) for order in orders]
+            paths = [urls[position % len(urls)] for position in range(options['requests'])]
+
+            def noop(sql, params, many, context):
+                pass
+
+            clients = {}
+            for label, stack in (('off', without), ('on', [middleware] + without)):
+                client = clients[label] = Client()
+                client.force_login(user)
+                with override_settings(MIDDLEWARE=stack):
+                    client.get(paths[0])  # loads the middleware stack
+            # Alternate the runs so caches and disk warm up for both stacks alike.
+            timings = {label: [] for label in clients}
+            metrics.reset()
+            for round_number in range(options['rounds']):
+                order = list(clients.items())
+                for label, client in order if round_number % 2 else reversed(order):
+                    timings[label].append(best_of(lambda: [client.get(path) for path in paths], repeat=1))
+            off, on = min(timings['off']), min(timings['on'])
+            out(f"{'middleware':>10} {'ms/req':>8}")
+            out(f"{'off':>10} {off / len(paths) * 1000:>8.3f}")
+            out(f"{'on':>10} {on / len(paths) * 1000:>8.3f}")
+            out(f'overhead {(on - off) / off:+.1%}')
+
+            # End-to-end timings vary by several percent between runs, so also
+            # time the middleware and the SQL wrapper on their own.
+            series = metrics.snapshot().values()
+            queries = sum(stats.queries for stats in series) / sum(sum(stats.statuses.values()) for stats in series)
+            count = 100000
+            request = RequestFactory().get(paths[0])
+            request.resolver_match = resolve(paths[0])
+            response = HttpResponse()
+            instance = metrics.MetricsMiddleware(lambda request: response)
+            middleware_time = best_of(lambda: [instance(request) for _ in range(count)]) / count
+            token = metrics._current_request.set([0, 0.0])
+            try:
+                wrapped_time = best_of(lambda: [metrics.record_sql(noop, '', None, False, None)
+                                                for _ in range(count)]) / count
+            finally:
+                metrics._current_request.reset(token)
+            bare_time = best_of(lambda: [noop('', None, False, None) for _ in range(count)]) / count
+            cost = middleware_time + queries * (wrapped_time - bare_time)
+            out(f'cost per request: middleware {middleware_time * 1e6:.2f} us + {queries:.1f} queries x '
+                f'{(wrapped_time - bare_time) * 1e6:.2f} us = {cost * 1e6:.1f} us '
+                f'({cost / (off / len(paths)):.2%} of an uninstrumented request)')
+            out(f'render /metrics: {best_of(metrics.render_metrics) * 1000:.2f} ms')
+
+
+@register
+class ProfilerBenchmark(Benchmark):
+    """
+    Measure the request overhead of the sampling profiler middleware.
+    """
+    name = 'profiler'
+    help = 'Latency of the order pages: profiler removed, idle, and profiling every request.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--requests', type=int, default=100,
+                            help='Requests per run.')
+        parser.add_argument('--rounds', type=int, default=10,
+                            help='Runs per mode, alternated; the fastest run is reported.')
+
+    def run(self, out, **options):
+        from django.conf import settings
+        from django.contrib.auth.models import User
+        from django.test import Client, override_settings
+        from .facade import ComputerShopFacade
+
+        middleware = 'shop.profiler.SamplingProfilerMiddleware'
+        modes = (
+            ('removed', {'SHOP_PROFILER_SAMPLE_RATE': 0, 'SHOP_PROFILER_HEADER': ''}),
+            ('idle', {'SHOP_PROFILER_SAMPLE_RATE': 0, 'SHOP_PROFILER_HEADER': 'X-Profile'}),
+            ('sampled', {'SHOP_PROFILER_SAMPLE_RATE': 1}),
+        )
+        with scratch_database(), tempfile.TemporaryDirectory() as directory:
+            user = User.objects.create_user(username='bench-profiler', password='bench-pass')
+            orders = ComputerShopFacade.order_computers_bulk(user, random_configurations(20))
+            urls = [reverse('my_orders')] + [reverse('order_detail', args=[order.id]) for order in orders]
+            paths = [urls[position % len(urls)] for position in range(options['requests'])]
+            if middleware not in settings.MIDDLEWARE:
+                raise RuntimeError(f'{middleware} is not in MIDDLEWARE.')
+
+            clients = {}
+            for label, profiler_settings in modes:
+                client = clients[label] = Client()
+                client.force_login(user)
+                with override_settings(SHOP_PROFILER_DIR=directory, **profiler_settings):
+                    client.get(paths[0])  # loads the middleware stack
+            timings = {label: [] for label in clients}
+            for round_number in range(options['rounds']):
+                order = list(clients.items())
+                for label, client in order if round_number % 2 else reversed(order):
+                    timings[label].append(best_of(lambda: [client.get(path) for path in paths], repeat=1))
+
+            base = min(timings['removed'])
+            out(f"{'profiler':>8} {'ms/req':>8} {'overhead':>9}")
+            for label, _ in modes:
+                best = min(timings[label])
+                out(f'{label:>8} {best / len(paths) * 1000:>8.3f} {(best - base) / base:>+9.1%}')
+
+
+@register
+class StaticBytesBenchmark(Benchmark):
+    """
+    Measure the bytes of a wizard session's pages and static files, with a
+    browser cache, for plain and for hashed, precompressed static files.
+    Page bytes are uncompressed, as Django sends them.
+    """
+    name = 'static_bytes'
+    help = 'Static requests and bytes per wizard session: plain files vs. hashed + gzip + immutable.'
+
+    def run(self, out, **options):
+        import re
+        from django.contrib.auth.models import User
+        from django.core.management import call_command
+        from django.http import HttpResponseNotFound
+        from django.test import Client, RequestFactory, override_settings
+        from django.views.static import serve
+        from .staticfiles import StaticFilesMiddleware
+
+        modes = (
+            ('plain', 'django.contrib.staticfiles.storage.StaticFilesStorage'),
+            ('hashed', 'shop.staticfiles.CompressedManifestStaticFilesStorage'),
+        )
+        static_url = re.compile(r'(?:href|src)="(/static/[^"]+)"')
+        factory = RequestFactory()
+
+        def transferred(response):
+            body = b''.join(response.streaming_content if response.streaming else [response.content])
+            return len(response.serialize_headers()) + len(body)
+
+        with scratch_database(), tempfile.TemporaryDirectory() as directory:
+            user = User.objects.create_user(username='bench-static', password='bench-pass')
+            out(f"{'static':>7} {'pages':>6} {'html bytes':>11} {'static reqs':>12} {'static bytes':>13} "
+                f"{'total/page':>11}")
+            for label, backend in modes:
+                root = os.path.join(directory, label)
+                storages = {
+                    'default': {'BACKEND': 'django.core.files.storage.FileSystemStorage'},
+                    'staticfiles': {'BACKEND': backend},
+                }
+                with override_settings(STATIC_ROOT=root, STORAGES=storages, DEBUG=False):
+                    call_command('collectstatic', interactive=False, verbosity=0)
+                    if label == 'plain':
+                        # Django's static view: Last-Modified only, so browsers revalidate.
+                        def fetch(url, cached):
+                            headers = {'HTTP_IF_MODIFIED_SINCE': cached['Last-Modified']} if cached else {}
+                            request = factory.get(url, HTTP_ACCEPT_ENCODING='gzip', **headers)
+                            return serve(request, url[len('/static/'):], document_root=root)
+                    else:
+                        middleware = StaticFilesMiddleware(lambda request: HttpResponseNotFound())
+
+                        def fetch(url, cached):
+                            if cached and 'immutable' in cached['Cache-Control']:
+                                return None  # fresh in the browser cache
+                            return middleware(factory.get(url, HTTP_ACCEPT_ENCODING='gzip'))
+
+                    client = Client()
+                    client.force_login(user)
+                    pages = []
+                    for url_name, data in WIZARD_STEPS:
+                        pages.append(client.get(reverse(url_name)))
+                        client.post(reverse(url_name), dict(data(random_configurations(1)[0]),
+                                                             csrfmiddlewaretoken='unchecked'))
+                    pages.append(client.get(reverse('summary')))
+                    pages.append(client.get(client.post(reverse('summary'))['Location']))
+                    pages.append(client.get(reverse('my_orders')))
+
+                    browser_cache = {}
+                    requests = transferred_bytes = 0
+                    for page in pages:
+                        for url in static_url.findall(page.content.decode()):
+                            response = fetch(url, browser_cache.get(url))
+                            if response is None:
+                                continue
+                            requests += 1
+                            transferred_bytes += transferred(response)
+                            if response.status_code == 200:
+                                browser_cache[url] = response
+                html_bytes = sum(transferred(page) for page in pages)
+                out(f'{label:>7} {len(pages):>6} {html_bytes:>11} {requests:>12} {transferred_bytes:>13} '
+                    f'{(html_bytes + transferred_bytes) / len(pages):>11.0f}')
+
+
+@register
+class ServeBenchmark(Benchmark):
+    """
+    Compare the throughput and memory of runserver and the pre-forking
+    serve command, each started as a subprocess on the project database.
+    """
+    name = 'serve'
+    help = 'Requests/sec, latency and memory: runserver vs. manage.py serve.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--requests', type=int, default=2000,
+                            help='Requests sent per server.')
+        parser.add_argument('--concurrency', type=int, default=8,
+                            help='Concurrent client connections.')
+        parser.add_argument('--workers', type=int, default=4,
+                            help='Worker processes of the serve command.')
+        parser.add_argument('--path', default='/accounts/login/',
+                            help='Page requested.')
+
+    def run(self, out, **options):
+        import socket
+        import subprocess
+        import sys
+        from concurrent.futures import ThreadPoolExecutor
+        from http.client import HTTPConnection
+        from .server import memory_usage
+
+        def free_port():
+            with socket.socket() as sock:
+                sock.bind(('127.0.0.1', 0))
+                return sock.getsockname()[1]
+
+        def children(pid):
+            try:
+                with open(f'/proc/{pid}/task/{pid}/children') as listing:
+                    return [int(child) for child in listing.read().split()]
+            except OSError:
+                return []
+
+        def get(port):
+            started = time.perf_counter()
+            client = HTTPConnection('127.0.0.1', port, timeout=30)
+            try:
+                client.request('GET', options['path'])
+                response = client.getresponse()
+                response.read()
+                status = response.status
+            finally:
+                client.close()
+            return status, time.perf_counter() - started
+
+        servers = (
+            ('runserver', ['runserver', '--noreload']),
+            ('serve', ['serve', '--workers', str(options['workers']), '--max-requests', '0', '--bind']),
+        )
+        out(f"{'server':>10} {'requests/s':>11} {'p50 ms':>8} {'p99 ms':>8} {'processes':>10} "
+            f"{'RSS MiB':>8} {'private MiB':>12}")
+        for label, arguments in servers:
+            port = free_port()
+            process = subprocess.Popen(
+                [sys.executable, sys.argv[0]] + arguments + [f'127.0.0.1:{port}'],
+                stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL,
+            )
+            try:
+                deadline = time.monotonic() + 30
+                while True:
+                    try:
+                        get(port)
+                        break
+                    except OSError:
+                        if time.monotonic() > deadline or process.poll() is not None:
+                            raise RuntimeError(f'{label} did not start.')
+                        time.sleep(0.2)
+                with ThreadPoolExecutor(options['concurrency']) as executor:
+                    list(executor.map(get, [port] * 100))  # warm up every worker
+                    started = time.perf_counter()
+                    results = list(executor.map(get, [port] * options['requests']))
+                    elapsed = time.perf_counter() - started
+                statuses = {status for status, _ in results}
+                if statuses != {200}:
+                    raise RuntimeError(f'Unexpected response statuses from {label}: {sorted(statuses)}')
+                latencies = [latency for _, latency in results]
+                pids = [process.pid] + children(process.pid)
+                usage = [memory_usage(pid) for pid in pids]
+                rss = sum(rss or 0 for rss, _ in usage)
+                private = sum(private or 0 for _, private in usage)
+                out(f'{label:>10} {len(results) / elapsed:>11.1f} {percentile(latencies, 0.5) * 1000:>8.2f} '
+                    f'{percentile(latencies, 0.99) * 1000:>8.2f} {len(pids):>10} {rss / 2 ** 20:>8.1f} '
+                    f'{private / 2 ** 20:>12.1f}')
+                for pid, (rss, private) in zip(pids, usage):
+                    if len(pids) > 1 and rss:
+                        out(f'{"":>10} pid {pid}: RSS {rss / 2 ** 20:.1f} MiB, private {private / 2 ** 20:.1f} MiB')
+            finally:
+                process.terminate()
+                process.wait(timeout=60)
+
+
+@register
+class SearchBenchmark(Benchmark):
+    """
+    Compare ranking every configuration priced by the builder with the
+    frontier search, for each objective.
+    """
+    name = 'search'
+    help = 'Best configurations under a budget: builder brute force vs. frontier search.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--budget', type=int, default=1500,
+                            help='Budget of the queries.')
+        parser.add_argument('--limit', type=int, default=5,
+                            help='Configurations returned per query.')
+
+    def run(self, out, **options):
+        from itertools import product
+        from django.core.management.base import CommandError
+        from .search import OBJECTIVES, balanced_scores, search_configurations
+
+        catalog = get_catalog()
+        prices = catalog.prices
+        names = list(prices['peripheral'])
+        peripheral_sets = [[name for bit, name in enumerate(names) if mask & (1 << bit)]
+                           for mask in range(1 << len(names))]
+        keys = ('case_type', 'processor', 'memory', 'storage', 'graphics_card', 'color', 'peripherals', 'is_laptop')
+        started = time.perf_counter()
+        configs = [dict(zip(keys, values)) for values in product(
+            prices['case'], prices['processor'], prices['memory'], prices['storage'], prices['graphics'],
+            prices['color'], peripheral_sets, (False, True),
+        )]
+        config_prices = [price_with_fluent_chain(config) for config in configs]
+        priced = time.perf_counter() - started
+        out(f'configurations:    {len(configs):>12,}')
+        out(f'builder pricing:   {priced * 1000:>12.1f} ms')
+
+        budget, limit = options['budget'], options['limit']
+        secondary = balanced_scores(catalog)
+        for objective in OBJECTIVES:
+            primary = OBJECTIVES[objective](catalog)
+
+            def brute_force():
+                ranked = sorted(
+                    (tuple(-sum(scores.get(key, {}).get(config[key], 0) for key in scores)
+                           for scores in (primary, secondary)), price)
+                    for config, price in zip(configs, config_prices) if price <= budget
+                )
+                return ranked[0] if ranked else None
+
+            started = time.perf_counter()
+            best = brute_force()
+            brute_time = time.perf_counter() - started
+            search_time = best_of(lambda: search_configurations(budget, objective=objective, limit=limit))
+            results = search_configurations(budget, objective=objective, limit=limit)
+            found = ((-results[0]['score'], -results[0]['tiers']), results[0]['price']) if results else None
+            if found != best:
+                raise CommandError(f'{objective}: search found {found}, brute force {best}.')
+            out(f'{objective:<10} best ${results[0]["price"]:>5}  ranking {(priced + brute_time) * 1000:8.1f} ms'
+                f'  search {search_time * 1000:6.2f} ms  ({(priced + brute_time) / search_time:,.0f}x)')
+
+
+@register
+class ExportBenchmark(Benchmark):
+    """
+    Compare exporting orders loaded through the facade with the streaming
+    export, in time and peak Python memory, at two table sizes.
+    """
+    name = 'export'
+    help = 'Order export: facade lists in memory vs. chunked streaming, time and peak memory.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--orders', type=int, default=200_000,
+                            help='Orders in the larger table; the smaller one has a tenth.')
+        parser.add_argument('--users', type=int, default=100,
+                            help='Users the orders are spread over.')
+
+    def run(self, out, **options):
+        import tracemalloc
+        from django.contrib.auth.models import User
+        from django.db import transaction
+        from .export import HEADER, export_queryset, render_csv, stream_export
+        from .facade import ComputerShopFacade
+        from .models import Computer, Order
+
+        def facade_export():
+            # Every order and computer of every user as dicts, then rendered.
+            rows = []
+            for user in User.objects.order_by('pk'):
+                for item in ComputerShopFacade.get_user_orders_with_details(user):
+                    order, computer = item['order'], item['computer']
+                    rows.append([order.id, order.order_date.isoformat(), order.status, user.id, user.username,
+                                 user.email, computer['id'], computer['case_type'], computer['processor'],
+                                 computer['memory'], computer['storage'], computer['graphics_card'],
+                                 computer['color'], ';'.join(computer['peripherals']),
+                                 computer['is_laptop'], str(computer['price'])])
+            return render_csv([HEADER] + rows)
+
+        def streaming_export():
+            size = 0
+            for piece in stream_export(export_queryset(), 'csv'):
+                size += len(piece)
+            return size
+
+        def measure(function):
+            started = time.perf_counter()
+            function()
+            elapsed = time.perf_counter() - started
+            tracemalloc.start()
+            function()
+            peak = tracemalloc.get_traced_memory()[1]
+            tracemalloc.stop()
+            return elapsed, peak
+
+        total, user_count = options['orders'], options['users']
+        configs = random_configurations(1000, seed=11)
+        with scratch_database():
+            users = User.objects.bulk_create(
+                User(username=f'export{index}', email=f'export{index}@example.com', password='!')
+                for index in range(user_count)
+            )
+            created = 0
+            out(f"{'orders':>9} {'path':>10} {'seconds':>8} {'rows/s':>9} {'peak MiB':>9}")
+            for size in (total // 10, total):
+                with transaction.atomic():
+                    while created < size:
+                        batch = range(created, min(size, created + 10_000))
+                        computers = Computer.objects.bulk_create(
+                            Computer(owner=users[index % user_count], price=1000, **{
+                                key: value for key, value in configs[index % len(configs)].items()
+                                if key != 'peripherals'
+                            }) for index in batch
+                        )
+                        Order.objects.bulk_create(
+                            Order(user=computer.owner, computer=computer) for computer in computers
+                        )
+                        created = batch.stop
+                for label, function in (('facade', facade_export), ('streaming', streaming_export)):
+                    elapsed, peak = measure(function)
+                    out(f'{size:>9,} {label:>10} {elapsed:>8.2f} {size / elapsed:>9,.0f} {peak / 2 ** 20:>9.1f}')
+
+
+@register
+class AdminBenchmark(Benchmark):
+    """
+    Compare order and computer admin list pages of plain ModelAdmins with
+    the shop admins on a large table.
+    """
+    name = 'admin'
+    help = 'Admin list pages: plain ModelAdmin vs. joined, estimated-count admins with indexed filters.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--orders', type=int, default=200_000,
+                            help='Orders (and computers) in the tables.')
+        parser.add_argument('--repeat', type=int, default=5,
+                            help='Requests per page; the median is reported.')
+
+    def run(self, out, **options):
+        from types import ModuleType
+        from django.contrib import admin
+        from django.contrib.auth.models import User
+        from django.db import transaction
+        from django.test import Client, override_settings
+        from django.urls import path
+        from .models import Computer, Order
+
+        plain_site = admin.AdminSite(name='plain')
+        plain_site.register(Order, list_display=('id', 'order_date', 'status', 'user', 'computer'),
+                            list_filter=('status',))
+        plain_site.register(Computer, list_display=('id', 'created_at', 'owner', 'processor', 'is_laptop', 'price'),
+                            list_filter=('is_laptop', 'processor'))
+        urlconf = ModuleType('admin_benchmark_urls')
+        urlconf.urlpatterns = [path('plain/', plain_site.urls), path('admin/', admin.site.urls)]
+
+        total = options['orders']
+        configs = random_configurations(1000, seed=13)
+        with scratch_database(), override_settings(ROOT_URLCONF=urlconf, DEBUG=False):
+            started = time.perf_counter()
+            users = User.objects.bulk_create(
+                User(username=f'admin-bench{index}', password='!') for index in range(1000)
+            )
+            with transaction.atomic():
+                for first in range(0, total, 10_000):
+                    batch = range(first, min(total, first + 10_000))
+                    computers = Computer.objects.bulk_create(
+                        Computer(owner=users[index % len(users)], price=1000, **{
+                            key: value for key, value in configs[index % len(configs)].items()
+                            if key != 'peripherals'
+                        }) for index in batch
+                    )
+                    Order.objects.bulk_create(
+                        Order(user=computer.owner, computer=computer,
+                              status=Order.STATUSES[computer.pk % 7 // 3]) for computer in computers
+                    )
+            out(f'created {total:,} orders in {time.perf_counter() - started:.1f}s')
+
+            client = Client()
+            client.force_login(User.objects.create_superuser('admin-bench', 'admin@example.com', '!'))
+            pages = [
+                ('orders', 'shop/order/'),
+                ('orders, status', 'shop/order/?status=Completed'),
+                ('computers', 'shop/computer/'),
+                ('computers, laptops', 'shop/computer/?is_laptop=1'),
+                ('computers, processor', 'shop/computer/?processor=i9-12900K'),
+            ]
+            plain_params = {'?is_laptop=1': '?is_laptop__exact=1', '?status=Completed': '?status__exact=Completed',
+                            '?processor=i9-12900K': '?processor__exact=i9-12900K'}
+            out(f"{'page':>22} {'admin':>7} {'queries':>8} {'SQL ms':>9} {'p50 ms':>9}")
+            for label, page in pages:
+                for site in ('plain', 'admin'):
+                    url = f'/{site}/{page}'
+                    if site == 'plain':
+                        for shop_param, plain_param in plain_params.items():
+                            url = url.replace(shop_param, plain_param)
+                    client.get(url)
+                    latencies, sql_latencies = [], []
+                    for _ in range(options['repeat']):
+                        counter = StatementCounter()
+                        started = time.perf_counter()
+                        with connection.execute_wrapper(counter):
+                            response = client.get(url)
+                        latencies.append(time.perf_counter() - started)
+                        sql_latencies.append(counter.seconds)
+                        if response.status_code != 200:
+                            raise AssertionError(f'{url} returned {response.status_code}')
+                    out(f'{label:>22} {site:>7} {len(counter.statements):>8} '
+                        f'{percentile(sql_latencies, 0.5) * 1000:>9.1f} '
+                        f'{percentile(latencies, 0.5) * 1000:>9.1f}')
+
+
+STARTUP_SCRIPT = '''
+import time
+started = time.time()
+import json, os, sys
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'ARCH_2.settings')
+import django
+django.setup()
+set_up = time.time()
+from django.core.wsgi import get_wsgi_application
+application = get_wsgi_application()
+loaded = time.time()
+environ = {
+    'REQUEST_METHOD': 'GET', 'PATH_INFO': sys.argv[1], 'QUERY_STRING': '', 'SERVER_NAME': 'localhost',
+    'SERVER_PORT': '80', 'HTTP_HOST': 'localhost', 'SERVER_PROTOCOL': 'HTTP/1.1', 'wsgi.url_scheme': 'http',
+    'wsgi.input': sys.stdin.buffer, 'wsgi.errors': sys.stderr, 'wsgi.multithread': False,
+    'wsgi.multiprocess': True, 'wsgi.run_once': False, 'wsgi.version': (1, 0),
+}
+status = []
+b''.join(application(environ, lambda line, headers, exc_info=None: status.append(line)))
+print(json.dumps({'started': started, 'set_up': set_up, 'loaded': loaded, 'responded': time.time(),
+                  'status': status[0], 'modules': len(sys.modules)}))
+'''
+
+
+def parse_importtime(stderr):
+    """
+    Return (total import microseconds, self microseconds per top-level package)
+    from the ``-X importtime`` output of a process.
+    """
+    total = 0
+    packages = {}
+    for line in stderr.splitlines():
+        if not line.startswith('import time:') or 'self [us]' in line:
+            continue
+        self_us, _, name = line[len('import time:'):].split('|')
+        total += int(self_us)
+        package = name.strip().split('.')[0]
+        packages[package] = packages.get(package, 0) + int(self_us)
+    return total, packages
+
+
+@register
+class StartupBenchmark(Benchmark):
+    """
+    Measure the time from starting a Python process to the first response
+    of the WSGI application, in fresh subprocesses run with -X importtime.
+    Fails when the median exceeds the budget, so CI catches regressions.
+    """
+    name = 'startup'
+    help = 'Cold start: time to the first response and import time per package; fails over budget.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--runs', type=int, default=5,
+                            help='Processes started; the median is reported.')
+        parser.add_argument('--path', default='/accounts/login/',
+                            help='Path of the first request.')
+        parser.add_argument('--profile', choices=('fast', 'full'),
+                            help='DJANGO_STARTUP_PROFILE of the processes (default: inherited).')
+        parser.add_argument('--budget-ms', type=float,
+                            help='Fail when the median time to first response exceeds this '
+                                 '(default: SHOP_STARTUP_BUDGET_MS).')
+        parser.add_argument('--top', type=int, default=8,
+                            help='Packages listed by import time.')
+
+    def run(self, out, **options):
+        import json
+        import subprocess
+        import sys
+        from statistics import median
+        from django.conf import settings
+        from django.core.management.base import CommandError
+
+        env = dict(os.environ)
+        if options['profile']:
+            env['DJANGO_STARTUP_PROFILE'] = options['profile']
+        budget = options['budget_ms'] or getattr(settings, 'SHOP_STARTUP_BUDGET_MS', None)
+
+        runs = []
+        for _ in range(options['runs']):
+            spawned = time.time()
+            process = subprocess.run(
+                [sys.executable, '-X', 'importtime', '-c', STARTUP_SCRIPT, options['path']],
+                cwd=settings.BASE_DIR, env=env, capture_output=True, text=True, stdin=subprocess.DEVNULL,
+            )
+            exited = time.time()
+            if process.returncode:
+                raise CommandError(f'Startup process failed:\n{process.stderr[-2000:]}')
+            result = json.loads(process.stdout.strip().splitlines()[-1])
+            if not result['status'].startswith('200'):
+                raise CommandError(f"First request returned {result['status']}.")
+            result['spawned'], result['exited'] = spawned, exited
+            result['import_us'], result['packages'] = parse_importtime(process.stderr)
+            runs.append(result)
+
+        def ms(start, end):
+            return median(run[end] - run[start] for run in runs) * 1000
+
+        first_response = ms('spawned', 'responded')
+        out(f"profile {env.get('DJANGO_STARTUP_PROFILE', 'full')}, {len(runs)} runs, median ms:")
+        out(f"  interpreter start    {ms('spawned', 'started'):8.1f}")
+        out(f"  django.setup()       {ms('started', 'set_up'):8.1f}")
+        out(f"  WSGI application     {ms('set_up', 'loaded'):8.1f}")
+        out(f"  first request        {ms('loaded', 'responded'):8.1f}")
+        out(f"  time to first resp.  {first_response:8.1f}")
+        out(f"  process exit         {ms('spawned', 'exited'):8.1f}")
+        out(f"  imports (self time)  {median(run['import_us'] for run in runs) / 1000:8.1f} "
+            f"({median(run['modules'] for run in runs):.0f} modules)")
+        packages = {name: median(run['packages'].get(name, 0) for run in runs) for name in runs[0]['packages']}
+        for name, self_us in sorted(packages.items(), key=lambda item: -item[1])[:options['top']]:
+            out(f'    {name:<22} {self_us / 1000:8.1f}')
+        if budget and first_response > budget:
+            raise CommandError(f'Startup regressed: {first_response:.0f} ms to the first response, '
+                               f'budget {budget:.0f} ms.')
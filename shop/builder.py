@@ -1,5 +1,16 @@
 from abc import ABC, abstractmethod
 
+from .catalog import get_catalog
+
+
+# Fees and discounts that do not depend on the catalog. Component prices come
+# from the catalog (see shop/catalog.py).
+COLOR_FEE = 20  # Price for color customization outside the catalog
+LAPTOP_PREMIUM = 200  # Premium for laptop form factor
+ASSEMBLY_FEE = 50
+LAPTOP_MONITOR_DISCOUNT = 50
+DISCOUNT_MIN_MEMORY = 16
+
 
 class ComputerBuilder(ABC):
     """
@@ -55,7 +66,8 @@ class ConcreteComputerBuilder(ComputerBuilder):
     Concrete implementation of computer builder pattern.
     Handles the step-by-step construction of computer configurations.
     """
-    def __init__(self):
+    def __init__(self, catalog=None):
+        self.catalog = catalog if catalog is not None else get_catalog()
         self.reset()
 
     def reset(self):
@@ -73,8 +85,7 @@ class ConcreteComputerBuilder(ComputerBuilder):
         Configure the computer case or laptop form factor.
         """
         self.computer['case_type'] = case_type
-        prices = {'Tower': 100, 'Mini': 80, 'Slim': 90, 'Gaming': 150}
-        self.computer['price'] += prices.get(case_type, 0)
+        self.computer['price'] += self.catalog.prices['case'].get(case_type, 0)
         return self
 
     def install_processor(self, processor):
@@ -82,11 +93,7 @@ class ConcreteComputerBuilder(ComputerBuilder):
         Install a processor in the computer.
         """
         self.computer['processor'] = processor
-        prices = {
-            'i5-12400': 200, 'i7-12700K': 350, 'i9-12900K': 550,
-            'Ryzen-5-5600X': 220, 'Ryzen-7-5800X': 320
-        }
-        self.computer['price'] += prices.get(processor, 0)
+        self.computer['price'] += self.catalog.prices['processor'].get(processor, 0)
         return self
 
     def install_memory(self, memory):
@@ -94,8 +101,7 @@ class ConcreteComputerBuilder(ComputerBuilder):
         Install RAM in the computer.
         """
         self.computer['memory'] = memory
-        prices = {8: 50, 16: 100, 32: 180, 64: 320}
-        self.computer['price'] += prices.get(memory, 0)
+        self.computer['price'] += self.catalog.prices['memory'].get(memory, 0)
         return self
 
     def install_storage(self, storage):
@@ -103,8 +109,7 @@ class ConcreteComputerBuilder(ComputerBuilder):
         Install storage in the computer.
         """
         self.computer['storage'] = storage
-        prices = {512: 70, 1024: 120, 2048: 220}
-        self.computer['price'] += prices.get(storage, 0)
+        self.computer['price'] += self.catalog.prices['storage'].get(storage, 0)
         return self
 
     def install_graphics(self, graphics_card):
@@ -112,9 +117,7 @@ class ConcreteComputerBuilder(ComputerBuilder):
         Install a graphics card in the computer.
         """
         self.computer['graphics_card'] = graphics_card
-        prices = {'Integrated': 0, 'RTX-3060': 400, 'RTX-3070': 600,
-                  'RTX-3080': 800, 'RX-6700XT': 450}
-        self.computer['price'] += prices.get(graphics_card, 0)
+        self.computer['price'] += self.catalog.prices['graphics'].get(graphics_card, 0)
         return self
 
     def apply_color(self, color):
@@ -122,7 +125,7 @@ class ConcreteComputerBuilder(ComputerBuilder):
         Apply color to the computer case.
         """
         self.computer['color'] = color
-        self.computer['price'] += 20  # Small price for color customization
+        self.computer['price'] += self.catalog.prices['color'].get(color, COLOR_FEE)
         return self
 
     def add_peripherals(self, peripherals):
@@ -130,8 +133,7 @@ class ConcreteComputerBuilder(ComputerBuilder):
         Add selected peripherals to the order.
         """
         self.computer['peripherals'] = peripherals
-        prices = {'monitor': 200, 'keyboard': 50, 'mouse': 30, 'headset': 70, 'webcam': 40}
-        self.computer['price'] += sum(prices.get(acc, 0) for acc in peripherals)
+        self.computer['price'] += sum(self.catalog.prices['peripheral'].get(acc, 0) for acc in peripherals)
         return self
 
     def set_device_type(self, is_laptop):
@@ -140,22 +142,18 @@ class ConcreteComputerBuilder(ComputerBuilder):
         """
         self.computer['is_laptop'] = is_laptop
         if is_laptop:
-            self.computer['price'] += 200  # Premium for laptop form factor
+            self.computer['price'] += LAPTOP_PREMIUM
         return self
 
     def calculate_price(self):
         """
         Calculate the final price of the computer.
         """
+        self.computer['price'] += ASSEMBLY_FEE
 
-        assembly_fee = 50
-        self.computer['price'] += assembly_fee
-
-
-        if self.computer['is_laptop'] and self.computer['memory'] >= 16 and 'monitor' in self.computer['peripherals']:
-
-            discount = 50
-            self.computer['price'] -= discount
+        if (self.computer['is_laptop'] and self.computer['memory'] >= DISCOUNT_MIN_MEMORY
+                and 'monitor' in self.computer['peripherals']):
+            self.computer['price'] -= LAPTOP_MONITOR_DISCOUNT
 
         return self
 
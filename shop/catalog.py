@@ -0,0 +1,133 @@
+import asyncio
+import logging
+import threading
+import time
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+
+from .models import CatalogComponent, CatalogVersion
+from .peripherals import PERIPHERAL_BITS
+
+
+logger = logging.getLogger(__name__)
+
+# Component types whose keys are stored as text but used as integers.
+INTEGER_KEY_TYPES = CatalogComponent.INTEGER_KEY_TYPES
+
+
+class Catalog:
+    """
+    Immutable snapshot of the active component catalog at one catalog version.
+    Provides the price tables used by the builder and the choices used by forms.
+    """
+
+    def __init__(self, version, components):
+        self.version = version
+        self.prices = {component_type: {} for component_type, _ in CatalogComponent.COMPONENT_TYPE_CHOICES}
+        self.choices = {component_type: [] for component_type, _ in CatalogComponent.COMPONENT_TYPE_CHOICES}
+        for component_type, key, label, price in components:
+            if component_type in INTEGER_KEY_TYPES:
+                if not CatalogComponent.is_integer_key(key):
+                    # Written around CatalogComponent.clean(); skipped rather than failing every load.
+                    logger.warning('Skipping %s component with non-integer key %r.', component_type, key)
+                    continue
+                price_key = int(key)
+            elif component_type == CatalogComponent.PERIPHERAL and key not in PERIPHERAL_BITS:
+                # Without a registry bit it could be offered but never stored.
+                logger.warning('Skipping peripheral %r without a bit in PERIPHERAL_BITS.', key)
+                continue
+            else:
+                price_key = key
+            self.prices[component_type][price_key] = price
+            self.choices[component_type].append((key, label))
+        self._lattice = None
+        self._lattice_lock = threading.Lock()
+
+    @property
+    def lattice(self):
+        """
+        Return the price lattice for this catalog, compiling it on first use.
+        """
+        if self._lattice is None:
+            with self._lattice_lock:
+                if self._lattice is None:  # double-checked locking
+                    from .pricing import PriceLattice
+                    self._lattice = PriceLattice(self)
+        return self._lattice
+
+
+def load_catalog(version):
+    """
+    Read the active catalog components from the database.
+    """
+    components = (CatalogComponent.objects.filter(is_active=True)
+                  .order_by('component_type', 'position', 'id')
+                  .values_list('component_type', 'key', 'label', 'price'))
+    return Catalog(version, list(components))
+
+
+_catalog = None
+_checked_at = float('-inf')
+_catalog_lock = threading.Lock()
+
+
+def get_catalog():
+    """
+    Return the cached catalog snapshot.
+
+    The catalog version is checked at most once per SHOP_CATALOG_CHECK_INTERVAL
+    seconds, and the catalog tables are only read when the version changed.
+    """
+    global _catalog, _checked_at
+    interval = getattr(settings, 'SHOP_CATALOG_CHECK_INTERVAL', 5)
+    catalog = _catalog
+    if catalog is not None and time.monotonic() - _checked_at < interval:
+        return catalog
+    if catalog is not None and _in_event_loop():
+        # Async code must not query synchronously; aget_catalog() refreshes it.
+        return catalog
+    with _catalog_lock:
+        if _catalog is None or time.monotonic() - _checked_at >= interval:
+            version = CatalogVersion.current()
+            if _catalog is None or _catalog.version != version:
+                _catalog = load_catalog(version)
+            _checked_at = time.monotonic()
+        return _catalog
+
+
+async def aget_catalog():
+    """
+    Async variant of get_catalog(). The version check runs in a worker thread
+    and only when it is due.
+    """
+    interval = getattr(settings, 'SHOP_CATALOG_CHECK_INTERVAL', 5)
+    catalog = _catalog
+    if catalog is not None and time.monotonic() - _checked_at < interval:
+        return catalog
+    return await sync_to_async(get_catalog)()
+
+
+def _in_event_loop():
+    try:
+        asyncio.get_running_loop()
+    except RuntimeError:
+        return False
+    return True
+
+
+def invalidate_catalog():
+    """
+    Drop the cached catalog so the next get_catalog() call in this process reloads it.
+    """
+    global _catalog, _checked_at
+    with _catalog_lock:
+        _catalog = None
+        _checked_at = float('-inf')
+
+
+def catalog_choices(component_type):
+    """
+    Return a callable producing the form choices of a component type.
+    """
+    return lambda: get_catalog().choices[component_type]
@@ -0,0 +1,187 @@
+"""
+Streaming export of orders joined with their computers, as CSV or JSON
+Lines, served at ``/shop/export/orders/`` and run with
+``python manage.py export_orders``.
+
+Orders are read in chunks of consecutive order ids (keyset pagination), one
+short joined query per chunk, and each chunk is written out before the next
+one is read. Memory use depends on the chunk size, not on the number of
+orders, and no read transaction stays open for the whole export, so a slow
+download never holds back the writers of the database. An order changed
+while an export runs is exported as it was when its chunk was read.
+"""
+import csv
+import hmac
+import io
+import json
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.utils import timezone
+
+from .models import Order
+from .peripherals import decode_peripherals
+
+
+# Exported columns and the lookups reading them, in output order.
+COLUMNS = (
+    ('order_id', 'id'),
+    ('order_date', 'order_date'),
+    ('status', 'status'),
+    ('user_id', 'user_id'),
+    ('username', 'user__username'),
+    ('email', 'user__email'),
+    ('computer_id', 'computer_id'),
+    ('case_type', 'computer__case_type'),
+    ('processor', 'computer__processor'),
+    ('memory', 'computer__memory'),
+    ('storage', 'computer__storage'),
+    ('graphics_card', 'computer__graphics_card'),
+    ('color', 'computer__color'),
+    ('peripherals', 'computer__peripherals_mask'),
+    ('is_laptop', 'computer__is_laptop'),
+    ('price', 'computer__price'),
+)
+
+HEADER = tuple(name for name, _ in COLUMNS)
+
+CONTENT_TYPES = {
+    'csv': 'text/csv; charset=utf-8',
+    'jsonl': 'application/x-ndjson; charset=utf-8',
+}
+
+_DATE, _PERIPHERALS, _IS_LAPTOP, _PRICE = (HEADER.index(name) for name in
+                                           ('order_date', 'peripherals', 'is_laptop', 'price'))
+
+
+def chunk_size():
+    """
+    Return the number of orders read per query.
+    """
+    return getattr(settings, 'SHOP_EXPORT_CHUNK_SIZE', 2000)
+
+
+def has_export_token(request):
+    """
+    Whether the request carries ``Authorization: Bearer <SHOP_EXPORT_TOKEN>``.
+    """
+    token = getattr(settings, 'SHOP_EXPORT_TOKEN', '')
+    return bool(token) and hmac.compare_digest(request.headers.get('Authorization', ''), f'Bearer {token}')
+
+
+def export_filename(output_format):
+    """
+    Return the download file name of an export made now.
+    """
+    return f"orders-{timezone.now().strftime('%Y%m%dT%H%M%SZ')}.{output_format}"
+
+
+def export_queryset(since=None, until=None, statuses=None, user=None):
+    """
+    Return the orders to export: placed at or after ``since`` and before
+    ``until``, with one of ``statuses``, of ``user`` (an id or a username).
+    """
+    orders = Order.objects.all()
+    if since is not None:
+        orders = orders.filter(order_date__gte=since)
+    if until is not None:
+        orders = orders.filter(order_date__lt=until)
+    if statuses:
+        orders = orders.filter(status__in=statuses)
+    if user:
+        orders = orders.filter(user_id=int(user)) if str(user).isdigit() else orders.filter(user__username=user)
+    return orders
+
+
+def fetch_chunk(queryset, after, size):
+    """
+    Return up to ``size`` export rows of orders with an id above ``after``,
+    in ascending id order, as tuples in COLUMNS order.
+    """
+    rows = (queryset.filter(pk__gt=after).order_by('pk')
+            .values_list(*(lookup for _, lookup in COLUMNS))[:size])
+    return list(rows)
+
+
+def row_chunks(queryset, size=None):
+    """
+    Yield the export rows of a queryset in lists of at most ``size`` rows.
+    Each chunk is queried after the previous one was consumed.
+    """
+    size = size or chunk_size()
+    after = 0
+    while True:
+        rows = fetch_chunk(queryset, after, size)
+        if not rows:
+            return
+        yield rows
+        after = rows[-1][0]
+
+
+async def arow_chunks(queryset, size=None):
+    """
+    Async variant of row_chunks(). Each query runs in a worker thread.
+    """
+    size = size or chunk_size()
+    after = 0
+    while True:
+        rows = await sync_to_async(fetch_chunk)(queryset, after, size)
+        if not rows:
+            return
+        yield rows
+        after = rows[-1][0]
+
+
+def render_header(output_format):
+    """
+    Return the text preceding the rows: the CSV header line, nothing for JSON Lines.
+    """
+    return render_csv([HEADER]) if output_format == 'csv' else ''
+
+
+def render_rows(rows, output_format):
+    """
+    Return export rows as CSV or JSON Lines text. Dates are ISO 8601,
+    peripherals a list (``;``-separated in CSV) and prices decimal strings.
+    """
+    rows = [_convert(row, for_csv=output_format == 'csv') for row in rows]
+    if output_format == 'csv':
+        return render_csv(rows)
+    return ''.join(json.dumps(dict(zip(HEADER, row)), separators=(',', ':')) + '\n' for row in rows)
+
+
+def render_csv(rows):
+    """
+    Return rows as CSV text.
+    """
+    buffer = io.StringIO()
+    csv.writer(buffer).writerows(rows)
+    return buffer.getvalue()
+
+
+def stream_export(queryset, output_format, size=None):
+    """
+    Yield the export of a queryset as text pieces, one per chunk.
+    """
+    yield render_header(output_format)
+    for rows in row_chunks(queryset, size):
+        yield render_rows(rows, output_format)
+
+
+async def astream_export(queryset, output_format, size=None):
+    """
+    Async variant of stream_export().
+    """
+    yield render_header(output_format)
+    async for rows in arow_chunks(queryset, size):
+        yield render_rows(rows, output_format)
+
+
+def _convert(row, for_csv):
+    row = list(row)
+    row[_DATE] = row[_DATE].isoformat()
+    peripherals = decode_peripherals(row[_PERIPHERALS])
+    row[_PERIPHERALS] = ';'.join(peripherals) if for_csv else peripherals
+    row[_IS_LAPTOP] = ('true' if row[_IS_LAPTOP] else 'false') if for_csv else row[_IS_LAPTOP]
+    row[_PRICE] = str(row[_PRICE])
+    return row
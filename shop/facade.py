@@ -1,6 +1,21 @@
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.db import transaction
+from django.http import Http404
 from django.shortcuts import get_object_or_404
+from .fulfillment import enqueue_fulfillment
 from .models import Computer, Order
-from .builder import ConcreteComputerBuilder
+from .peripherals import PERIPHERAL_BITS, encode_peripherals
+from .catalog import aget_catalog
+from .pricing import aprice_configuration, price_configuration, price_many
+from .search import search_configurations
+
+
+class InvalidConfiguration(ValueError):
+    """
+    Raised for a configuration that cannot be built, such as one naming a
+    peripheral without a bit in shop.peripherals.PERIPHERAL_BITS.
+    """
 
 
 class ComputerShopFacade:
@@ -14,50 +29,82 @@ class ComputerShopFacade:
         """
         Create and save a new computer configuration based on specifications.
         """
+        configuration = ComputerShopFacade._normalize_configuration(
+            case_type, processor, memory, storage, graphics_card, color, peripherals, is_laptop
+        )
+        computer = ComputerShopFacade._build_computer(user, configuration, price_configuration(configuration))
+        computer.save()
+        return computer
 
+    @staticmethod
+    def place_order(user, computer):
+        """
+        Create a new order for the specified computer and queue its fulfillment.
+        """
+        with transaction.atomic():
+            order = Order.objects.create(user=user, computer=computer)
+            enqueue_fulfillment([order])
+        return order
 
-        memory = ComputerShopFacade._safe_cast_to_int(memory, default=8)
-        storage = ComputerShopFacade._safe_cast_to_int(storage, default=512)
-        peripherals = ComputerShopFacade._normalize_peripherals(peripherals)
+    @staticmethod
+    def order_computer(user, **configuration):
+        """
+        Create a computer from a configuration and place an order for it
+        in a single transaction.
+        """
+        with transaction.atomic():
+            computer = ComputerShopFacade.create_computer(user, **configuration)
+            return ComputerShopFacade.place_order(user, computer)
 
-        builder = ConcreteComputerBuilder()
-        computer_details = (
-            builder.build_case(case_type)
-                   .install_processor(processor)
-                   .install_memory(memory)
-                   .install_storage(storage)
-                   .install_graphics(graphics_card)
-                   .apply_color(color)
-                   .add_peripherals(peripherals)
-                   .set_device_type(is_laptop)
-                   .calculate_price()
-                   .get_computer()
-        )
+    @staticmethod
+    def create_computers_bulk(user, configurations, batch_size=None):
+        """
+        Create and save computers for a list of configuration dicts with batched
+        INSERTs in a single transaction. Each distinct configuration is priced once.
+        Returns the saved computers in input order.
+        """
+        configurations = [
+            ComputerShopFacade._normalize_configuration(**configuration) for configuration in configurations
+        ]
+        distinct = {}
+        for configuration in configurations:
+            distinct.setdefault(ComputerShopFacade._configuration_key(configuration), configuration)
+        prices = dict(zip(distinct, price_many(distinct.values())))
 
+        computers = [
+            ComputerShopFacade._build_computer(
+                user, configuration, prices[ComputerShopFacade._configuration_key(configuration)]
+            )
+            for configuration in configurations
+        ]
+        with transaction.atomic():
+            return Computer.objects.bulk_create(computers, batch_size=ComputerShopFacade._batch_size(batch_size))
 
-        computer = Computer(
-            **{
-                'case_type': computer_details['case_type'],
-                'processor': computer_details['processor'],
-                'memory': computer_details['memory'],
-                'storage': computer_details['storage'],
-                'graphics_card': computer_details['graphics_card'],
-                'color': computer_details['color'],
-                'peripherals': ', '.join(computer_details['peripherals']),
-                'is_laptop': computer_details['is_laptop'],
-                'price': computer_details['price'],
-                'owner': user
-            }
-        )
-        computer.save()
-        return computer
+    @staticmethod
+    def place_orders_bulk(user, computers, batch_size=None):
+        """
+        Place one order per saved computer with batched INSERTs in a single transaction
+        and queue their fulfillment. Returns the orders in input order.
+        """
+        orders = []
+        for computer in computers:
+            if computer.pk is None:
+                raise ValueError("Computers must be saved before orders can be placed for them.")
+            orders.append(Order(user=user, computer=computer))
+        with transaction.atomic():
+            orders = Order.objects.bulk_create(orders, batch_size=ComputerShopFacade._batch_size(batch_size))
+            enqueue_fulfillment(orders)
+        return orders
 
     @staticmethod
-    def place_order(user, computer):
+    def order_computers_bulk(user, configurations, batch_size=None):
         """
-        Create a new order for the specified computer.
+        Create computers for a list of configuration dicts and place an order for
+        each of them in a single transaction.
         """
-        return Order.objects.create(user=user, computer=computer)
+        with transaction.atomic():
+            computers = ComputerShopFacade.create_computers_bulk(user, configurations, batch_size)
+            return ComputerShopFacade.place_orders_bulk(user, computers, batch_size)
 
     @staticmethod
     def get_computer_details(computer_id):
@@ -65,6 +112,165 @@ class ComputerShopFacade:
         Retrieve detailed information about a specific computer.
         """
         computer = get_object_or_404(Computer, id=computer_id)
+        return ComputerShopFacade._serialize_computer(computer)
+
+    @staticmethod
+    def get_user_computers(user):
+        """
+        Retrieve all computers configured by a specific user, newest first.
+        """
+        return Computer.objects.filter(owner=user).order_by('-created_at')
+
+    @staticmethod
+    def get_orders_with_peripherals(*peripherals, user=None):
+        """
+        Retrieve the orders whose computer includes all the given peripherals,
+        e.g. get_orders_with_peripherals('monitor', 'headset'), optionally for one user.
+        """
+        orders = Order.objects.with_peripherals(*peripherals).select_related('computer')
+        if user is not None:
+            orders = orders.filter(user=user)
+        return orders.order_by('-order_date')
+
+    @staticmethod
+    def get_user_orders(user):
+        """
+        Retrieve all orders placed by a specific user.
+        """
+        return Order.objects.filter(user=user).order_by('-order_date')
+
+    @staticmethod
+    def get_user_orders_with_details(user):
+        """
+        Retrieve all orders placed by a user together with their computer details.
+        Orders and computers are loaded with a single joined query.
+        """
+        return [
+            {'order': order, 'computer': ComputerShopFacade._serialize_computer(order.computer)}
+            for order in ComputerShopFacade._user_orders_with_computers(user)
+        ]
+
+    @staticmethod
+    def get_order_with_details(user, order_id):
+        """
+        Retrieve a single order of a user together with its computer details.
+        Returns an (order, computer_details) tuple; raises Http404 if the order
+        does not exist or belongs to another user.
+        """
+        order = get_object_or_404(Order.objects.select_related('computer'), id=order_id, user=user)
+        return order, ComputerShopFacade._serialize_computer(order.computer)
+
+    @staticmethod
+    def get_order(user, order_id):
+        """
+        Retrieve a single order of a user without its computer; raises Http404
+        if the order does not exist or belongs to another user.
+        """
+        return get_object_or_404(Order, id=order_id, user=user)
+
+    @staticmethod
+    def get_order_computer_details(order):
+        """
+        Retrieve the computer details of an order loaded with get_order().
+        """
+        return ComputerShopFacade._serialize_computer(Computer.objects.get(pk=order.computer_id))
+
+    @staticmethod
+    def search_configurations(budget, require=None, objective='balanced', limit=5):
+        """
+        Find the best configurations within a budget; see shop.search.
+        """
+        return search_configurations(budget, require, objective, limit)
+
+    @staticmethod
+    async def acreate_computer(user, case_type, processor, memory, storage, graphics_card, color, peripherals,
+                               is_laptop):
+        """
+        Async variant of create_computer().
+        """
+        configuration = ComputerShopFacade._normalize_configuration(
+            case_type, processor, memory, storage, graphics_card, color, peripherals, is_laptop
+        )
+        computer = ComputerShopFacade._build_computer(user, configuration, await aprice_configuration(configuration))
+        await computer.asave()
+        return computer
+
+    @staticmethod
+    async def aplace_order(user, computer):
+        """
+        Async variant of place_order(). The order and its fulfillment job are
+        created in one transaction, in a worker thread.
+        """
+        return await sync_to_async(ComputerShopFacade.place_order)(user, computer)
+
+    @staticmethod
+    async def aorder_computer(user, **configuration):
+        """
+        Async variant of order_computer(). Transactions have no async API, so
+        the whole unit of work runs in a worker thread.
+        """
+        return await sync_to_async(ComputerShopFacade.order_computer)(user, **configuration)
+
+    @staticmethod
+    async def aget_user_orders_with_details(user):
+        """
+        Async variant of get_user_orders_with_details().
+        """
+        return [
+            {'order': order, 'computer': ComputerShopFacade._serialize_computer(order.computer)}
+            async for order in ComputerShopFacade._user_orders_with_computers(user)
+        ]
+
+    @staticmethod
+    async def aget_order_with_details(user, order_id):
+        """
+        Async variant of get_order_with_details().
+        """
+        try:
+            order = await Order.objects.select_related('computer').aget(id=order_id, user=user)
+        except Order.DoesNotExist:
+            raise Http404("No Order matches the given query.")
+        return order, ComputerShopFacade._serialize_computer(order.computer)
+
+    @staticmethod
+    async def aget_order(user, order_id):
+        """
+        Async variant of get_order().
+        """
+        try:
+            return await Order.objects.aget(id=order_id, user=user)
+        except Order.DoesNotExist:
+            raise Http404("No Order matches the given query.")
+
+    @staticmethod
+    async def aget_order_computer_details(order):
+        """
+        Async variant of get_order_computer_details().
+        """
+        return ComputerShopFacade._serialize_computer(await Computer.objects.aget(pk=order.computer_id))
+
+    @staticmethod
+    async def asearch_configurations(budget, require=None, objective='balanced', limit=5):
+        """
+        Async variant of search_configurations(). The search itself runs no
+        queries; only a due catalog version check does, in a worker thread.
+        """
+        return search_configurations(budget, require, objective, limit, catalog=await aget_catalog())
+
+    @staticmethod
+    def _user_orders_with_computers(user):
+        """
+        Return the orders of a user joined with their computers, newest first.
+        """
+        return (Order.objects.filter(user=user)
+                .select_related('computer')
+                .order_by('-order_date'))
+
+    @staticmethod
+    def _serialize_computer(computer):
+        """
+        Convert a Computer instance into the details dict used by templates.
+        """
         return {
             'id': computer.id,
             'case_type': computer.case_type,
@@ -73,19 +279,67 @@ class ComputerShopFacade:
             'storage': computer.storage,
             'graphics_card': computer.graphics_card,
             'color': computer.color,
-            'peripherals': computer.peripherals.split(', ') if computer.peripherals else [],
+            'peripherals': computer.peripherals,
             'is_laptop': computer.is_laptop,
             'price': computer.price,
         }
 
     @staticmethod
-    def get_user_orders(user):
+    def _normalize_configuration(case_type, processor, memory, storage, graphics_card, color, peripherals,
+                                 is_laptop):
         """
-        Retrieve all orders placed by a specific user.
+        Return a configuration dict with memory and storage cast to int and
+        peripherals as a list. Raises InvalidConfiguration for unknown peripherals.
         """
-        return Order.objects.filter(user=user).order_by('-order_date')
+        peripherals = ComputerShopFacade._normalize_peripherals(peripherals)
+        unknown = [name for name in peripherals if name not in PERIPHERAL_BITS]
+        if unknown:
+            raise InvalidConfiguration(f"Unknown peripherals: {', '.join(map(str, unknown))}.")
+        return {
+            'case_type': case_type,
+            'processor': processor,
+            'memory': ComputerShopFacade._safe_cast_to_int(memory, default=8),
+            'storage': ComputerShopFacade._safe_cast_to_int(storage, default=512),
+            'graphics_card': graphics_card,
+            'color': color,
+            'peripherals': peripherals,
+            'is_laptop': is_laptop,
+        }
 
+    @staticmethod
+    def _configuration_key(configuration):
+        """
+        Return a hashable key identifying a normalized configuration.
+        """
+        return tuple(
+            tuple(value) if key == 'peripherals' else value
+            for key, value in sorted(configuration.items())
+        )
 
+    @staticmethod
+    def _build_computer(user, configuration, price):
+        """
+        Return an unsaved Computer for a normalized configuration.
+        """
+        return Computer(
+            case_type=configuration['case_type'],
+            processor=configuration['processor'],
+            memory=configuration['memory'],
+            storage=configuration['storage'],
+            graphics_card=configuration['graphics_card'],
+            color=configuration['color'],
+            peripherals_mask=encode_peripherals(configuration['peripherals']),
+            is_laptop=configuration['is_laptop'],
+            price=price,
+            owner=user,
+        )
+
+    @staticmethod
+    def _batch_size(batch_size):
+        """
+        Return the INSERT batch size, defaulting to SHOP_BULK_BATCH_SIZE.
+        """
+        return batch_size or getattr(settings, 'SHOP_BULK_BATCH_SIZE', 500)
 
     @staticmethod
     def _safe_cast_to_int(value, default):
@@ -1,101 +1,61 @@
 from django import forms
 
+from .catalog import catalog_choices, get_catalog
+from .models import CatalogComponent, Order
+from .search import OBJECTIVES
+
 
 class CaseSelectionForm(forms.Form):
     """
     Form for selecting the computer case or laptop form factor.
     """
-    CASE_CHOICES = [
-        ('Tower', 'Tower Desktop'),
-        ('Mini', 'Mini Desktop'),
-        ('Slim', 'Slim Desktop'),
-        ('Gaming', 'Gaming Desktop'),
-    ]
-
-    case_type = forms.ChoiceField(choices=CASE_CHOICES, widget=forms.RadioSelect)
+    case_type = forms.ChoiceField(choices=catalog_choices(CatalogComponent.CASE), widget=forms.RadioSelect)
 
 
 class ProcessorSelectionForm(forms.Form):
     """
     Form for selecting the processor type.
     """
-    PROCESSOR_CHOICES = [
-        ('i5-12400', 'Intel Core i5-12400'),
-        ('i7-12700K', 'Intel Core i7-12700K'),
-        ('i9-12900K', 'Intel Core i9-12900K'),
-        ('Ryzen-5-5600X', 'AMD Ryzen 5 5600X'),
-        ('Ryzen-7-5800X', 'AMD Ryzen 7 5800X'),
-    ]
-
-    processor = forms.ChoiceField(choices=PROCESSOR_CHOICES, widget=forms.RadioSelect)
+    processor = forms.ChoiceField(choices=catalog_choices(CatalogComponent.PROCESSOR), widget=forms.RadioSelect)
 
 
 class MemorySelectionForm(forms.Form):
     """
     Form for selecting the amount of RAM.
     """
-    MEMORY_CHOICES = [
-        ('8', '8GB'),
-        ('16', '16GB'),
-        ('32', '32GB'),
-        ('64', '64GB'),
-    ]
-
-    memory = forms.ChoiceField(choices=MEMORY_CHOICES, widget=forms.RadioSelect)
+    memory = forms.ChoiceField(choices=catalog_choices(CatalogComponent.MEMORY), widget=forms.RadioSelect)
 
 
 class StorageSelectionForm(forms.Form):
     """
     Form for selecting the storage capacity.
     """
-    STORAGE_CHOICES = [
-        ('512', '512GB SSD'),
-        ('1024', '1TB SSD'),
-        ('2048', '2TB SSD'),
-    ]
-
-    storage = forms.ChoiceField(choices=STORAGE_CHOICES, widget=forms.RadioSelect)
+    storage = forms.ChoiceField(choices=catalog_choices(CatalogComponent.STORAGE), widget=forms.RadioSelect)
 
 
 class GraphicsSelectionForm(forms.Form):
     """
     Form for selecting the graphics card.
     """
-    GRAPHICS_CHOICES = [
-        ('Integrated', 'Integrated Graphics'),
-        ('RTX-3060', 'NVIDIA RTX 3060'),
-        ('RTX-3070', 'NVIDIA RTX 3070'),
-        ('RTX-3080', 'NVIDIA RTX 3080'),
-        ('RX-6700XT', 'AMD RX 6700XT'),
-    ]
-
-    graphics_card = forms.ChoiceField(choices=GRAPHICS_CHOICES, widget=forms.RadioSelect)
+    graphics_card = forms.ChoiceField(choices=catalog_choices(CatalogComponent.GRAPHICS), widget=forms.RadioSelect)
 
 
 class ColorSelectionForm(forms.Form):
     """
     Form for selecting the computer color.
     """
-    COLOR_CHOICES = [
-        ('Black', 'Midnight Black'),
-        ('White', 'Arctic White'),
-        ('Silver', 'Metallic Silver'),
-        ('Blue', 'Royal Blue'),
-        ('Red', 'Racing Red'),
-    ]
-
-    color = forms.ChoiceField(choices=COLOR_CHOICES, widget=forms.RadioSelect)
+    color = forms.ChoiceField(choices=catalog_choices(CatalogComponent.COLOR), widget=forms.RadioSelect)
 
 
 class PeripheralsSelectionForm(forms.Form):
     """
     Form for selecting additional peripherals.
+    One checkbox is generated for every active peripheral in the catalog.
     """
-    monitor = forms.BooleanField(required=False)
-    keyboard = forms.BooleanField(required=False)
-    mouse = forms.BooleanField(required=False)
-    headset = forms.BooleanField(required=False)
-    webcam = forms.BooleanField(required=False)
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        for key, label in get_catalog().choices[CatalogComponent.PERIPHERAL]:
+            self.fields[key] = forms.BooleanField(required=False, label=label)
 
 
 class DeviceTypeSelectionForm(forms.Form):
@@ -103,3 +63,91 @@ class DeviceTypeSelectionForm(forms.Form):
     Form for selecting between laptop and desktop.
     """
     is_laptop = forms.BooleanField(required=False, label="Make it a Laptop")
+
+
+class OrderConfigurationForm(CaseSelectionForm, ProcessorSelectionForm, MemorySelectionForm,
+                             StorageSelectionForm, GraphicsSelectionForm, ColorSelectionForm,
+                             DeviceTypeSelectionForm):
+    """
+    Form validating a complete configuration submitted in a single request.
+    Combines the wizard step forms, so it accepts exactly the same choices.
+    """
+    peripherals = forms.MultipleChoiceField(choices=catalog_choices(CatalogComponent.PERIPHERAL), required=False)
+
+    def get_configuration(self):
+        """
+        Return the cleaned configuration in the shape expected by the facade.
+        """
+        data = self.cleaned_data
+        return {
+            'case_type': data['case_type'],
+            'processor': data['processor'],
+            'memory': int(data['memory']),
+            'storage': int(data['storage']),
+            'graphics_card': data['graphics_card'],
+            'color': data['color'],
+            'peripherals': list(dict.fromkeys(data['peripherals'])),
+            'is_laptop': data['is_laptop'],
+        }
+
+
+class ConfigurationSearchForm(forms.Form):
+    """
+    Form validating the query of the configuration search API. Component
+    fields list the allowed components; peripherals lists the required ones.
+    """
+    budget = forms.IntegerField(min_value=0)
+    objective = forms.ChoiceField(choices=lambda: [(name, name) for name in OBJECTIVES], required=False)
+    limit = forms.IntegerField(min_value=1, max_value=50, required=False)
+    case_type = forms.MultipleChoiceField(choices=catalog_choices(CatalogComponent.CASE), required=False)
+    processor = forms.MultipleChoiceField(choices=catalog_choices(CatalogComponent.PROCESSOR), required=False)
+    memory = forms.TypedMultipleChoiceField(choices=catalog_choices(CatalogComponent.MEMORY), coerce=int,
+                                            required=False)
+    storage = forms.TypedMultipleChoiceField(choices=catalog_choices(CatalogComponent.STORAGE), coerce=int,
+                                             required=False)
+    graphics_card = forms.MultipleChoiceField(choices=catalog_choices(CatalogComponent.GRAPHICS), required=False)
+    color = forms.MultipleChoiceField(choices=catalog_choices(CatalogComponent.COLOR), required=False)
+    peripherals = forms.MultipleChoiceField(choices=catalog_choices(CatalogComponent.PERIPHERAL), required=False)
+    is_laptop = forms.NullBooleanField(required=False)
+
+    def get_search(self):
+        """
+        Return the cleaned query as keyword arguments of
+        ComputerShopFacade.search_configurations().
+        """
+        data = self.cleaned_data
+        require = {key: data[key] for key in ('case_type', 'processor', 'memory', 'storage', 'graphics_card',
+                                              'color', 'peripherals') if data[key]}
+        if data['is_laptop'] is not None:
+            require['is_laptop'] = data['is_laptop']
+        return {
+            'budget': data['budget'],
+            'require': require,
+            'objective': data['objective'] or 'balanced',
+            'limit': data['limit'] or 5,
+        }
+
+
+class OrderExportForm(forms.Form):
+    """
+    Form validating the format and filters of an order export. Orders placed
+    at or after ``since`` and before ``until`` are exported; ``user`` is a
+    user id or username.
+    """
+    format = forms.ChoiceField(choices=[('csv', 'CSV'), ('jsonl', 'JSON Lines')], required=False)
+    since = forms.DateTimeField(required=False)
+    until = forms.DateTimeField(required=False)
+    status = forms.MultipleChoiceField(choices=[(status, status) for status in Order.STATUSES], required=False)
+    user = forms.CharField(max_length=150, required=False)
+
+    def get_export(self):
+        """
+        Return the format and the keyword arguments of shop.export.export_queryset().
+        """
+        data = self.cleaned_data
+        return data['format'] or 'csv', {
+            'since': data['since'],
+            'until': data['until'],
+            'statuses': data['status'],
+            'user': data['user'],
+        }
@@ -0,0 +1,86 @@
+import threading
+
+from django.conf import settings
+from django.core.cache import caches
+from django.template.loader import render_to_string
+from django.utils.safestring import mark_safe
+
+
+SPEC_TEMPLATE = 'shop/_computer_spec.html'
+
+_stats = {'hits': 0, 'misses': 0}
+_stats_lock = threading.Lock()
+
+
+def computer_spec_key(order):
+    """
+    Return the cache key of the computer spec fragment of an order. The key
+    changes with Order.status_version, so status changes invalidate it. The
+    order date guards against primary keys reused after deletions.
+    """
+    return f'shop:spec:{order.pk}:{order.status_version}:{order.order_date.timestamp():.6f}'
+
+
+def render_computer_spec(order, load_computer):
+    """
+    Return the rendered computer spec fragment of an order, from the fragment
+    cache when possible. ``load_computer`` returns the serialized computer
+    dict; it is only called on a cache miss, so hits need no computer query.
+    """
+    cache = _cache()
+    key = computer_spec_key(order)
+    html = cache.get(key)
+    _count('misses' if html is None else 'hits')
+    if html is None:
+        html = _render(order, load_computer())
+        cache.set(key, html, _timeout())
+    return mark_safe(html)
+
+
+async def arender_computer_spec(order, load_computer):
+    """
+    Async variant of render_computer_spec(); ``load_computer`` is a
+    coroutine function.
+    """
+    cache = _cache()
+    key = computer_spec_key(order)
+    html = await cache.aget(key)
+    _count('misses' if html is None else 'hits')
+    if html is None:
+        html = _render(order, await load_computer())
+        await cache.aset(key, html, _timeout())
+    return mark_safe(html)
+
+
+def fragment_cache_stats():
+    """
+    Return the fragment cache hit and miss counters of this process.
+    """
+    with _stats_lock:
+        return dict(_stats)
+
+
+def reset_fragment_cache_stats():
+    """
+    Set the fragment cache counters back to zero.
+    """
+    with _stats_lock:
+        for name in _stats:
+            _stats[name] = 0
+
+
+def _count(name):
+    with _stats_lock:
+        _stats[name] += 1
+
+
+def _render(order, computer):
+    return render_to_string(SPEC_TEMPLATE, {'order': order, 'computer': computer})
+
+
+def _cache():
+    return caches[getattr(settings, 'SHOP_FRAGMENT_CACHE_ALIAS', 'default')]
+
+
+def _timeout():
+    return getattr(settings, 'SHOP_FRAGMENT_CACHE_TIMEOUT', 60 * 60)
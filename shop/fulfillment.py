@@ -0,0 +1,296 @@
+"""
+Order fulfillment pipeline, run by ``python manage.py fulfillment_worker``.
+
+Placing an order queues the first pipeline step as a FulfillmentJob in the
+same transaction, so the request returns as soon as the order is committed.
+Workers claim due jobs in batches and run them in a thread pool; every
+finished step queues the next one. Failed steps are retried with exponential
+backoff until SHOP_FULFILLMENT_MAX_ATTEMPTS, then the job and the order are
+marked failed.
+
+Steps run outside of a transaction, so slow calls (payment provider, mail)
+hold no database locks; the job is then marked done and the next step queued
+in one transaction. A step may run more than once (a worker dying before
+that commit, an expired lease), so steps must be idempotent.
+"""
+import logging
+import os
+import random
+import threading
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.mail import send_mail
+from django.db import close_old_connections, models, transaction
+from django.utils import timezone
+
+from .models import FulfillmentJob, Order
+from .singleton import DatabaseConnectionSingleton
+from .utils.db import get_db_connection
+
+
+logger = logging.getLogger(__name__)
+
+
+class PermanentFulfillmentError(Exception):
+    """
+    Raised by a step when retrying cannot help; the job fails right away.
+    """
+
+
+class LeaseLost(Exception):
+    """
+    Raised when another worker took over a job whose lease expired.
+    """
+
+
+def verify_payment(order):
+    """
+    Accept a pending order for processing. There is no payment provider yet,
+    so the check is limited to the order having an amount to charge.
+    """
+    if order.computer.price <= 0:
+        raise PermanentFulfillmentError(f"Order #{order.pk} has nothing to charge.")
+    _transition(order, Order.PENDING, Order.PROCESSING)
+
+
+def notify_customer(order):
+    """
+    Email the order confirmation to the customer. Delivery is at least once:
+    a worker dying between sending and committing sends the email again.
+    """
+    if not order.user.email:
+        return
+    send_mail(
+        f"Your order #{order.pk} is being processed",
+        f"Thank you for your order of a {order.computer} for ${order.computer.price}.",
+        None,
+        [order.user.email],
+    )
+
+
+def complete_order(order):
+    """
+    Mark a processed order as completed.
+    """
+    _transition(order, Order.PROCESSING, Order.COMPLETED)
+
+
+PIPELINE = (
+    ('verify_payment', verify_payment),
+    ('notify_customer', notify_customer),
+    ('complete_order', complete_order),
+)
+STEPS = dict(PIPELINE)
+NEXT_STEP = {name: next_name for (name, _), (next_name, _) in zip(PIPELINE, PIPELINE[1:])}
+
+
+def enqueue_fulfillment(orders):
+    """
+    Queue the first pipeline step of saved orders. Call it in the transaction
+    creating the orders; orders that already have the job are skipped.
+    """
+    FulfillmentJob.objects.bulk_create(
+        [FulfillmentJob(order=order, step=PIPELINE[0][0]) for order in orders],
+        ignore_conflicts=True,
+    )
+
+
+def retry_delay(attempts):
+    """
+    Return the backoff before retrying a job that failed ``attempts`` times:
+    exponential from SHOP_FULFILLMENT_RETRY_DELAY up to
+    SHOP_FULFILLMENT_MAX_RETRY_DELAY, with jitter so retries spread out.
+    """
+    base = getattr(settings, 'SHOP_FULFILLMENT_RETRY_DELAY', 2)
+    ceiling = getattr(settings, 'SHOP_FULFILLMENT_MAX_RETRY_DELAY', 300)
+    delay = min(ceiling, base * 2 ** max(0, attempts - 1))
+    return timedelta(seconds=delay * random.uniform(0.5, 1.0))
+
+
+# Statuses the worker may still move to FAILED. Completed and cancelled orders
+# are final; a customer or staff member chose the cancellation.
+FAILABLE_STATUSES = (Order.PENDING, Order.PROCESSING)
+
+
+def _transition(order, from_status, to_status):
+    """
+    Move an order between statuses. Does nothing if the order already has the
+    target status, so repeated steps are harmless.
+    """
+    if order.status == to_status:
+        return
+    if order.status != from_status:
+        raise PermanentFulfillmentError(
+            f"Order #{order.pk} is {order.status!r}, expected {from_status!r}."
+        )
+    if not Order.objects.filter(pk=order.pk, status=from_status).set_status(to_status):
+        raise RuntimeError(f"Order #{order.pk} changed status concurrently.")
+    order.status = to_status
+
+
+class FulfillmentWorker:
+    """
+    Claims due fulfillment jobs and runs them on a pool of threads.
+
+    Claimed jobs are leased for SHOP_FULFILLMENT_LEASE seconds; jobs of a
+    worker that died are queued again once their lease expires. Each thread
+    checks out its database connection through DatabaseConnectionSingleton.
+    """
+
+    def __init__(self, threads=None, batch_size=None, lease=None):
+        self.threads = threads or getattr(settings, 'SHOP_FULFILLMENT_THREADS', 4)
+        self.batch_size = batch_size or getattr(settings, 'SHOP_FULFILLMENT_BATCH_SIZE', 20)
+        self.lease = timedelta(seconds=lease or getattr(settings, 'SHOP_FULFILLMENT_LEASE', 60))
+        self.max_attempts = getattr(settings, 'SHOP_FULFILLMENT_MAX_ATTEMPTS', 5)
+        self.worker_id = f'{os.getpid()}-{uuid.uuid4().hex[:8]}'
+        self._stopping = threading.Event()
+        self._stats_lock = threading.Lock()
+        self._stats = {'done': 0, 'retried': 0, 'failed': 0, 'lost': 0}
+
+    def run(self, until_idle=False, poll_interval=None):
+        """
+        Process jobs until stop() is called, or until no job is due when
+        ``until_idle`` is set. Returns the number of jobs run.
+        """
+        if poll_interval is None:
+            poll_interval = getattr(settings, 'SHOP_FULFILLMENT_POLL_INTERVAL', 1)
+        processed = 0
+        with ThreadPoolExecutor(self.threads, thread_name_prefix='fulfillment') as executor:
+            while not self._stopping.is_set():
+                count = self.run_once(executor)
+                processed += count
+                if not count:
+                    if until_idle:
+                        break
+                    self._stopping.wait(poll_interval)
+        return processed
+
+    def run_once(self, executor=None):
+        """
+        Claim one batch of due jobs and run it, on ``executor`` when given.
+        Returns the number of jobs claimed.
+        """
+        jobs = self.claim()
+        if executor is None:
+            for job in jobs:
+                self.run_job(job)
+        else:
+            list(executor.map(self._run_pooled_job, jobs))
+        return len(jobs)
+
+    def stop(self):
+        """
+        Ask run() to return once the current batch is done.
+        """
+        self._stopping.set()
+
+    def stats(self):
+        """
+        Return the job outcome counters of this worker.
+        """
+        with self._stats_lock:
+            return dict(self._stats)
+
+    def claim(self):
+        """
+        Lease up to batch_size due jobs to this worker and return them.
+        """
+        now = timezone.now()
+        expired = FulfillmentJob.objects.filter(state=FulfillmentJob.RUNNING, lease_expires_at__lt=now)
+        exhausted = dict(expired.filter(attempts__gte=self.max_attempts).values_list('pk', 'order_id'))
+        if exhausted:
+            with transaction.atomic():
+                FulfillmentJob.objects.filter(pk__in=exhausted, state=FulfillmentJob.RUNNING).update(
+                    state=FulfillmentJob.FAILED, last_error='Lease expired too often.', updated_at=now
+                )
+                (Order.objects.filter(pk__in=exhausted.values(), status__in=FAILABLE_STATUSES)
+                 .set_status(Order.FAILED))
+        expired.update(state=FulfillmentJob.QUEUED, updated_at=now)
+
+        token = f'{self.worker_id}-{uuid.uuid4().hex[:12]}'
+        due = (FulfillmentJob.objects
+               .filter(state=FulfillmentJob.QUEUED, run_at__lte=now)
+               .order_by('run_at')
+               .values('pk')[:self.batch_size])
+        claimed = FulfillmentJob.objects.filter(pk__in=due, state=FulfillmentJob.QUEUED).update(
+            state=FulfillmentJob.RUNNING,
+            claimed_by=token,
+            lease_expires_at=now + self.lease,
+            attempts=models.F('attempts') + 1,
+            updated_at=now,
+        )
+        if not claimed:
+            return []
+        return list(FulfillmentJob.objects.filter(state=FulfillmentJob.RUNNING, claimed_by=token))
+
+    def run_job(self, job):
+        """
+        Run the step of a claimed job and record the outcome: 'done',
+        'retried', 'failed' or 'lost' when the lease went to another worker.
+        """
+        get_db_connection()
+        try:
+            outcome = self._run_step(job)
+        finally:
+            DatabaseConnectionSingleton().release()
+        with self._stats_lock:
+            self._stats[outcome] += 1
+        return outcome
+
+    def _run_pooled_job(self, job):
+        # Pool threads outlive jobs; drop broken or expired connections like
+        # request handling does.
+        close_old_connections()
+        try:
+            return self.run_job(job)
+        finally:
+            close_old_connections()
+
+    def _run_step(self, job):
+        try:
+            step = STEPS.get(job.step)
+            if step is None:
+                raise PermanentFulfillmentError(f"Unknown fulfillment step {job.step!r}.")
+            step(Order.objects.select_related('computer', 'user').get(pk=job.order_id))
+            with transaction.atomic():
+                if not self._claimed(job).update(
+                    state=FulfillmentJob.DONE, lease_expires_at=None, last_error='', updated_at=timezone.now()
+                ):
+                    raise LeaseLost
+                if job.step in NEXT_STEP:
+                    FulfillmentJob.objects.bulk_create(
+                        [FulfillmentJob(order_id=job.order_id, step=NEXT_STEP[job.step])], ignore_conflicts=True
+                    )
+            return 'done'
+        except LeaseLost:
+            return 'lost'
+        except Exception as exc:
+            return self._record_failure(job, exc)
+
+    def _record_failure(self, job, exc):
+        error = f'{type(exc).__name__}: {exc}'
+        now = timezone.now()
+        if isinstance(exc, PermanentFulfillmentError) or job.attempts >= self.max_attempts:
+            logger.error("Fulfillment step %s of order #%s failed: %s", job.step, job.order_id, error)
+            with transaction.atomic():
+                if not self._claimed(job).update(
+                    state=FulfillmentJob.FAILED, lease_expires_at=None, last_error=error, updated_at=now
+                ):
+                    return 'lost'
+                Order.objects.filter(pk=job.order_id, status__in=FAILABLE_STATUSES).set_status(Order.FAILED)
+            return 'failed'
+
+        logger.warning("Fulfillment step %s of order #%s will be retried: %s", job.step, job.order_id, error)
+        if not self._claimed(job).update(
+            state=FulfillmentJob.QUEUED, run_at=now + retry_delay(job.attempts), lease_expires_at=None,
+            last_error=error, updated_at=now
+        ):
+            return 'lost'
+        return 'retried'
+
+    @staticmethod
+    def _claimed(job):
+        return FulfillmentJob.objects.filter(pk=job.pk, state=FulfillmentJob.RUNNING, claimed_by=job.claimed_by)
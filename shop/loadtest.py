@@ -0,0 +1,322 @@
+"""
+End-to-end load test of the registration, wizard and order flows, run with
+``python manage.py loadtest``.
+
+Every simulated user registers (or logs in), walks through the wizard steps,
+views the summary, places the order and lists their orders. Users run
+concurrently on a thread pool, either through the Django test client or over
+HTTP against a local threaded WSGI server. Latency is measured per view on
+the client side; SQL queries and SQLite lock errors are counted on the
+server side through request signals.
+"""
+import json
+import re
+import sys
+import threading
+import time
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
+from http.cookiejar import CookieJar
+from urllib import error, parse, request as urllib_request
+
+from django.core.signals import got_request_exception, request_finished, request_started
+from django.db import OperationalError, connection
+from django.urls import Resolver404, resolve, reverse
+
+from .benchmarks import WIZARD_STEPS, percentile, random_configurations
+
+
+PASSWORD = 'Load-test-pass-42'
+
+CSRF_FIELD = re.compile(r'name="csrfmiddlewaretoken" value="([^"]+)"')
+
+
+def view_name(path):
+    """
+    Return the URL name of a path, or the path itself when it does not resolve.
+    """
+    try:
+        return resolve(parse.urlsplit(path).path).url_name or path
+    except Resolver404:
+        return path
+
+
+class ServerStats:
+    """
+    Collects SQL query counts and SQLite lock errors per view from the request
+    signals, for requests handled in this process.
+    """
+
+    def __init__(self):
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        self.queries = defaultdict(list)
+        self.lock_errors = defaultdict(int)
+
+    def connect(self):
+        request_started.connect(self._started, dispatch_uid='shop.loadtest.started')
+        request_finished.connect(self._finished, dispatch_uid='shop.loadtest.finished')
+        got_request_exception.connect(self._exception, dispatch_uid='shop.loadtest.exception')
+
+    def disconnect(self):
+        request_started.disconnect(dispatch_uid='shop.loadtest.started')
+        request_finished.disconnect(dispatch_uid='shop.loadtest.finished')
+        got_request_exception.disconnect(dispatch_uid='shop.loadtest.exception')
+
+    def _started(self, sender, environ=None, scope=None, **kwargs):
+        path = environ['PATH_INFO'] if environ is not None else scope['path']
+        method = environ['REQUEST_METHOD'] if environ is not None else scope['method']
+        self._local.key = f'{method} {view_name(path)}'
+        self._local.count = 0
+        connection.execute_wrappers.append(self._count)
+
+    def _count(self, execute, sql, params, many, context):
+        self._local.count += 1
+        return execute(sql, params, many, context)
+
+    def _finished(self, sender, **kwargs):
+        if self._count not in connection.execute_wrappers:
+            return
+        connection.execute_wrappers.remove(self._count)
+        with self._lock:
+            self.queries[self._local.key].append(self._local.count)
+
+    def _exception(self, sender, request=None, **kwargs):
+        exc = sys.exc_info()[1]
+        if isinstance(exc, OperationalError) and 'locked' in str(exc):
+            with self._lock:
+                self.lock_errors[getattr(self._local, 'key', '?')] += 1
+
+
+class TestClientSession:
+    """
+    Browser session driven through the Django test client.
+    """
+
+    def __init__(self):
+        from django.test import Client
+        self.client = Client(raise_request_exception=False)
+
+    def get(self, path):
+        response = self.client.get(path)
+        return response.status_code, response.get('Location'), response.content
+
+    def post(self, path, data):
+        # Browsers always submit the CSRF field, so forms with every checkbox
+        # cleared still post a bound form.
+        response = self.client.post(path, dict(data, csrfmiddlewaretoken='unchecked'))
+        return response.status_code, response.get('Location'), response.content
+
+
+class HttpSession:
+    """
+    Browser session talking HTTP to a server, with cookies and CSRF tokens.
+    Redirects are returned rather than followed.
+    """
+
+    class _NoRedirect(urllib_request.HTTPRedirectHandler):
+        def redirect_request(self, *args, **kwargs):
+            return None
+
+    def __init__(self, base_url):
+        self.base_url = base_url
+        self.cookies = CookieJar()
+        self.opener = urllib_request.build_opener(
+            urllib_request.HTTPCookieProcessor(self.cookies), self._NoRedirect
+        )
+        self.csrf_token = None
+
+    def get(self, path):
+        return self._open(urllib_request.Request(self.base_url + path))
+
+    def post(self, path, data):
+        data = dict(data, csrfmiddlewaretoken=self.csrf_token or '')
+        return self._open(urllib_request.Request(
+            self.base_url + path, data=parse.urlencode(data, doseq=True).encode(),
+            headers={'Referer': self.base_url + path},
+        ))
+
+    def _open(self, req):
+        try:
+            with self.opener.open(req) as response:
+                status, location, content = response.status, response.headers.get('Location'), response.read()
+        except error.HTTPError as exc:
+            status, location, content = exc.code, exc.headers.get('Location'), exc.read()
+        match = CSRF_FIELD.search(content.decode('utf-8', 'replace'))
+        if match:
+            self.csrf_token = match.group(1)
+        return status, location, content
+
+
+class LoadTest:
+    """
+    Runs the flows of ``users`` simulated users on ``concurrency`` threads.
+    Sessions are made by ``session_factory``; with ``login`` the users are
+    created up front and log in instead of registering.
+    """
+
+    def __init__(self, session_factory, users, concurrency, login=False, seed=0):
+        self.session_factory = session_factory
+        self.users = users
+        self.concurrency = concurrency
+        self.login = login
+        self.configs = random_configurations(users, seed=seed)
+        self.prefix = f'load{int(time.time() * 1000) % 10 ** 8}-'
+        self.server = ServerStats()
+        self._lock = threading.Lock()
+        self.latencies = defaultdict(list)
+        self.errors = defaultdict(int)
+        self.failed_flows = 0
+
+    def run(self):
+        """
+        Run every flow and return the results dict.
+        """
+        if self.login:
+            self.create_users()
+        self.server.connect()
+        started = time.perf_counter()
+        try:
+            with ThreadPoolExecutor(self.concurrency, thread_name_prefix='loadtest') as executor:
+                list(executor.map(self.run_flow, range(self.users)))
+        finally:
+            elapsed = time.perf_counter() - started
+            self.server.disconnect()
+        return self.results(elapsed)
+
+    def create_users(self):
+        from django.contrib.auth.models import User
+        for index in range(self.users):
+            User.objects.create_user(username=self.username(index), password=PASSWORD,
+                                     email=f'{self.username(index)}@example.com')
+
+    def username(self, index):
+        return f'{self.prefix}{index}'
+
+    def run_flow(self, index):
+        """
+        register/login -> wizard steps -> summary -> order -> my_orders.
+        """
+        session = self.session_factory()
+        username = self.username(index)
+        config = self.configs[index]
+        try:
+            if self.login:
+                self.request(session, 'GET', reverse('registration_app:login'))
+                self.request(session, 'POST', reverse('registration_app:login'),
+                             {'username': username, 'password': PASSWORD}, expect=302)
+            else:
+                self.request(session, 'GET', reverse('registration_app:register'))
+                self.request(session, 'POST', reverse('registration_app:register'), {
+                    'username': username, 'email': f'{username}@example.com',
+                    'password1': PASSWORD, 'password2': PASSWORD,
+                }, expect=302)
+            for url_name, data in WIZARD_STEPS:
+                self.request(session, 'GET', reverse(url_name))
+                self.request(session, 'POST', reverse(url_name), data(config), expect=302)
+            self.request(session, 'GET', reverse('summary'))
+            location = self.request(session, 'POST', reverse('summary'), {}, expect=302)
+            self.request(session, 'GET', location)
+            self.request(session, 'GET', reverse('my_orders'))
+        except FlowFailed:
+            with self._lock:
+                self.failed_flows += 1
+
+    def request(self, session, method, path, data=None, expect=200):
+        """
+        Send one request, record its latency and return the redirect location.
+        Raises FlowFailed when the status is not the expected one.
+        """
+        started = time.perf_counter()
+        if method == 'GET':
+            status, location, _ = session.get(path)
+        else:
+            status, location, _ = session.post(path, data)
+        elapsed = time.perf_counter() - started
+        key = f'{method} {view_name(path)}'
+        with self._lock:
+            self.latencies[key].append(elapsed)
+            if status != expect:
+                self.errors[key] += 1
+        if status != expect:
+            raise FlowFailed(f'{key} returned {status}, expected {expect}')
+        if location:
+            return parse.urlsplit(location).path
+        return None
+
+    def results(self, elapsed):
+        requests = sum(len(samples) for samples in self.latencies.values())
+        views = {}
+        for key, samples in sorted(self.latencies.items()):
+            queries = self.server.queries.get(key, [])
+            views[key] = {
+                'requests': len(samples),
+                'errors': self.errors.get(key, 0),
+                'lock_errors': self.server.lock_errors.get(key, 0),
+                'p50_ms': percentile(samples, 0.5) * 1000,
+                'p95_ms': percentile(samples, 0.95) * 1000,
+                'p99_ms': percentile(samples, 0.99) * 1000,
+                'mean_ms': sum(samples) / len(samples) * 1000,
+                'queries': sum(queries) / len(queries) if queries else None,
+            }
+        return {
+            'users': self.users,
+            'concurrency': self.concurrency,
+            'auth': 'login' if self.login else 'register',
+            'seconds': elapsed,
+            'requests': requests,
+            'requests_per_second': requests / elapsed if elapsed else 0.0,
+            'flows_per_second': (self.users - self.failed_flows) / elapsed if elapsed else 0.0,
+            'failed_flows': self.failed_flows,
+            'lock_errors': sum(self.server.lock_errors.values()),
+            'views': views,
+        }
+
+
+class FlowFailed(Exception):
+    """
+    Raised when a request of a flow gets an unexpected response.
+    """
+
+
+def serve(application):
+    """
+    Start a threaded WSGI server for ``application`` on a free local port.
+    Returns the server; stop it with shutdown().
+    """
+    from django.core.servers.basehttp import ThreadedWSGIServer, WSGIRequestHandler
+
+    class QuietHandler(WSGIRequestHandler):
+        def log_message(self, *args):
+            pass
+
+    server = ThreadedWSGIServer(('127.0.0.1', 0), QuietHandler, allow_reuse_address=False)
+    server.daemon_threads = True
+    server.set_app(application)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+def write_results(results, path):
+    """
+    Write a results dict as JSON.
+    """
+    with open(path, 'w') as output:
+        json.dump(results, output, indent=2, sort_keys=True)
+
+
+def compare(results, baseline):
+    """
+    Return report lines comparing a run with a baseline results dict.
+    """
+    def change(new, old):
+        return f'{(new - old) / old * 100:+.1f}%' if old else 'n/a'
+
+    lines = [f"requests/s {baseline['requests_per_second']:.1f} -> {results['requests_per_second']:.1f} "
+             f"({change(results['requests_per_second'], baseline['requests_per_second'])})"]
+    for key, view in results['views'].items():
+        old = baseline['views'].get(key)
+        if old:
+            lines.append(f"{key:>32} p95 {old['p95_ms']:.1f} -> {view['p95_ms']:.1f} ms "
+                         f"({change(view['p95_ms'], old['p95_ms'])})")
+    return lines
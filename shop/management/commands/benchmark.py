@@ -0,0 +1,22 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from shop.benchmarks import BENCHMARKS
+
+
+class Command(BaseCommand):
+    """
+    Run one of the registered shop benchmarks.
+    """
+    help = 'Run a performance benchmark and print its report.'
+
+    def add_arguments(self, parser):
+        subparsers = parser.add_subparsers(dest='benchmark', title='benchmarks')
+        for name, benchmark in sorted(BENCHMARKS.items()):
+            benchmark.add_arguments(subparsers.add_parser(name, help=benchmark.help))
+
+    def handle(self, *args, **options):
+        name = options.pop('benchmark')
+        if name not in BENCHMARKS:
+            raise CommandError(f"Choose a benchmark: {', '.join(sorted(BENCHMARKS))}")
+        self.stdout.write(f'== {name} ==')
+        BENCHMARKS[name].run(self.stdout.write, **options)
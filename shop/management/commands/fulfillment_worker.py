@@ -0,0 +1,35 @@
+import signal
+
+from django.core.management.base import BaseCommand
+
+from shop.fulfillment import FulfillmentWorker
+
+
+class Command(BaseCommand):
+    """
+    Run the order fulfillment worker.
+    """
+    help = 'Claim queued order fulfillment jobs and run them on a thread pool.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--threads', type=int,
+                            help='Worker threads (default: SHOP_FULFILLMENT_THREADS).')
+        parser.add_argument('--batch-size', type=int,
+                            help='Jobs claimed per poll (default: SHOP_FULFILLMENT_BATCH_SIZE).')
+        parser.add_argument('--poll-interval', type=float,
+                            help='Seconds to wait when no job is due (default: SHOP_FULFILLMENT_POLL_INTERVAL).')
+        parser.add_argument('--until-idle', action='store_true',
+                            help='Exit once no job is due instead of polling forever.')
+
+    def handle(self, *args, **options):
+        worker = FulfillmentWorker(threads=options['threads'], batch_size=options['batch_size'])
+        for signum in (signal.SIGINT, signal.SIGTERM):
+            signal.signal(signum, lambda *args: worker.stop())
+
+        self.stdout.write(f'Fulfillment worker {worker.worker_id} running {worker.threads} threads.')
+        processed = worker.run(until_idle=options['until_idle'], poll_interval=options['poll_interval'])
+        stats = worker.stats()
+        self.stdout.write(
+            f"Processed {processed} jobs: {stats['done']} done, {stats['retried']} retried, "
+            f"{stats['failed']} failed, {stats['lost']} lost."
+        )
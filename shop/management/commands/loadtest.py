@@ -0,0 +1,93 @@
+import json
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.test import override_settings
+
+from shop.benchmarks import scratch_database
+from shop.loadtest import HttpSession, LoadTest, TestClientSession, compare, serve, write_results
+
+
+class Command(BaseCommand):
+    """
+    Drive full register/wizard/order flows concurrently against a throwaway database.
+    """
+    help = 'Load test the registration, wizard and order flows and write the results as JSON.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--users', type=int, default=20,
+                            help='Simulated users; each one runs the full flow once.')
+        parser.add_argument('--concurrency', type=int, default=4,
+                            help='Users running at the same time.')
+        parser.add_argument('--transport', choices=('client', 'wsgi'), default='client',
+                            help='Django test client, or HTTP against a local threaded WSGI server.')
+        parser.add_argument('--login', action='store_true',
+                            help='Create the users up front and log in instead of registering.')
+        parser.add_argument('--fast-hashing', action='store_true',
+                            help='Use a cheap password hasher so hashing does not dominate.')
+        parser.add_argument('--output', default='loadtest.json',
+                            help='Results file (default: loadtest.json).')
+        parser.add_argument('--compare', metavar='FILE',
+                            help='Previous results file to compare with.')
+
+    def handle(self, *args, **options):
+        if options['users'] < 1 or options['concurrency'] < 1:
+            raise CommandError('--users and --concurrency must be positive.')
+        baseline = None
+        if options['compare']:
+            with open(options['compare']) as previous:
+                baseline = json.load(previous)
+
+        hashers = ['django.contrib.auth.hashers.MD5PasswordHasher'] if options['fast_hashing'] else None
+        with scratch_database(), override_settings(PASSWORD_HASHERS=hashers or _current_hashers()):
+            if options['transport'] == 'wsgi':
+                results = self.run_over_http(options)
+            else:
+                results = LoadTest(TestClientSession, options['users'], options['concurrency'],
+                                   login=options['login']).run()
+        results['transport'] = options['transport']
+
+        self.report(results)
+        write_results(results, options['output'])
+        self.stdout.write(f"Results written to {options['output']}")
+        if baseline:
+            for line in compare(results, baseline):
+                self.stdout.write(line)
+
+    def run_over_http(self, options):
+        from django.core.wsgi import get_wsgi_application
+
+        # Server threads are short lived; do not keep their connections around.
+        max_age = connection.settings_dict['CONN_MAX_AGE']
+        connection.settings_dict['CONN_MAX_AGE'] = 0
+        server = serve(get_wsgi_application())
+        base_url = f'http://127.0.0.1:{server.server_port}'
+        try:
+            with override_settings(ALLOWED_HOSTS=['127.0.0.1']):
+                return LoadTest(lambda: HttpSession(base_url), options['users'], options['concurrency'],
+                                login=options['login']).run()
+        finally:
+            server.shutdown()
+            server.server_close()
+            connection.settings_dict['CONN_MAX_AGE'] = max_age
+
+    def report(self, results):
+        self.stdout.write(
+            f"{results['users']} users, concurrency {results['concurrency']}, {results['transport']}: "
+            f"{results['requests']} requests in {results['seconds']:.1f}s, "
+            f"{results['requests_per_second']:.1f} req/s, {results['flows_per_second']:.2f} flows/s, "
+            f"{results['failed_flows']} failed flows, {results['lock_errors']} SQLite lock errors"
+        )
+        self.stdout.write(f"{'view':>32} {'count':>6} {'err':>4} {'p50 ms':>8} {'p95 ms':>8} "
+                          f"{'p99 ms':>8} {'queries':>8}")
+        for key, view in results['views'].items():
+            queries = f"{view['queries']:.1f}" if view['queries'] is not None else '-'
+            self.stdout.write(
+                f"{key:>32} {view['requests']:>6} {view['errors']:>4} {view['p50_ms']:>8.1f} "
+                f"{view['p95_ms']:>8.1f} {view['p99_ms']:>8.1f} {queries:>8}"
+            )
+
+
+def _current_hashers():
+    from django.conf import settings
+    return settings.PASSWORD_HASHERS
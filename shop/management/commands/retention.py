@@ -0,0 +1,38 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from shop.retention import POLICIES, rows_per_second
+
+
+class Command(BaseCommand):
+    """
+    Purge data kept past its retention in small transactions.
+    """
+    help = 'Delete expired sessions, spent confirmation tokens and abandoned wizard data in chunks.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('policies', nargs='*', metavar='policy',
+                            help=f"Policies to run: {', '.join(POLICIES)} (default: all).")
+        parser.add_argument('--chunk-size', type=int,
+                            help='Rows per chunk and transaction (default: SHOP_RETENTION_CHUNK_SIZE).')
+        parser.add_argument('--pause', type=float, default=0,
+                            help='Seconds to sleep between chunks.')
+        parser.add_argument('--dry-run', action='store_true',
+                            help='Only count the rows that would be purged.')
+
+    def handle(self, *args, **options):
+        names = options['policies'] or list(POLICIES)
+        unknown = set(names) - set(POLICIES)
+        if unknown:
+            raise CommandError(f"Unknown policies: {', '.join(sorted(unknown))}. Choose from {', '.join(POLICIES)}.")
+        chunk_size = options['chunk_size'] or getattr(settings, 'SHOP_RETENTION_CHUNK_SIZE', 500)
+        if chunk_size < 1:
+            raise CommandError('--chunk-size must be positive.')
+
+        verb = 'would purge' if options['dry_run'] else 'purged'
+        for name in names:
+            result = POLICIES[name].run(chunk_size, dry_run=options['dry_run'], pause=options['pause'])
+            self.stdout.write(
+                f'{name}: {verb} {result.rows} rows in {result.chunks} chunks, '
+                f'{result.seconds:.2f}s ({rows_per_second(result):.0f} rows/s)'
+            )
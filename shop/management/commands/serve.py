@@ -0,0 +1,82 @@
+import logging
+import os
+import signal
+import socket
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from shop.server import LISTEN_FD_ENV, PreforkServer, QuietRequestHandler, listen, load_application
+
+
+class Command(BaseCommand):
+    """
+    Serve the project with pre-forked worker processes.
+    """
+    help = 'Serve the WSGI application with a master process forking preloaded workers.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--bind', default='127.0.0.1:8000',
+                            help='host:port to listen on (default: 127.0.0.1:8000).')
+        parser.add_argument('--workers', type=int,
+                            help='Worker processes (default: SHOP_SERVE_WORKERS, 0 for one per CPU).')
+        parser.add_argument('--threads', type=int,
+                            help='Request threads per worker (default: SHOP_SERVE_THREADS).')
+        parser.add_argument('--max-requests', type=int,
+                            help='Requests after which a worker is replaced, 0 for never '
+                                 '(default: SHOP_SERVE_MAX_REQUESTS).')
+        parser.add_argument('--max-requests-jitter', type=int,
+                            help='Random extra requests per worker, so workers are not replaced together '
+                                 '(default: SHOP_SERVE_MAX_REQUESTS_JITTER).')
+        parser.add_argument('--timeout', type=int,
+                            help='Seconds without heartbeat before a worker is killed (default: SHOP_SERVE_TIMEOUT).')
+        parser.add_argument('--status-file',
+                            help='Write the health of the workers as JSON to this file every second.')
+        parser.add_argument('--access-log', action='store_true',
+                            help='Log every request.')
+        parser.add_argument('--check', action='store_true',
+                            help='Only check that the application loads, then exit.')
+
+    def handle(self, *args, **options):
+        if not hasattr(os, 'fork'):
+            raise CommandError('The serve command needs os.fork(); use runserver on this platform.')
+        application = load_application()
+        if options['check']:
+            self.stdout.write('Application loaded.')
+            return
+
+        if LISTEN_FD_ENV in os.environ:
+            sock = socket.socket(fileno=int(os.environ.pop(LISTEN_FD_ENV)))  # inherited on reload
+        else:
+            host, _, port = options['bind'].rpartition(':')
+            try:
+                sock = listen((host.strip('[]') or '0.0.0.0', int(port)))
+            except (OSError, ValueError) as exc:
+                raise CommandError(f"Cannot listen on {options['bind']}: {exc}")
+
+        def option(name, setting, default):
+            return options[name] if options[name] is not None else getattr(settings, setting, default)
+
+        QuietRequestHandler.access_log = options['access_log']
+        logging.basicConfig(level=logging.INFO, format='[%(asctime)s] %(process)d %(levelname)s %(message)s')
+        server = PreforkServer(
+            application, sock,
+            workers=option('workers', 'SHOP_SERVE_WORKERS', 0) or os.cpu_count() or 1,
+            threads=option('threads', 'SHOP_SERVE_THREADS', 1),
+            max_requests=option('max_requests', 'SHOP_SERVE_MAX_REQUESTS', 0),
+            max_requests_jitter=option('max_requests_jitter', 'SHOP_SERVE_MAX_REQUESTS_JITTER', 0),
+            timeout=option('timeout', 'SHOP_SERVE_TIMEOUT', 30),
+            graceful_timeout=getattr(settings, 'SHOP_SERVE_GRACEFUL_TIMEOUT', 30),
+            status_file=options['status_file'],
+        )
+        signal.signal(signal.SIGTERM, server.stop)
+        signal.signal(signal.SIGINT, server.stop)
+        signal.signal(signal.SIGHUP, server.request_reload)
+        signal.signal(signal.SIGUSR1, server.request_report)
+
+        address = sock.getsockname()
+        self.stdout.write(f'Serving on http://{address[0]}:{address[1]}/ with {server.worker_count} workers '
+                          f'x {server.threads} threads (master pid {os.getpid()}).')
+        self.stdout.flush()
+        server.run()
+        self.stdout.write('Stopped.')
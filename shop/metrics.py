@@ -0,0 +1,283 @@
+"""
+Per-view request and SQL metrics, exposed in the Prometheus text format at
+``/metrics``.
+
+MetricsMiddleware records, per view name and method, the request count by
+status class, a latency histogram, the number of SQL queries and the time
+spent in them. Queries are counted by a wrapper added to the
+execute_wrappers of every database connection, so queries run from
+sync_to_async threads of async views are counted too.
+
+Each thread writes its own shard of counters, so recording takes no lock.
+Shards are only summed when /metrics is scraped. Metrics are per process:
+scrape every worker process, or the numbers only cover one of them.
+"""
+import threading
+import time
+from bisect import bisect_left
+from contextvars import ContextVar
+
+from django.conf import settings
+from django.db.backends.signals import connection_created
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+
+
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+UNMATCHED = '<unmatched>'
+
+# Methods recorded as themselves; others share one label, so clients cannot
+# create new series by sending arbitrary methods.
+METHODS = frozenset(('GET', 'HEAD', 'POST', 'PUT', 'PATCH', 'DELETE', 'OPTIONS', 'TRACE', 'CONNECT'))
+OTHER_METHOD = 'OTHER'
+
+_current_request = ContextVar('shop_metrics_request', default=None)
+_shards = []
+_shards_lock = threading.Lock()
+_local = threading.local()
+
+
+class ViewStats:
+    """
+    Counters of one view and method.
+    """
+    __slots__ = ('statuses', 'buckets', 'seconds', 'queries', 'query_seconds')
+
+    def __init__(self, bucket_count):
+        self.statuses = {}
+        self.buckets = [0] * (bucket_count + 1)  # the last one is +Inf
+        self.seconds = 0.0
+        self.queries = 0
+        self.query_seconds = 0.0
+
+    def merge(self, other):
+        for status, count in other.statuses.copy().items():
+            self.statuses[status] = self.statuses.get(status, 0) + count
+        self.buckets = [mine + theirs for mine, theirs in zip(self.buckets, other.buckets)]
+        self.seconds += other.seconds
+        self.queries += other.queries
+        self.query_seconds += other.query_seconds
+
+
+class Shard:
+    """
+    Counters written by a single thread.
+    """
+
+    def __init__(self, thread=None):
+        self.thread = thread
+        self.views = {}
+
+
+def buckets():
+    """
+    Return the upper bounds of the latency histogram buckets, in seconds.
+    """
+    return tuple(getattr(settings, 'SHOP_METRICS_BUCKETS', DEFAULT_BUCKETS))
+
+
+def record_sql(execute, sql, params, many, context):
+    """
+    Database execute wrapper adding the query to the request being measured.
+    """
+    current = _current_request.get()
+    if current is None:
+        return execute(sql, params, many, context)
+    started = time.perf_counter()
+    try:
+        return execute(sql, params, many, context)
+    finally:
+        current[0] += 1
+        current[1] += time.perf_counter() - started
+
+
+def install_sql_wrapper(connection, **kwargs):
+    """
+    connection_created receiver adding record_sql to the connection.
+
+    The signal can fire inside a ``with connection.execute_wrapper(...)``
+    block, which removes its wrapper with pop() on exit, so record_sql goes
+    to the bottom of the stack rather than the top.
+    """
+    if record_sql not in connection.execute_wrappers:
+        connection.execute_wrappers.insert(0, record_sql)
+
+
+def record(view, method, status, seconds, queries, query_seconds, bounds=None):
+    """
+    Add a finished request to the shard of the current thread. ``bounds``
+    are the histogram buckets, read from the settings when not given.
+    """
+    if bounds is None:
+        bounds = buckets()
+    shard = getattr(_local, 'shard', None)
+    if shard is None:
+        shard = _local.shard = Shard(threading.current_thread())
+        with _shards_lock:
+            _shards.append(shard)
+    key = (view, method)
+    stats = shard.views.get(key)
+    if stats is None:
+        stats = shard.views[key] = ViewStats(len(bounds))
+    status_class = f'{status // 100}xx'
+    stats.statuses[status_class] = stats.statuses.get(status_class, 0) + 1
+    stats.buckets[bisect_left(bounds, seconds)] += 1
+    stats.seconds += seconds
+    stats.queries += queries
+    stats.query_seconds += query_seconds
+
+
+def snapshot():
+    """
+    Return the counters of all threads summed per (view, method). Shards of
+    threads that exited are folded into one, so thread-per-request servers
+    do not grow the shard list forever.
+    """
+    total = {}
+    with _shards_lock:
+        retired = [shard for shard in _shards if shard.thread is not None and not shard.thread.is_alive()]
+        if retired:
+            dead = Shard()
+            for shard in retired:
+                _merge_into(dead.views, shard.views)
+                _shards.remove(shard)
+            _shards.append(dead)
+        shards = list(_shards)
+    for shard in shards:
+        _merge_into(total, shard.views)
+    return total
+
+
+def reset():
+    """
+    Drop all recorded counters.
+    """
+    with _shards_lock:
+        for shard in _shards:
+            shard.views = {}
+
+
+def render_metrics():
+    """
+    Return all metrics in the Prometheus text exposition format.
+    """
+    from .fragments import fragment_cache_stats
+    from .singleton import DatabaseConnectionSingleton
+
+    views = sorted(snapshot().items())
+    bounds = buckets()
+    lines = []
+
+    def family(name, kind, help_text):
+        lines.append(f'# HELP {name} {help_text}')
+        lines.append(f'# TYPE {name} {kind}')
+
+    family('shop_http_requests_total', 'counter', 'Requests handled, by view, method and status class.')
+    for (view, method), stats in views:
+        for status, count in sorted(stats.statuses.items()):
+            lines.append(f'shop_http_requests_total{_labels(view=view, method=method, status=status)} {count}')
+
+    family('shop_http_request_duration_seconds', 'histogram', 'Request latency, by view and method.')
+    for (view, method), stats in views:
+        cumulative = 0
+        for bound, count in zip(bounds + ('+Inf',), stats.buckets):
+            cumulative += count
+            le = bound if isinstance(bound, str) else repr(float(bound))
+            lines.append(f'shop_http_request_duration_seconds_bucket'
+                         f'{_labels(view=view, method=method, le=le)} {cumulative}')
+        labels = _labels(view=view, method=method)
+        lines.append(f'shop_http_request_duration_seconds_sum{labels} {stats.seconds!r}')
+        lines.append(f'shop_http_request_duration_seconds_count{labels} {cumulative}')
+
+    family('shop_db_queries_total', 'counter', 'SQL queries run while handling requests, by view and method.')
+    for (view, method), stats in views:
+        lines.append(f'shop_db_queries_total{_labels(view=view, method=method)} {stats.queries}')
+
+    family('shop_db_query_seconds_total', 'counter', 'Time spent in SQL queries, by view and method.')
+    for (view, method), stats in views:
+        lines.append(f'shop_db_query_seconds_total{_labels(view=view, method=method)} {stats.query_seconds!r}')
+
+    if DatabaseConnectionSingleton._instance is not None:
+        pool = DatabaseConnectionSingleton().stats()
+        for name, kind, help_text in (
+            ('checkouts', 'counter', 'Connection checkouts.'),
+            ('waits', 'counter', 'Checkouts that had to wait for a free slot.'),
+            ('wait_seconds', 'counter', 'Time spent waiting for a free slot.'),
+            ('timeouts', 'counter', 'Checkouts that gave up waiting.'),
+            ('connects', 'counter', 'New database connections.'),
+            ('reconnects', 'counter', 'Connections replaced after failing the health check.'),
+            ('in_use', 'gauge', 'Connections checked out right now.'),
+            ('open', 'gauge', 'Open connections tracked by the pool.'),
+            ('pool_size', 'gauge', 'Configured pool size.'),
+        ):
+            metric = f'shop_db_pool_{name}_total' if kind == 'counter' else f'shop_db_pool_{name}'
+            family(metric, kind, help_text)
+            lines.append(f'{metric} {pool[name]!r}')
+
+    fragments = fragment_cache_stats()
+    family('shop_fragment_cache_requests_total', 'counter', 'Order page fragment cache lookups, by result.')
+    for result, name in (('hit', 'hits'), ('miss', 'misses')):
+        lines.append(f'shop_fragment_cache_requests_total{_labels(result=result)} {fragments[name]}')
+    return '\n'.join(lines) + '\n'
+
+
+class MetricsMiddleware:
+    """
+    Record per-view request metrics. Put it first in MIDDLEWARE so the
+    latency covers the other middleware. Supports sync and async stacks.
+    """
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.bounds = buckets()
+        if iscoroutinefunction(self.get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        current = [0, 0.0]
+        token = _current_request.set(current)
+        started = time.perf_counter()
+        try:
+            response = self.get_response(request)
+        finally:
+            _current_request.reset(token)
+        self._record(request, response, time.perf_counter() - started, current)
+        return response
+
+    async def __acall__(self, request):
+        current = [0, 0.0]
+        token = _current_request.set(current)
+        started = time.perf_counter()
+        try:
+            response = await self.get_response(request)
+        finally:
+            _current_request.reset(token)
+        self._record(request, response, time.perf_counter() - started, current)
+        return response
+
+    def _record(self, request, response, seconds, current):
+        match = getattr(request, 'resolver_match', None)
+        view = match.view_name if match is not None else UNMATCHED
+        method = request.method if request.method in METHODS else OTHER_METHOD
+        record(view, method, response.status_code, seconds, current[0], current[1], self.bounds)
+
+
+def _merge_into(target, views):
+    for key, stats in views.copy().items():
+        if key not in target:
+            target[key] = ViewStats(len(stats.buckets) - 1)
+        target[key].merge(stats)
+
+
+def _labels(**labels):
+    def escape(value):
+        return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+    return '{' + ','.join(f'{name}="{escape(value)}"' for name, value in labels.items()) + '}'
+
+
+connection_created.connect(install_sql_wrapper, dispatch_uid='shop.metrics.install_sql_wrapper')
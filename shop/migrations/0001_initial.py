@@ -0,0 +1,44 @@
+# Generated by Django 5.1.7 on 2026-10-18 10:54
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    initial = True
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Computer',
+            fields=[
+                ('id', models.AutoField(primary_key=True, serialize=False)),
+                ('case_type', models.CharField(max_length=100)),
+                ('processor', models.CharField(max_length=100)),
+                ('memory', models.IntegerField()),
+                ('storage', models.IntegerField()),
+                ('graphics_card', models.CharField(max_length=100)),
+                ('color', models.CharField(max_length=50)),
+                ('peripherals', models.TextField(blank=True, null=True)),
+                ('is_laptop', models.BooleanField(default=False)),
+                ('price', models.DecimalField(decimal_places=2, max_digits=10)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('owner', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='computers', to=settings.AUTH_USER_MODEL)),
+            ],
+        ),
+        migrations.CreateModel(
+            name='Order',
+            fields=[
+                ('id', models.AutoField(primary_key=True, serialize=False)),
+                ('order_date', models.DateTimeField(auto_now_add=True)),
+                ('status', models.CharField(default='Pending', max_length=50)),
+                ('computer', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, to='shop.computer')),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='orders', to=settings.AUTH_USER_MODEL)),
+            ],
+        ),
+    ]
@@ -0,0 +1,89 @@
+# Generated by Django 5.1.7 on 2026-10-18 11:01
+
+from django.db import migrations, models
+
+
+# Catalog the configurator shipped with before it moved to the database:
+# (component_type, key, label, price).
+INITIAL_CATALOG = [
+    ('case', 'Tower', 'Tower Desktop', 100),
+    ('case', 'Mini', 'Mini Desktop', 80),
+    ('case', 'Slim', 'Slim Desktop', 90),
+    ('case', 'Gaming', 'Gaming Desktop', 150),
+    ('processor', 'i5-12400', 'Intel Core i5-12400', 200),
+    ('processor', 'i7-12700K', 'Intel Core i7-12700K', 350),
+    ('processor', 'i9-12900K', 'Intel Core i9-12900K', 550),
+    ('processor', 'Ryzen-5-5600X', 'AMD Ryzen 5 5600X', 220),
+    ('processor', 'Ryzen-7-5800X', 'AMD Ryzen 7 5800X', 320),
+    ('memory', '8', '8GB', 50),
+    ('memory', '16', '16GB', 100),
+    ('memory', '32', '32GB', 180),
+    ('memory', '64', '64GB', 320),
+    ('storage', '512', '512GB SSD', 70),
+    ('storage', '1024', '1TB SSD', 120),
+    ('storage', '2048', '2TB SSD', 220),
+    ('graphics', 'Integrated', 'Integrated Graphics', 0),
+    ('graphics', 'RTX-3060', 'NVIDIA RTX 3060', 400),
+    ('graphics', 'RTX-3070', 'NVIDIA RTX 3070', 600),
+    ('graphics', 'RTX-3080', 'NVIDIA RTX 3080', 800),
+    ('graphics', 'RX-6700XT', 'AMD RX 6700XT', 450),
+    ('color', 'Black', 'Midnight Black', 20),
+    ('color', 'White', 'Arctic White', 20),
+    ('color', 'Silver', 'Metallic Silver', 20),
+    ('color', 'Blue', 'Royal Blue', 20),
+    ('color', 'Red', 'Racing Red', 20),
+    ('peripheral', 'monitor', 'Monitor', 200),
+    ('peripheral', 'keyboard', 'Keyboard', 50),
+    ('peripheral', 'mouse', 'Mouse', 30),
+    ('peripheral', 'headset', 'Headset', 70),
+    ('peripheral', 'webcam', 'Webcam', 40),
+]
+
+
+def seed_catalog(apps, schema_editor):
+    CatalogComponent = apps.get_model('shop', 'CatalogComponent')
+    CatalogVersion = apps.get_model('shop', 'CatalogVersion')
+    CatalogComponent.objects.bulk_create([
+        CatalogComponent(component_type=component_type, key=key, label=label, price=price, position=position)
+        for position, (component_type, key, label, price) in enumerate(INITIAL_CATALOG)
+    ])
+    CatalogVersion.objects.create(pk=1, version=1)
+
+
+def unseed_catalog(apps, schema_editor):
+    apps.get_model('shop', 'CatalogComponent').objects.all().delete()
+    apps.get_model('shop', 'CatalogVersion').objects.all().delete()
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('shop', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='CatalogVersion',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('version', models.PositiveBigIntegerField(default=1)),
+            ],
+        ),
+        migrations.CreateModel(
+            name='CatalogComponent',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('component_type', models.CharField(choices=[('case', 'Case'), ('processor', 'Processor'), ('memory', 'Memory'), ('storage', 'Storage'), ('graphics', 'Graphics card'), ('color', 'Color'), ('peripheral', 'Peripheral')], max_length=20)),
+                ('key', models.CharField(max_length=100)),
+                ('label', models.CharField(max_length=100)),
+                ('price', models.IntegerField()),
+                ('is_active', models.BooleanField(default=True)),
+                ('position', models.PositiveIntegerField(default=0)),
+            ],
+            options={
+                'ordering': ['component_type', 'position', 'id'],
+                'constraints': [models.UniqueConstraint(fields=('component_type', 'key'), name='unique_catalog_component_key')],
+            },
+        ),
+        migrations.RunPython(seed_catalog, unseed_catalog),
+    ]
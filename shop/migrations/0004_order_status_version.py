@@ -0,0 +1,18 @@
+# Generated by Django 5.1.7 on 2026-10-18 11:21
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('shop', '0003_access_path_indexes'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='order',
+            name='status_version',
+            field=models.PositiveIntegerField(default=1),
+        ),
+    ]
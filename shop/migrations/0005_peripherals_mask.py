@@ -0,0 +1,57 @@
+from django.db import migrations, models
+
+
+# Frozen copy of shop.peripherals.PERIPHERAL_BITS at the time of this migration.
+PERIPHERAL_BITS = {
+    'monitor': 1 << 0,
+    'keyboard': 1 << 1,
+    'mouse': 1 << 2,
+    'headset': 1 << 3,
+    'webcam': 1 << 4,
+}
+
+
+def peripherals_to_mask(apps, schema_editor):
+    Computer = apps.get_model('shop', 'Computer')
+    computers = []
+    for computer in Computer.objects.exclude(peripherals__isnull=True).exclude(peripherals='').iterator():
+        names = computer.peripherals.split(', ')
+        unknown = set(names) - set(PERIPHERAL_BITS)
+        if unknown:
+            raise ValueError(
+                f"Computer {computer.pk} has peripherals without a bit: {', '.join(sorted(unknown))}."
+            )
+        computer.peripherals_mask = sum(PERIPHERAL_BITS[name] for name in set(names))
+        computers.append(computer)
+    Computer.objects.bulk_update(computers, ['peripherals_mask'], batch_size=500)
+
+
+def mask_to_peripherals(apps, schema_editor):
+    Computer = apps.get_model('shop', 'Computer')
+    computers = []
+    for computer in Computer.objects.exclude(peripherals_mask=0).iterator():
+        computer.peripherals = ', '.join(
+            name for name, bit in PERIPHERAL_BITS.items() if computer.peripherals_mask & bit
+        )
+        computers.append(computer)
+    Computer.objects.bulk_update(computers, ['peripherals'], batch_size=500)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('shop', '0004_order_status_version'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='computer',
+            name='peripherals_mask',
+            field=models.PositiveSmallIntegerField(db_index=True, default=0),
+        ),
+        migrations.RunPython(peripherals_to_mask, mask_to_peripherals),
+        migrations.RemoveField(
+            model_name='computer',
+            name='peripherals',
+        ),
+    ]
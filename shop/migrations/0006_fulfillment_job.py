@@ -0,0 +1,48 @@
+# Generated by Django 5.1.7 on 2026-10-18 11:28
+
+import django.db.models.deletion
+import django.utils.timezone
+from django.db import migrations, models
+
+
+def queue_pending_orders(apps, schema_editor):
+    """
+    Queue the first fulfillment step of orders placed before the pipeline existed.
+    """
+    Order = apps.get_model('shop', 'Order')
+    FulfillmentJob = apps.get_model('shop', 'FulfillmentJob')
+    FulfillmentJob.objects.bulk_create(
+        FulfillmentJob(order_id=order_id, step='verify_payment')
+        for order_id in Order.objects.filter(status='Pending').values_list('pk', flat=True).iterator()
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('shop', '0005_peripherals_mask'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='FulfillmentJob',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('step', models.CharField(max_length=50)),
+                ('state', models.CharField(choices=[('queued', 'Queued'), ('running', 'Running'), ('done', 'Done'), ('failed', 'Failed')], default='queued', max_length=10)),
+                ('attempts', models.PositiveSmallIntegerField(default=0)),
+                ('run_at', models.DateTimeField(default=django.utils.timezone.now)),
+                ('claimed_by', models.CharField(blank=True, max_length=64)),
+                ('lease_expires_at', models.DateTimeField(blank=True, null=True)),
+                ('last_error', models.TextField(blank=True)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('order', models.ForeignKey(db_index=False, on_delete=django.db.models.deletion.CASCADE, related_name='fulfillment_jobs', to='shop.order')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['state', 'run_at'], name='fulfillment_job_due_idx')],
+                'constraints': [models.UniqueConstraint(fields=('order', 'step'), name='unique_fulfillment_job_step')],
+            },
+        ),
+        migrations.RunPython(queue_pending_orders, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,27 @@
+# Generated by Django 5.1.7 on 2026-10-18 12:34
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('shop', '0006_fulfillment_job'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='computer',
+            index=models.Index(fields=['processor', 'id'], name='computer_processor_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='computer',
+            index=models.Index(fields=['is_laptop', 'id'], name='computer_is_laptop_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='order',
+            index=models.Index(fields=['status', 'id'], name='order_status_idx'),
+        ),
+    ]
@@ -1,5 +1,21 @@
-from django.db import models
+from django.core.exceptions import ValidationError
+from django.db import models, transaction
 from django.contrib.auth.models import User
+from django.utils import timezone
+
+from .peripherals import PERIPHERAL_BITS, decode_peripherals, masks_including
+
+
+class ComputerQuerySet(models.QuerySet):
+    """
+    QuerySet for computers.
+    """
+
+    def with_peripherals(self, *names):
+        """
+        Computers that include all the given peripherals (and possibly others).
+        """
+        return self.filter(peripherals_mask__in=masks_including(names))
 
 
 class Computer(models.Model):
@@ -13,28 +29,280 @@ class Computer(models.Model):
     storage = models.IntegerField()
     graphics_card = models.CharField(max_length=100)
     color = models.CharField(max_length=50)
-    peripherals = models.TextField(blank=True, null=True)
+    # Bitmask of the peripherals, see shop/peripherals.py.
+    peripherals_mask = models.PositiveSmallIntegerField(default=0, db_index=True)
     is_laptop = models.BooleanField(default=False)
     price = models.DecimalField(max_digits=10, decimal_places=2)
 
     created_at = models.DateTimeField(auto_now_add=True)
-    owner = models.ForeignKey(User, on_delete=models.CASCADE, related_name='computers')
+    # Indexed through the leading column of computer_owner_created_idx.
+    owner = models.ForeignKey(User, on_delete=models.CASCADE, related_name='computers', db_index=False)
+
+    objects = ComputerQuerySet.as_manager()
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['owner', '-created_at'], name='computer_owner_created_idx'),
+            # Admin list filters; the id keeps filtered pages in index order.
+            models.Index(fields=['processor', 'id'], name='computer_processor_idx'),
+            models.Index(fields=['is_laptop', 'id'], name='computer_is_laptop_idx'),
+        ]
+
+    @property
+    def peripherals(self):
+        """
+        List of the peripheral names stored in peripherals_mask.
+        """
+        return decode_peripherals(self.peripherals_mask)
 
     def __str__(self):
         device_type = "Laptop" if self.is_laptop else "Desktop"
         return f"{self.color} {self.case_type} {device_type} ({self.processor}, {self.memory}GB RAM)"
 
 
+class OrderQuerySet(models.QuerySet):
+    """
+    QuerySet for orders.
+    """
+
+    def set_status(self, status):
+        """
+        Change the status of the selected orders with one UPDATE and bump their
+        status version, which invalidates cached order page fragments.
+        """
+        return self.update(status=status)
+
+    def update(self, **kwargs):
+        """
+        Bump the status version of updates writing the status, so no status
+        change can leave stale order page fragments behind.
+        """
+        if 'status' in kwargs and 'status_version' not in kwargs:
+            kwargs['status_version'] = models.F('status_version') + 1
+        return super().update(**kwargs)
+
+    def with_peripherals(self, *names):
+        """
+        Orders whose computer includes all the given peripherals.
+        """
+        return self.filter(computer__peripherals_mask__in=masks_including(names))
+
+
 class Order(models.Model):
     """
     Model representing an order for a custom-built computer.
     """
+    PENDING = 'Pending'
+    PROCESSING = 'Processing'
+    COMPLETED = 'Completed'
+    FAILED = 'Failed'
+    CANCELLED = 'Cancelled'
+    STATUSES = (PENDING, PROCESSING, COMPLETED, FAILED, CANCELLED)
+
     id = models.AutoField(primary_key=True)
-    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='orders')
+    # Indexed through the leading column of order_user_date_idx.
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='orders', db_index=False)
     computer = models.OneToOneField(Computer, on_delete=models.CASCADE)
     order_date = models.DateTimeField(auto_now_add=True)
     status = models.CharField(max_length=50, default='Pending')
+    # Bumped on every status change; part of the order page fragment cache keys.
+    status_version = models.PositiveIntegerField(default=1)
+
+    objects = OrderQuerySet.as_manager()
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['user', '-order_date'], name='order_user_date_idx'),
+            # Admin status filter; the id keeps filtered pages in index order.
+            models.Index(fields=['status', 'id'], name='order_status_idx'),
+        ]
+
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        instance._saved_status = instance.__dict__.get('status')
+        return instance
+
+    def save(self, *args, **kwargs):
+        """
+        Bump the status version when the status changed since the order was loaded.
+        """
+        saved_status = getattr(self, '_saved_status', None)
+        if saved_status is not None and self.status != saved_status:
+            self.status_version += 1
+            update_fields = kwargs.get('update_fields')
+            if update_fields is not None and 'status' in update_fields:
+                kwargs['update_fields'] = {*update_fields, 'status_version'}
+        super().save(*args, **kwargs)
+        self._saved_status = self.status
+
+    def __str__(self):
+        return f"Order #{self.id} - {self.user.username}"
+
+
+class FulfillmentJob(models.Model):
+    """
+    Queued step of the order fulfillment pipeline (see shop/fulfillment.py),
+    run by the fulfillment_worker command. There is one job per order and step.
+    """
+    QUEUED = 'queued'
+    RUNNING = 'running'
+    DONE = 'done'
+    FAILED = 'failed'
+    STATE_CHOICES = [
+        (QUEUED, 'Queued'),
+        (RUNNING, 'Running'),
+        (DONE, 'Done'),
+        (FAILED, 'Failed'),
+    ]
+
+    # Indexed through the leading column of unique_fulfillment_job_step.
+    order = models.ForeignKey(Order, on_delete=models.CASCADE, related_name='fulfillment_jobs', db_index=False)
+    step = models.CharField(max_length=50)
+    state = models.CharField(max_length=10, choices=STATE_CHOICES, default=QUEUED)
+    attempts = models.PositiveSmallIntegerField(default=0)
+    run_at = models.DateTimeField(default=timezone.now)
+    claimed_by = models.CharField(max_length=64, blank=True)
+    lease_expires_at = models.DateTimeField(null=True, blank=True)
+    last_error = models.TextField(blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['order', 'step'], name='unique_fulfillment_job_step'),
+        ]
+        indexes = [
+            models.Index(fields=['state', 'run_at'], name='fulfillment_job_due_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.step} for order #{self.order_id} ({self.state})"
+
+
+class CatalogVersion(models.Model):
+    """
+    Single-row counter bumped whenever the component catalog changes.
+    Workers compare it with their cached catalog to decide when to reload.
+    """
+    version = models.PositiveBigIntegerField(default=1)
+
+    @classmethod
+    def current(cls):
+        """
+        Return the current catalog version number.
+        """
+        return cls.objects.filter(pk=1).values_list('version', flat=True).first() or 0
+
+    @classmethod
+    def bump(cls):
+        """
+        Increase the catalog version so every worker reloads its cached catalog.
+        """
+        if not cls.objects.filter(pk=1).update(version=models.F('version') + 1):
+            cls.objects.get_or_create(pk=1)
+        from .catalog import invalidate_catalog
+        transaction.on_commit(invalidate_catalog)
+
+    def __str__(self):
+        return f"Catalog version {self.version}"
+
+
+class CatalogComponentQuerySet(models.QuerySet):
+    """
+    QuerySet for catalog components. Bulk writes bump the catalog version,
+    like saving or deleting a single component.
+    """
+
+    def update(self, **kwargs):
+        updated = super().update(**kwargs)
+        if updated:
+            CatalogVersion.bump()
+        return updated
+
+    def delete(self):
+        deleted = super().delete()
+        if deleted[0]:
+            CatalogVersion.bump()
+        return deleted
+
+    def bulk_create(self, objs, *args, **kwargs):
+        created = super().bulk_create(objs, *args, **kwargs)
+        if created:
+            CatalogVersion.bump()
+        return created
+
+    def bulk_update(self, objs, fields, *args, **kwargs):
+        updated = super().bulk_update(objs, fields, *args, **kwargs)
+        if updated:
+            CatalogVersion.bump()
+        return updated
+
+
+class CatalogComponent(models.Model):
+    """
+    Model representing a component option offered by the configurator.
+    """
+    CASE = 'case'
+    PROCESSOR = 'processor'
+    MEMORY = 'memory'
+    STORAGE = 'storage'
+    GRAPHICS = 'graphics'
+    COLOR = 'color'
+    PERIPHERAL = 'peripheral'
+    COMPONENT_TYPE_CHOICES = [
+        (CASE, 'Case'),
+        (PROCESSOR, 'Processor'),
+        (MEMORY, 'Memory'),
+        (STORAGE, 'Storage'),
+        (GRAPHICS, 'Graphics card'),
+        (COLOR, 'Color'),
+        (PERIPHERAL, 'Peripheral'),
+    ]
+    # Component types whose keys are stored as text but used as integers (sizes in GB).
+    INTEGER_KEY_TYPES = (MEMORY, STORAGE)
+
+    component_type = models.CharField(max_length=20, choices=COMPONENT_TYPE_CHOICES)
+    key = models.CharField(max_length=100)
+    label = models.CharField(max_length=100)
+    price = models.IntegerField()
+    is_active = models.BooleanField(default=True)
+    position = models.PositiveIntegerField(default=0)
+
+    objects = CatalogComponentQuerySet.as_manager()
+
+    class Meta:
+        ordering = ['component_type', 'position', 'id']
+        constraints = [
+            models.UniqueConstraint(fields=['component_type', 'key'], name='unique_catalog_component_key'),
+        ]
+
+    def clean(self):
+        """
+        Peripherals can only be offered once they have a bit in the registry,
+        and memory and storage keys must be integers.
+        """
+        if self.component_type == self.PERIPHERAL and self.key not in PERIPHERAL_BITS:
+            raise ValidationError({'key': "Add this peripheral to shop.peripherals.PERIPHERAL_BITS first."})
+        if self.component_type in self.INTEGER_KEY_TYPES and not self.is_integer_key(self.key):
+            raise ValidationError({'key': "Memory and storage keys are sizes in GB, such as 16."})
+
+    @staticmethod
+    def is_integer_key(key):
+        """Whether a key is a plain non-negative integer."""
+        return key.isascii() and key.isdigit()
+
+    def save(self, *args, **kwargs):
+        """Override save method to bump the catalog version."""
+        result = super().save(*args, **kwargs)
+        CatalogVersion.bump()
+        return result
 
+    def delete(self, *args, **kwargs):
+        """Override delete method to bump the catalog version."""
+        result = super().delete(*args, **kwargs)
+        CatalogVersion.bump()
+        return result
 
     def __str__(self):
-        return f"Order #{self.id} - {self.user.username}"
\ No newline at end of file
+        return f"{self.get_component_type_display()}: {self.label} (${self.price})"
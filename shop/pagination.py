@@ -0,0 +1,69 @@
+"""
+Pagination of admin lists over tables with millions of rows.
+
+A Django paginator runs ``SELECT COUNT(*)`` for every page, which reads
+the whole table. EstimatedCountPaginator takes the count of an unfiltered
+list from the row estimate of the database and counts filtered lists only
+up to SHOP_ADMIN_COUNT_LIMIT rows, so page loads stay fast at any table
+size. Past the limit the last page numbers are approximate.
+"""
+from django.conf import settings
+from django.core.paginator import Paginator
+from django.db import connections
+from django.utils.functional import cached_property
+
+
+AUTO_FIELD_TYPES = ('AutoField', 'BigAutoField', 'SmallAutoField')
+
+
+def count_limit():
+    """
+    Return the number of rows up to which lists are counted exactly.
+    """
+    return getattr(settings, 'SHOP_ADMIN_COUNT_LIMIT', 10_000)
+
+
+def estimate_row_count(model, using='default'):
+    """
+    Return the database's estimate of the number of rows of a model's
+    table without counting them, or None when there is none.
+
+    PostgreSQL and MySQL keep estimates in their catalogs. On SQLite, the
+    largest auto-incremented primary key is read from the primary key
+    index instead; it overestimates by the number of deleted rows.
+    """
+    connection = connections[using]
+    table = model._meta.db_table
+    with connection.cursor() as cursor:
+        if connection.vendor == 'postgresql':
+            cursor.execute('SELECT reltuples FROM pg_class WHERE oid = to_regclass(%s)', [table])
+            row = cursor.fetchone()
+            return int(row[0]) if row and row[0] >= 0 else None
+        if connection.vendor == 'mysql':
+            cursor.execute('SELECT table_rows FROM information_schema.tables '
+                           'WHERE table_schema = DATABASE() AND table_name = %s', [table])
+            row = cursor.fetchone()
+            return int(row[0]) if row and row[0] is not None else None
+        if connection.vendor == 'sqlite' and model._meta.pk.get_internal_type() in AUTO_FIELD_TYPES:
+            quote = connection.ops.quote_name
+            cursor.execute(f'SELECT MAX({quote(model._meta.pk.column)}) FROM {quote(table)}')
+            return cursor.fetchone()[0] or 0
+    return None
+
+
+class EstimatedCountPaginator(Paginator):
+    """
+    Paginator that never counts more than SHOP_ADMIN_COUNT_LIMIT rows.
+    Unfiltered querysets larger than that use the database estimate;
+    filtered ones report at most the limit.
+    """
+
+    @cached_property
+    def count(self):
+        queryset = self.object_list
+        limit = count_limit()
+        if not queryset.query.has_filters():
+            estimate = estimate_row_count(queryset.model, queryset.db)
+            if estimate is not None and estimate > limit:
+                return estimate
+        return queryset.order_by()[:limit].count()
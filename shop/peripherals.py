@@ -0,0 +1,54 @@
+"""
+Bit registry for the peripherals stored in Computer.peripherals_mask.
+
+Bits are part of the stored data: never change or reuse the bit of a
+peripheral. New peripherals get the next free bit here before they can be
+added to the catalog.
+"""
+
+PERIPHERAL_BITS = {
+    'monitor': 1 << 0,
+    'keyboard': 1 << 1,
+    'mouse': 1 << 2,
+    'headset': 1 << 3,
+    'webcam': 1 << 4,
+}
+
+ALL_PERIPHERALS_MASK = sum(PERIPHERAL_BITS.values())
+
+# Decoded peripheral names of every possible mask, in registry order.
+_DECODED = [
+    tuple(name for name, bit in PERIPHERAL_BITS.items() if mask & bit)
+    for mask in range(ALL_PERIPHERALS_MASK + 1)
+]
+
+
+def encode_peripherals(names):
+    """
+    Return the bitmask of an iterable of peripheral names.
+    Raises ValueError for names missing from the registry.
+    """
+    mask = 0
+    for name in names:
+        try:
+            mask |= PERIPHERAL_BITS[name]
+        except KeyError:
+            raise ValueError(f"Unknown peripheral {name!r}; add it to shop.peripherals.PERIPHERAL_BITS.")
+    return mask
+
+
+def decode_peripherals(mask):
+    """
+    Return the list of peripheral names of a bitmask, in registry order.
+    """
+    return list(_DECODED[mask])
+
+
+def masks_including(names):
+    """
+    Return every stored mask holding all the given peripherals. Filtering on
+    this short list with IN lets the database search the mask index instead
+    of evaluating a bitwise expression on every row.
+    """
+    required = encode_peripherals(names)
+    return [mask for mask in range(ALL_PERIPHERALS_MASK + 1) if mask & required == required]
@@ -0,0 +1,319 @@
+from array import array
+from itertools import repeat
+from operator import mul
+
+from .builder import (
+    ConcreteComputerBuilder, COLOR_FEE, LAPTOP_PREMIUM, ASSEMBLY_FEE,
+    LAPTOP_MONITOR_DISCOUNT, DISCOUNT_MIN_MEMORY
+)
+from .catalog import aget_catalog, get_catalog
+
+
+# Builder steps in the order a full configuration applies them.
+BUILDER_STEPS = (
+    ('case_type', 'build_case'),
+    ('processor', 'install_processor'),
+    ('memory', 'install_memory'),
+    ('storage', 'install_storage'),
+    ('graphics_card', 'install_graphics'),
+    ('color', 'apply_color'),
+    ('peripherals', 'add_peripherals'),
+    ('is_laptop', 'set_device_type'),
+)
+
+_UNSET = object()
+
+
+class PriceLattice:
+    """
+    Dense lookup table holding the final price of every builder configuration.
+
+    Every component dimension can also be left unset, so full and partial
+    configurations are both priced with one index computation and one table
+    read. Components without interactions are grouped into one slot per
+    distinct price to keep the table small. Prices are identical to
+    applying the matching ConcreteComputerBuilder steps followed by
+    calculate_price().
+    """
+
+    def __init__(self, catalog):
+        self.catalog = catalog
+        prices = catalog.prices
+        self.case_codes, case_slots = self._price_slots(prices['case'])
+        self.processor_codes, processor_slots = self._price_slots(prices['processor'])
+        self.storage_codes, storage_slots = self._price_slots(prices['storage'])
+        self.graphics_codes, graphics_slots = self._price_slots(prices['graphics'])
+        self.color_codes, color_slots = self._price_slots(prices['color'], COLOR_FEE)
+        self.default_color_code = color_slots.index(COLOR_FEE)
+        memory_prices = prices['memory']
+        peripheral_prices = prices['peripheral']
+        self.memory_codes = {key: code for code, key in enumerate(memory_prices, start=1)}
+        self.peripheral_bits = {name: 1 << bit for bit, name in enumerate(peripheral_prices)}
+
+        # Dimensions without interactions are summed into the outer block; memory,
+        # peripherals and the device type drive the discount and form the inner block.
+        outer_dimensions = (case_slots, processor_slots, storage_slots, graphics_slots, color_slots)
+        self.peripheral_slots = 1 << len(peripheral_prices)
+        self.sizes = tuple(len(slot_prices) for slot_prices in outer_dimensions) + (
+            len(memory_prices) + 1, self.peripheral_slots, 2
+        )
+        self.strides = self._strides(self.sizes)
+
+        outer = [0]
+        for slot_prices in outer_dimensions:
+            outer = [base + price for base in outer for price in slot_prices]
+
+        monitor_bit = self.peripheral_bits.get('monitor', 0)
+        inner = []
+        for memory in [None] + list(memory_prices):
+            memory_price = memory_prices.get(memory, 0)
+            for mask in range(self.peripheral_slots):
+                peripherals_price = sum(price for name, price in peripheral_prices.items()
+                                        if mask & self.peripheral_bits[name])
+                for is_laptop in (False, True):
+                    price = memory_price + peripherals_price + ASSEMBLY_FEE
+                    if is_laptop:
+                        price += LAPTOP_PREMIUM
+                        if memory is not None and memory >= DISCOUNT_MIN_MEMORY and mask & monitor_bit:
+                            price -= LAPTOP_MONITOR_DISCOUNT
+                    inner.append(price)
+
+        self.table = array('i')
+        for base in outer:
+            self.table.extend([base + price for price in inner])
+        self._table_array = None
+
+    @staticmethod
+    def _price_slots(prices, *extra_prices):
+        """
+        Group the keys of a dimension without interactions by price.
+
+        Returns a dict mapping each key to its slot and the list of slot prices.
+        Slot 0 is "unset" (price 0); keys sharing a price share a slot.
+        """
+        slots = [0]
+        codes = {}
+        for key, price in prices.items():
+            if price not in slots:
+                slots.append(price)
+            codes[key] = slots.index(price)
+        for price in extra_prices:
+            if price not in slots:
+                slots.append(price)
+        return codes, slots
+
+    @staticmethod
+    def _strides(sizes):
+        """
+        Return mixed-radix strides for dimensions of the given sizes.
+        """
+        strides = []
+        stride = 1
+        for size in reversed(sizes):
+            strides.append(stride)
+            stride *= size
+        return tuple(reversed(strides))
+
+    def codes(self, config):
+        """
+        Encode a configuration dict as a tuple of slot numbers, one per lattice
+        dimension, or return None if it holds values the lattice does not cover.
+        """
+        get = config.get
+        try:
+            memory = get('memory', _UNSET)
+            memory_code = 0 if memory is _UNSET else self.memory_codes.get(memory)
+            mask = self.peripheral_mask(get('peripherals', ()))
+            if memory_code is None or mask is None:
+                return None
+            return (
+                self.case_codes.get(get('case_type'), 0),
+                self.processor_codes.get(get('processor'), 0),
+                self.storage_codes.get(get('storage'), 0),
+                self.graphics_codes.get(get('graphics_card'), 0),
+                self.color_codes.get(config['color'], self.default_color_code) if 'color' in config else 0,
+                memory_code,
+                mask,
+                1 if get('is_laptop') else 0,
+            )
+        except TypeError:
+            return None
+
+    def index(self, config):
+        """
+        Return the table index of a configuration dict, or None if the
+        configuration holds values the lattice does not cover.
+        """
+        codes = self.codes(config)
+        if codes is None:
+            return None
+        return sum(map(mul, codes, self.strides))
+
+    def peripheral_mask(self, peripherals):
+        """
+        Encode a peripherals list as a bitmask, or return None if it cannot be
+        represented (duplicates, or a non-list value).
+        """
+        if not isinstance(peripherals, (list, tuple)):
+            return None
+        mask = 0
+        for name in peripherals:
+            bit = self.peripheral_bits.get(name)
+            if bit is None:
+                if name == 'monitor':
+                    return None
+                continue
+            if mask & bit:
+                return None
+            mask |= bit
+        return mask
+
+    def encode_many(self, configs):
+        """
+        Encode configuration dicts as an (n, 8) integer code matrix.
+        Rows the lattice does not cover are filled with -1.
+
+        The matrix is built one column at a time: each key is read from all
+        dicts and mapped to its codes with map() and numpy.fromiter(), so no
+        Python code runs per configuration. Peripheral lists are encoded once
+        per distinct list. Batches holding values that cannot be handled this
+        way (dict subclasses, unhashable values, non-list peripherals) are
+        encoded row by row with codes().
+        """
+        numpy = _import_numpy()
+        configs = list(configs)
+        try:
+            codes = self._encode_columns(numpy, configs)
+        except TypeError:
+            codes = None
+        if codes is None:
+            uncovered = (-1,) * len(self.sizes)
+            rows = [self.codes(config) or uncovered for config in configs]
+            codes = numpy.array(rows, dtype=numpy.int64).reshape(len(rows), len(self.sizes))
+        return codes
+
+    def _encode_columns(self, numpy, configs):
+        """
+        Column-wise encoding for encode_many(); returns None for batches it
+        does not handle, and raises TypeError for unhashable values.
+        """
+        count = len(configs)
+        if not set(map(type, configs)) <= {dict}:
+            return None
+        peripherals = list(map(dict.get, configs, repeat('peripherals'), repeat(())))
+        if not set(map(type, peripherals)) <= {list, tuple}:
+            return None
+
+        def column(key, lookup, default, missing=None):
+            values = map(dict.get, configs, repeat(key), repeat(missing))
+            return numpy.fromiter(map(lookup.get, values, repeat(default)), numpy.int64, count)
+
+        codes = numpy.empty((count, len(self.sizes)), dtype=numpy.int64)
+        codes[:, 0] = column('case_type', self.case_codes, 0)
+        codes[:, 1] = column('processor', self.processor_codes, 0)
+        codes[:, 2] = column('storage', self.storage_codes, 0)
+        codes[:, 3] = column('graphics_card', self.graphics_codes, 0)
+        codes[:, 4] = column('color', {**self.color_codes, _UNSET: 0}, self.default_color_code, _UNSET)
+        codes[:, 5] = column('memory', {**self.memory_codes, _UNSET: 0}, -1, _UNSET)
+        keys = list(map(tuple, peripherals))
+        masks = {}
+        for key in set(keys):
+            mask = self.peripheral_mask(key)
+            masks[key] = -1 if mask is None else mask
+        codes[:, 6] = numpy.fromiter(map(masks.__getitem__, keys), numpy.int64, count)
+        is_laptop = map(dict.get, configs, repeat('is_laptop'))
+        codes[:, 7] = numpy.fromiter(map(bool, is_laptop), numpy.int64, count)
+        codes[(codes[:, 5] < 0) | (codes[:, 6] < 0)] = -1
+        return codes
+
+    def price_codes(self, codes):
+        """
+        Price an (n, 8) code matrix with one vectorized table lookup.
+        Returns an int64 array; raises ValueError for codes out of range.
+        """
+        numpy = _import_numpy()
+        codes = numpy.asarray(codes, dtype=numpy.int64).reshape(-1, len(self.sizes))
+        if ((codes < 0) | (codes >= numpy.array(self.sizes))).any():
+            raise ValueError("Configuration codes are out of range for this price lattice.")
+        if self._table_array is None:
+            self._table_array = numpy.frombuffer(self.table, dtype=numpy.int32)
+        return self._table_array[codes @ numpy.array(self.strides, dtype=numpy.int64)].astype(numpy.int64)
+
+    def price(self, config):
+        """
+        Return the final price of a full or partial configuration dict.
+        Keys missing from the dict are treated as steps that were not applied.
+        """
+        index = self.index(config)
+        if index is None:
+            return price_with_builder(config, self.catalog)
+        return self.table[index]
+
+
+def _import_numpy():
+    """
+    Import numpy on demand; it is only needed for batch pricing.
+    Returns None when numpy is not installed.
+    """
+    try:
+        import numpy
+    except ImportError:
+        return None
+    return numpy
+
+
+def price_with_builder(config, catalog=None):
+    """
+    Price a configuration dict by running the matching builder steps.
+    """
+    builder = ConcreteComputerBuilder(catalog)
+    for key, step in BUILDER_STEPS:
+        if key in config:
+            getattr(builder, step)(config[key])
+    return builder.calculate_price().get_computer()['price']
+
+
+def get_price_lattice():
+    """
+    Return the price lattice of the current catalog, compiling it on first use.
+    """
+    return get_catalog().lattice
+
+
+def price_configuration(config):
+    """
+    Return the final price of a configuration dict using the price lattice.
+    """
+    return get_price_lattice().price(config)
+
+
+async def aprice_configuration(config):
+    """
+    Async variant of price_configuration().
+    """
+    return (await aget_catalog()).lattice.price(config)
+
+
+def price_many(configs):
+    """
+    Price a batch of configuration dicts with one vectorized table lookup.
+    Returns a list of prices identical to pricing each configuration with the
+    builder; falls back to scalar lookups when numpy is not installed.
+
+    The lookup itself is cheap; reading the keys of the dicts in
+    encode_many() takes most of the time, so price pre-encoded batches with
+    PriceLattice.price_codes() when they are priced repeatedly.
+    """
+    lattice = get_price_lattice()
+    configs = list(configs)
+    numpy = _import_numpy()
+    if numpy is None:
+        return [lattice.price(config) for config in configs]
+
+    codes = lattice.encode_many(configs)
+    uncovered = numpy.flatnonzero(codes[:, 0] < 0)
+    codes[uncovered] = 0
+    prices = lattice.price_codes(codes).tolist()
+    for position in uncovered.tolist():
+        prices[position] = price_with_builder(configs[position], lattice.catalog)
+    return prices
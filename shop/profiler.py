@@ -0,0 +1,208 @@
+"""
+Opt-in sampling profiler for real traffic.
+
+SamplingProfilerMiddleware profiles a fraction of the requests
+(SHOP_PROFILER_SAMPLE_RATE) and requests of staff users carrying the
+SHOP_PROFILER_HEADER header. While a request is profiled, one background
+thread samples its stack every SHOP_PROFILER_INTERVAL seconds; nothing is
+traced, so the profiled request runs at nearly full speed. With both
+triggers off the middleware removes itself from the stack.
+
+Each profile is written to SHOP_PROFILER_DIR in the collapsed stack format
+read by flamegraph.pl, speedscope and similar tools, named after the time,
+the view and the profile id. Only the newest SHOP_PROFILER_MAX_FILES files
+are kept. Responses of profiled requests carry the profile id in a
+Server-Timing header.
+"""
+import os
+import random
+import re
+import sys
+import tempfile
+import threading
+import time
+import uuid
+from collections import Counter
+from datetime import datetime
+
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+
+from .metrics import UNMATCHED
+
+
+EXTENSION = '.collapsed'
+
+
+class Profile:
+    """
+    Stack samples of one thread, counted per collapsed stack.
+    """
+
+    def __init__(self, thread_id):
+        self.id = uuid.uuid4().hex[:12]
+        self.thread_id = thread_id
+        self.samples = Counter()
+
+    def collapsed(self, root=None):
+        """
+        Return the samples as collapsed stack lines, each prefixed with
+        ``root`` when given.
+        """
+        prefix = f'{root};' if root else ''
+        return ''.join(f'{prefix}{stack} {count}\n' for stack, count in self.samples.most_common())
+
+
+class Sampler:
+    """
+    Background thread sampling the stacks of the threads being profiled.
+    The thread starts with the first profile and sleeps while none is active.
+    """
+
+    def __init__(self, interval):
+        self.interval = interval
+        self._profiles = {}
+        self._lock = threading.Lock()
+        self._sampling = threading.Lock()
+        self._wakeup = threading.Event()
+        self._thread = None
+        self._labels = {}
+
+    def start(self, thread_id=None):
+        """
+        Start profiling a thread, the current one by default, and return its Profile.
+        """
+        profile = Profile(thread_id or threading.get_ident())
+        with self._lock:
+            self._profiles[profile.id] = profile
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name='shop-profiler', daemon=True)
+                self._thread.start()
+            self._wakeup.set()
+        return profile
+
+    def stop(self, profile):
+        """
+        Stop profiling. No samples are added to ``profile`` afterwards.
+        """
+        with self._sampling, self._lock:
+            self._profiles.pop(profile.id, None)
+
+    def _run(self):
+        while True:
+            with self._lock:
+                if not self._profiles:
+                    self._wakeup.clear()
+            self._wakeup.wait()
+            with self._sampling:
+                with self._lock:
+                    profiles = list(self._profiles.values())
+                frames = sys._current_frames()
+                for profile in profiles:
+                    frame = frames.get(profile.thread_id)
+                    if frame is not None:
+                        profile.samples[self._collapse(frame)] += 1
+                del frames
+            time.sleep(self.interval)
+
+    def _collapse(self, frame):
+        stack = []
+        while frame is not None:
+            code = frame.f_code
+            label = self._labels.get(code)
+            if label is None:
+                label = self._labels[code] = _label(code)
+            stack.append(label)
+            frame = frame.f_back
+        stack.reverse()
+        return ';'.join(stack)
+
+
+def _label(code):
+    filename = code.co_filename
+    for path in sorted(sys.path, key=len, reverse=True):
+        if path and filename.startswith(path + os.sep):
+            filename = filename[len(path) + 1:]
+            break
+    return f'{code.co_qualname} ({filename}:{code.co_firstlineno})'
+
+
+def profile_filename(view, profile):
+    """
+    Return the file name of a profile: time, view and profile id.
+    """
+    view = re.sub(r'[^\w.-]+', '_', view.replace(':', '.'))
+    return f"{datetime.now().strftime('%Y%m%dT%H%M%S%f')}-{view}-{profile.id}{EXTENSION}"
+
+
+def write_profile(directory, view, profile, max_files):
+    """
+    Write a profile as a collapsed stack file rooted at the view name, then
+    delete the oldest files beyond ``max_files``. Returns the file path.
+    """
+    os.makedirs(directory, exist_ok=True)
+    path = os.path.join(directory, profile_filename(view, profile))
+    with tempfile.NamedTemporaryFile('w', dir=directory, suffix='.tmp', delete=False) as output:
+        output.write(profile.collapsed(root=view))
+    os.replace(output.name, path)
+    names = sorted(name for name in os.listdir(directory) if name.endswith(EXTENSION))
+    for name in names[:max(0, len(names) - max_files)]:
+        try:
+            os.remove(os.path.join(directory, name))
+        except FileNotFoundError:
+            pass  # removed by another process
+    return path
+
+
+class SamplingProfilerMiddleware:
+    """
+    Profile sampled requests and staff requests carrying the profiling
+    header. Must come after AuthenticationMiddleware. Async requests are
+    passed through unprofiled, since their event loop thread is shared
+    with other requests.
+    """
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.sample_rate = getattr(settings, 'SHOP_PROFILER_SAMPLE_RATE', 0)
+        header = getattr(settings, 'SHOP_PROFILER_HEADER', '')
+        if not self.sample_rate and not header:
+            raise MiddlewareNotUsed
+        self.header = 'HTTP_' + header.upper().replace('-', '_') if header else None
+        self.directory = getattr(settings, 'SHOP_PROFILER_DIR', os.path.join(tempfile.gettempdir(), 'shop-profiles'))
+        self.max_files = getattr(settings, 'SHOP_PROFILER_MAX_FILES', 200)
+        self.sampler = Sampler(getattr(settings, 'SHOP_PROFILER_INTERVAL', 0.005))
+        self.get_response = get_response
+        if iscoroutinefunction(self.get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.get_response(request)
+        if not self.wants_profile(request):
+            return self.get_response(request)
+        profile = self.sampler.start()
+        started = time.perf_counter()
+        try:
+            response = self.get_response(request)
+        finally:
+            self.sampler.stop(profile)
+        elapsed = time.perf_counter() - started
+        match = getattr(request, 'resolver_match', None)
+        view = match.view_name if match is not None else UNMATCHED
+        write_profile(self.directory, view, profile, self.max_files)
+        response.headers['Server-Timing'] = f'profile;desc="{profile.id}";dur={elapsed * 1000:.1f}'
+        return response
+
+    def wants_profile(self, request):
+        """
+        Whether the request is sampled or a staff request asking for a profile.
+        """
+        if self.header and self.header in request.META:
+            user = getattr(request, 'user', None)
+            if user is not None and user.is_active and user.is_staff:
+                return True
+        return bool(self.sample_rate) and random.random() < self.sample_rate
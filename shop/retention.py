@@ -0,0 +1,178 @@
+"""
+Retention policies for data that is never needed again, run with
+``python manage.py retention``.
+
+Rows are processed in chunks of consecutive primary keys. Each chunk is
+written in its own short transaction, so a purge never holds the database
+write lock long enough to stall requests, and the retention condition is
+checked again at write time.
+"""
+import time
+from collections import namedtuple
+from importlib import import_module
+
+from django.conf import settings
+from django.contrib.sessions.models import Session
+from django.core.cache import caches
+from django.db import models, transaction
+from django.utils import timezone
+
+
+POLICIES = {}
+
+RetentionResult = namedtuple('RetentionResult', 'name rows chunks seconds')
+
+
+def register(policy_class):
+    """
+    Class decorator adding a policy to the registry.
+    """
+    POLICIES[policy_class.name] = policy_class()
+    return policy_class
+
+
+def rows_per_second(result):
+    """
+    Return the processing rate of a RetentionResult.
+    """
+    return result.rows / result.seconds if result.seconds else 0.0
+
+
+def key_chunks(queryset, chunk_size):
+    """
+    Yield ascending lists of at most ``chunk_size`` primary keys of the queryset.
+    Each chunk is queried after the previous one was processed.
+    """
+    queryset = queryset.order_by('pk').values_list('pk', flat=True)
+    last = None
+    while True:
+        page = queryset if last is None else queryset.filter(pk__gt=last)
+        keys = list(page[:chunk_size])
+        if not keys:
+            return
+        yield keys
+        last = keys[-1]
+
+
+class RetentionPolicy:
+    """
+    Base class for a named retention policy exposed by the retention command.
+    """
+    name = None
+    help = ''
+
+    def run(self, chunk_size, dry_run=False, pause=0):
+        """
+        Apply the policy and return a RetentionResult. With ``dry_run`` only
+        count the rows that would change. ``pause`` seconds are slept
+        between chunks to leave room for other writers.
+        """
+        started = time.perf_counter()
+        rows = chunks = 0
+        for keys in key_chunks(self.get_queryset(), chunk_size):
+            if chunks and pause:
+                time.sleep(pause)
+            chunks += 1
+            rows += self.apply(keys, dry_run)
+        return RetentionResult(self.name, rows, chunks, time.perf_counter() - started)
+
+    def get_queryset(self):
+        """
+        Return the candidate rows.
+        """
+        raise NotImplementedError
+
+    def apply(self, keys, dry_run=False):
+        """
+        Delete one chunk of candidate keys and return the number of rows
+        deleted, or the number of candidates with ``dry_run``.
+        """
+        if dry_run:
+            return len(keys)
+        with transaction.atomic():
+            deleted, _ = self.get_queryset().filter(pk__gte=keys[0], pk__lte=keys[-1]).delete()
+        return deleted
+
+
+def sessions():
+    """
+    Return all sessions of the configured database backed session engine,
+    or an empty queryset when sessions are not stored in the database.
+    """
+    store = import_module(settings.SESSION_ENGINE).SessionStore
+    if not hasattr(store, 'get_model_class'):
+        return Session.objects.none()
+    return store.get_model_class().objects.all()
+
+
+@register
+class ExpiredSessions(RetentionPolicy):
+    """
+    Delete sessions past their expiry date.
+    """
+    name = 'sessions'
+    help = 'Expired rows of django_session.'
+
+    def get_queryset(self):
+        return sessions().filter(expire_date__lt=timezone.now())
+
+
+@register
+class SpentConfirmationTokens(RetentionPolicy):
+    """
+    Delete confirmation tokens that were used or have expired.
+    """
+    name = 'tokens'
+    help = 'Used or expired registration confirmation tokens.'
+
+    def get_queryset(self):
+        from registration_app.models import ConfirmationToken
+        return ConfirmationToken.objects.filter(models.Q(is_used=True) | models.Q(expires_at__lt=timezone.now()))
+
+
+@register
+class AbandonedWizardSessions(RetentionPolicy):
+    """
+    Remove computer configurations older than SHOP_WIZARD_MAX_AGE, or saved
+    without a timestamp, from live sessions (SHOP_WIZARD_STORE = 'session').
+    The cookie store keeps nothing on the server and the cache store expires
+    entries by itself.
+    """
+    name = 'wizard'
+    help = 'Computer configurations abandoned in live sessions.'
+
+    def get_queryset(self):
+        return sessions().filter(expire_date__gte=timezone.now())
+
+    def apply(self, keys, dry_run=False):
+        from .wizard import SessionWizardStore
+
+        store = import_module(settings.SESSION_ENGINE).SessionStore()
+        cutoff = time.time() - getattr(settings, 'SHOP_WIZARD_MAX_AGE', 60 * 60 * 24)
+        chunk = self.get_queryset().filter(pk__gte=keys[0], pk__lte=keys[-1])
+        updates = {}
+        for session_key, session_data in chunk.values_list('pk', 'session_data'):
+            data = store.decode(session_data)
+            if SessionWizardStore.SESSION_KEY not in data and SessionWizardStore.SAVED_AT_KEY not in data:
+                continue
+            # Configurations without a save time predate it and count as expired.
+            saved_at = data.get(SessionWizardStore.SAVED_AT_KEY)
+            if saved_at is not None and saved_at >= cutoff:
+                continue
+            data.pop(SessionWizardStore.SESSION_KEY, None)
+            data.pop(SessionWizardStore.SAVED_AT_KEY, None)
+            updates[session_key] = (session_data, store.encode(data))
+        if dry_run or not updates:
+            return len(updates)
+
+        changed = 0
+        with transaction.atomic():
+            for session_key, (old_data, new_data) in updates.items():
+                # Sessions written since they were read are left alone.
+                changed += chunk.filter(pk=session_key, session_data=old_data).update(session_data=new_data)
+        if hasattr(store, 'cache_key_prefix'):
+            # cached_db sessions: drop the cached copies so the change is seen.
+            caches[settings.SESSION_CACHE_ALIAS].delete_many(
+                [store.cache_key_prefix + session_key for session_key in updates]
+            )
+        return changed
@@ -0,0 +1,220 @@
+"""
+Budget-constrained configuration search: "what is the best machine under $1,500?".
+
+search_configurations() takes a budget, the allowed components and an
+objective. It returns the best configurations the budget buys, priced
+exactly like ConcreteComputerBuilder. Each result is cheaper than the one
+before it and scores lower, so the list reads "the best you can get",
+then the next cheaper alternatives.
+
+A configuration is a sum of independent choices: case, processor, storage,
+graphics card, color and one combined choice of memory, peripherals and
+device type (the laptop monitor discount ties those three together). The
+options of every choice are reduced to their frontier: options costing at
+least as much as another one without scoring higher are dropped. The
+frontiers are then merged one choice at a time, dropping partial
+configurations that cannot fit the budget or that are beaten by a cheaper
+one. The full configurations (384,000 with the seeded catalog) are never
+enumerated.
+"""
+from .catalog import get_catalog
+
+
+# Configuration keys of the independent choices, in merge order.
+OUTER_DIMENSIONS = (
+    ('case_type', 'case'),
+    ('processor', 'processor'),
+    ('storage', 'storage'),
+    ('graphics_card', 'graphics'),
+    ('color', 'color'),
+)
+
+REQUIRE_KEYS = ('case_type', 'processor', 'memory', 'storage', 'graphics_card', 'color', 'peripherals', 'is_laptop')
+
+OBJECTIVES = {}
+
+
+def objective(name):
+    """
+    Register a function returning the component scores of an objective, as
+    {configuration key: {component: score}}, for a catalog.
+    """
+    def decorator(function):
+        OBJECTIVES[name] = function
+        return function
+    return decorator
+
+
+def tiers(prices):
+    """
+    Return the tier of every component of a price table: 0 for the cheapest
+    price, 1 for the next distinct price, and so on.
+    """
+    distinct = sorted(set(prices.values()))
+    return {key: distinct.index(price) for key, price in prices.items()}
+
+
+@objective('balanced')
+def balanced_scores(catalog):
+    """
+    Sum of the processor, memory, storage and graphics card tiers.
+    """
+    return {
+        'processor': tiers(catalog.prices['processor']),
+        'memory': tiers(catalog.prices['memory']),
+        'storage': tiers(catalog.prices['storage']),
+        'graphics_card': tiers(catalog.prices['graphics']),
+    }
+
+
+@objective('memory')
+def memory_scores(catalog):
+    """
+    Most RAM, in GB.
+    """
+    return {'memory': {size: size for size in catalog.prices['memory']}}
+
+
+@objective('storage')
+def storage_scores(catalog):
+    """
+    Most storage, in GB.
+    """
+    return {'storage': {size: size for size in catalog.prices['storage']}}
+
+
+@objective('graphics')
+def graphics_scores(catalog):
+    """
+    Best graphics card tier.
+    """
+    return {'graphics_card': tiers(catalog.prices['graphics'])}
+
+
+@objective('processor')
+def processor_scores(catalog):
+    """
+    Best processor tier.
+    """
+    return {'processor': tiers(catalog.prices['processor'])}
+
+
+def search_configurations(budget, require=None, objective='balanced', limit=5, catalog=None):
+    """
+    Return up to ``limit`` configurations costing at most ``budget``, best
+    first, as dicts with the configuration, its price, its objective score
+    and its balanced tier sum. Configurations scoring the same on the
+    objective are ranked by the balanced tier sum.
+
+    ``require`` maps configuration keys to an allowed value or a list of
+    allowed values; for 'peripherals' it lists the peripherals that must be
+    included, and 'is_laptop' is a bool. Raises ValueError for unknown
+    objectives and keys.
+    """
+    if objective not in OBJECTIVES:
+        raise ValueError(f"Unknown objective {objective!r}; choose one of {', '.join(OBJECTIVES)}.")
+    require = dict(require or {})
+    unknown = set(require) - set(REQUIRE_KEYS)
+    if unknown:
+        raise ValueError(f"Cannot require {', '.join(sorted(unknown))}.")
+    catalog = catalog if catalog is not None else get_catalog()
+
+    primary = OBJECTIVES[objective](catalog)
+    secondary = balanced_scores(catalog)
+    # Objective scores weigh more than any balanced tier sum, so a single
+    # integer ranks by the objective first.
+    weight = 1 + sum(max(scores.values(), default=0) for scores in secondary.values())
+
+    def score(key, component):
+        return (primary.get(key, {}).get(component, 0) * weight
+                + secondary.get(key, {}).get(component, 0))
+
+    groups = []
+    for key, component_type in OUTER_DIMENSIONS:
+        prices = catalog.prices[component_type]
+        allowed = _allowed(require.get(key), prices)
+        groups.append(_frontier(
+            (prices[component], score(key, component), ((key, component),)) for component in allowed
+        ))
+    groups.append(_frontier(_inner_options(catalog, require, score)))
+
+    # Cheapest completion of the groups not merged yet.
+    remaining = [0] * (len(groups) + 1)
+    for position in range(len(groups) - 1, -1, -1):
+        if not groups[position]:
+            return []
+        remaining[position] = remaining[position + 1] + groups[position][0][0]
+
+    frontier = [(0, 0, ())]
+    for position, options in enumerate(groups):
+        ceiling = budget - remaining[position + 1]
+        frontier = _frontier(
+            (price + option_price, points + option_points, choices + option_choices)
+            for price, points, choices in frontier
+            for option_price, option_points, option_choices in options
+            if price + option_price <= ceiling
+        )
+
+    results = []
+    for price, points, choices in reversed(frontier[-limit:] if limit > 0 else []):
+        configuration = dict(choices)
+        configuration['peripherals'] = [
+            name for name, bit in catalog.lattice.peripheral_bits.items() if configuration['peripherals'] & bit
+        ]
+        results.append({
+            'configuration': {key: configuration[key] for key in REQUIRE_KEYS},
+            'price': price,
+            'score': points // weight,
+            'tiers': points % weight,
+        })
+    return results
+
+
+def _allowed(required, prices):
+    """
+    Return the components of a price table allowed by a requirement, in
+    catalog order.
+    """
+    if required is None:
+        return list(prices)
+    if not isinstance(required, (list, tuple, set)):
+        required = [required]
+    return [component for component in prices if component in required]
+
+
+def _inner_options(catalog, require, score):
+    """
+    Yield (price, score, choices) for every allowed combination of memory,
+    peripherals and device type, read from the price lattice. The price
+    includes the assembly fee, the laptop premium and the laptop monitor
+    discount. Peripherals are chosen as a lattice bitmask.
+    """
+    lattice = catalog.lattice
+    included = list(require.get('peripherals') or ())
+    if any(name not in lattice.peripheral_bits for name in included):
+        return
+    required_mask = sum(lattice.peripheral_bits[name] for name in set(included))
+    device_types = (False, True) if require.get('is_laptop') is None else (bool(require['is_laptop']),)
+    mask_stride, laptop_stride = lattice.strides[-2:]
+    for memory in _allowed(require.get('memory'), catalog.prices['memory']):
+        base = lattice.index({'memory': memory})
+        memory_score = score('memory', memory)
+        for mask in range(lattice.peripheral_slots):
+            if mask & required_mask != required_mask:
+                continue
+            for is_laptop in device_types:
+                price = lattice.table[base + mask * mask_stride + is_laptop * laptop_stride]
+                yield price, memory_score, (('memory', memory), ('peripherals', mask), ('is_laptop', is_laptop))
+
+
+def _frontier(points):
+    """
+    Return the (price, score, choices) points no other point beats, by
+    ascending price: each scores more than every cheaper one. Of points with
+    the same price and score the first one is kept.
+    """
+    frontier = []
+    for point in sorted(points, key=lambda point: (point[0], -point[1])):
+        if not frontier or point[1] > frontier[-1][1]:
+            frontier.append(point)
+    return frontier
@@ -0,0 +1,434 @@
+"""
+Pre-forking WSGI server, run with ``python manage.py serve``.
+
+The master process imports the WSGI application once, warms it up and
+forks the workers from it, so the imported code is shared copy-on-write.
+The workers accept connections on the listening socket they inherit.
+Every second a worker reports its health (pid, requests, RSS) to the
+master through a pipe. The master replaces workers that exit (for
+instance after max_requests) and kills those that stop reporting for
+longer than the timeout.
+
+Signals of the master:
+    TERM, INT  stop gracefully: workers finish their current requests.
+    HUP        reload gracefully: the master checks that the application
+               still imports, re-executes itself with the listening socket
+               to load the new code, forks new workers and then stops the
+               old ones.
+    USR1       log the health of every worker.
+
+Workers only exist on platforms with os.fork().
+"""
+import json
+import logging
+import os
+import random
+import selectors
+import signal
+import socket
+import subprocess
+import sys
+import time
+
+from django.core.servers.basehttp import ThreadedWSGIServer, WSGIRequestHandler, WSGIServer
+from django.db import connections
+
+
+logger = logging.getLogger(__name__)
+
+LISTEN_FD_ENV = 'SHOP_SERVE_LISTEN_FD'
+OLD_WORKERS_ENV = 'SHOP_SERVE_OLD_WORKERS'
+
+HEARTBEAT_INTERVAL = 1  # seconds
+
+
+def memory_usage(pid='self'):
+    """
+    Return the resident and private (unshared) memory of a process in
+    bytes, from /proc, or (None, None) where it is not available.
+    """
+    try:
+        with open(f'/proc/{pid}/smaps_rollup') as smaps:
+            fields = dict(line.split(':', 1) for line in smaps if ':' in line and not line.startswith(' '))
+    except OSError:
+        return None, None
+
+    def kilobytes(*names):
+        return sum(int(fields[name].split()[0]) for name in names if name in fields) * 1024
+
+    return kilobytes('Rss'), kilobytes('Private_Clean', 'Private_Dirty')
+
+
+def listen(address, backlog=2048):
+    """
+    Return a listening TCP socket for a (host, port) address.
+    """
+    family = socket.AF_INET6 if ':' in address[0] else socket.AF_INET
+    sock = socket.socket(family, socket.SOCK_STREAM)
+    sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+    sock.bind(address)
+    sock.listen(backlog)
+    return sock
+
+
+def load_application():
+    """
+    Import the WSGI application of the project and warm it up, so the
+    workers share the imported code instead of each importing it.
+    """
+    from django.core.servers.basehttp import get_internal_wsgi_application
+    from django.urls import get_resolver
+
+    application = get_internal_wsgi_application()
+    get_resolver().reverse_dict  # imports every view module
+    connections.close_all()  # connections must not be shared with the workers
+    return application
+
+
+class QuietRequestHandler(WSGIRequestHandler):
+    """
+    Request handler that only logs errors, unless access logging is on.
+    """
+    access_log = False
+
+    def log_message(self, format, *args):
+        if self.access_log:
+            super().log_message(format, *args)
+
+
+class Worker:
+    """
+    Serves requests on an inherited listening socket in a forked process.
+    """
+
+    def __init__(self, application, sock, threads, max_requests, heartbeat, master_pid):
+        self.application = application
+        self.sock = sock
+        self.threads = threads
+        self.max_requests = max_requests
+        self.heartbeat = heartbeat
+        self.master_pid = master_pid
+        self.requests = 0
+        self.started = time.time()
+        self.stopping = False
+
+    def run(self):
+        """
+        Serve until asked to stop, max_requests is reached or the master dies.
+        """
+        signal.signal(signal.SIGTERM, self._stop)
+        signal.signal(signal.SIGINT, signal.SIG_IGN)
+        signal.signal(signal.SIGHUP, signal.SIG_DFL)
+        signal.signal(signal.SIGUSR1, signal.SIG_DFL)
+        random.seed()
+        server = self._server()
+        last_report = 0
+        try:
+            while not self.stopping:
+                server.handle_request()
+                if self.max_requests and self.requests >= self.max_requests:
+                    logger.info("Worker %s recycled after %s requests.", os.getpid(), self.requests)
+                    break
+                if os.getppid() != self.master_pid:
+                    break  # orphaned
+                if time.monotonic() - last_report >= HEARTBEAT_INTERVAL:
+                    self.report()
+                    last_report = time.monotonic()
+        finally:
+            server.server_close()  # waits for the request threads
+            connections.close_all()
+
+    def report(self):
+        """
+        Send the health of this worker to the master.
+        """
+        if self.heartbeat is None:
+            return
+        rss, private = memory_usage()
+        message = {'pid': os.getpid(), 'requests': self.requests, 'rss': rss, 'private': private}
+        try:
+            os.write(self.heartbeat, (json.dumps(message) + '\n').encode())
+        except OSError:
+            # The master re-executed itself for a reload and will stop this
+            # worker shortly.
+            os.close(self.heartbeat)
+            self.heartbeat = None
+
+    def _server(self):
+        worker = self
+        server_class = ThreadedWSGIServer if self.threads > 1 else WSGIServer
+
+        class WorkerServer(server_class):
+            timeout = HEARTBEAT_INTERVAL
+            daemon_threads = False  # server_close() waits for requests in progress
+
+            def process_request(self, request, client_address):
+                worker.requests += 1
+                super().process_request(request, client_address)
+
+        server = WorkerServer(self.sock.getsockname()[:2], QuietRequestHandler, bind_and_activate=False)
+        server.socket.close()
+        server.socket = self.sock
+        server.server_address = self.sock.getsockname()
+        host, port = server.server_address[:2]
+        server.server_name = socket.getfqdn(host)
+        server.server_port = port
+        server.setup_environ()
+        server.set_app(self.application)
+        return server
+
+    def _stop(self, signum, frame):
+        self.stopping = True
+
+
+class WorkerState:
+    """
+    What the master knows about a worker.
+    """
+
+    def __init__(self, pid, pipe):
+        self.pid = pid
+        self.pipe = pipe
+        self.buffer = b''
+        self.started = time.time()
+        self.last_seen = time.monotonic()
+        self.requests = 0
+        self.rss = None
+        self.private = None
+
+    def as_dict(self):
+        return {
+            'pid': self.pid,
+            'started': self.started,
+            'requests': self.requests,
+            'rss': self.rss,
+            'private': self.private,
+            'last_seen_seconds_ago': round(time.monotonic() - self.last_seen, 1),
+        }
+
+
+class PreforkServer:
+    """
+    Master process forking and supervising the workers.
+    """
+
+    def __init__(self, application, sock, workers, threads=1, max_requests=0, max_requests_jitter=0,
+                 timeout=30, graceful_timeout=30, status_file=None):
+        self.application = application
+        self.sock = sock
+        self.worker_count = workers
+        self.threads = threads
+        self.max_requests = max_requests
+        self.max_requests_jitter = max_requests_jitter
+        self.timeout = timeout
+        self.graceful_timeout = graceful_timeout
+        self.status_file = status_file
+        self.workers = {}
+        self.retiring = set()
+        self.selector = selectors.DefaultSelector()
+        self.stopping = False
+        self.reloading = False
+        self.reporting = False
+        self.respawn_delay = 0
+
+    def run(self):
+        """
+        Fork the workers and supervise them until stop() is called.
+        """
+        for _ in range(self.worker_count):
+            self.spawn()
+        self.retire_old_workers()
+        while not self.stopping:
+            for key, _ in self.selector.select(timeout=HEARTBEAT_INTERVAL):
+                self.read_heartbeats(key.data)
+            self.reap()
+            self.kill_unresponsive()
+            if self.reporting:
+                self.reporting = False
+                for line in self.health_report():
+                    logger.warning(line)
+            if self.reloading:
+                self.reloading = False
+                self.reload()
+            self.write_status()
+            while len(self.workers) < self.worker_count and not self.stopping:
+                time.sleep(self.respawn_delay)
+                self.spawn()
+        self.shutdown()
+
+    def stop(self, *args):
+        """
+        Ask run() to stop the workers gracefully and return.
+        """
+        self.stopping = True
+
+    def request_reload(self, *args):
+        self.reloading = True
+
+    def request_report(self, *args):
+        self.reporting = True
+
+    def spawn(self):
+        """
+        Fork a worker.
+        """
+        read_end, write_end = os.pipe()
+        max_requests = self.max_requests
+        if max_requests and self.max_requests_jitter:
+            # Spread the restarts so the workers are not recycled together.
+            max_requests += random.randint(0, self.max_requests_jitter)
+        pid = os.fork()
+        if pid == 0:
+            status = 0
+            try:
+                os.close(read_end)
+                for state in self.workers.values():
+                    os.close(state.pipe)
+                Worker(self.application, self.sock, self.threads, max_requests, write_end, os.getppid()).run()
+            except BaseException:
+                logger.exception("Worker %s crashed.", os.getpid())
+                status = 1
+            finally:
+                os._exit(status)
+        os.close(write_end)
+        os.set_blocking(read_end, False)
+        state = self.workers[pid] = WorkerState(pid, read_end)
+        self.selector.register(read_end, selectors.EVENT_READ, state)
+        return state
+
+    def read_heartbeats(self, state):
+        try:
+            data = os.read(state.pipe, 65536)
+        except BlockingIOError:
+            return
+        if not data:
+            self.selector.unregister(state.pipe)
+            return
+        *lines, state.buffer = (state.buffer + data).split(b'\n')
+        for line in lines:
+            message = json.loads(line)
+            state.last_seen = time.monotonic()
+            state.requests = message['requests']
+            state.rss = message['rss']
+            state.private = message['private']
+
+    def reap(self):
+        """
+        Collect exited workers. Workers dying right after start are replaced
+        with an increasing delay.
+        """
+        while True:
+            try:
+                pid, status = os.waitpid(-1, os.WNOHANG)
+            except ChildProcessError:
+                return
+            if not pid:
+                return
+            self.retiring.discard(pid)
+            state = self.workers.pop(pid, None)
+            if state is None:
+                continue
+            if state.pipe in self.selector.get_map():
+                self.selector.unregister(state.pipe)
+            os.close(state.pipe)
+            code = os.waitstatus_to_exitcode(status)
+            if code and time.time() - state.started < 1:
+                self.respawn_delay = min(10, max(0.1, self.respawn_delay * 2))
+                logger.error("Worker %s exited with %s right after starting.", pid, code)
+            else:
+                self.respawn_delay = 0
+                if code:
+                    logger.warning("Worker %s exited with %s.", pid, code)
+
+    def kill_unresponsive(self):
+        now = time.monotonic()
+        for state in list(self.workers.values()):
+            if now - state.last_seen > self.timeout:
+                logger.error("Worker %s sent no heartbeat for %s seconds; killing it.", state.pid, self.timeout)
+                self._signal(state.pid, signal.SIGKILL)
+                state.last_seen = now  # reaped on the next pass
+
+    def reload(self):
+        """
+        Re-execute the master with the listening socket once the new code is
+        known to import; the re-executed master forks new workers and then
+        retires these ones.
+        """
+        check = subprocess.run([sys.executable] + sys.argv[:2] + ['--check'], capture_output=True, text=True)
+        if check.returncode:
+            logger.error("Not reloading, the application fails to load:\n%s", check.stderr)
+            return
+        logger.warning("Reloading.")
+        self.sock.set_inheritable(True)
+        env = dict(os.environ)
+        env[LISTEN_FD_ENV] = str(self.sock.fileno())
+        env[OLD_WORKERS_ENV] = ','.join(str(pid) for pid in list(self.workers) + list(self.retiring))
+        os.execve(sys.executable, [sys.executable] + sys.argv, env)
+
+    def retire_old_workers(self):
+        """
+        Stop the workers of the master this one replaced with a reload.
+        """
+        pids = os.environ.pop(OLD_WORKERS_ENV, '')
+        for pid in filter(None, pids.split(',')):
+            self.retiring.add(int(pid))
+            self._signal(int(pid), signal.SIGTERM)
+
+    def shutdown(self):
+        """
+        Stop all workers gracefully, killing those still busy after
+        graceful_timeout.
+        """
+        for pid in list(self.workers) + list(self.retiring):
+            self._signal(pid, signal.SIGTERM)
+        deadline = time.monotonic() + self.graceful_timeout
+        while (self.workers or self.retiring) and time.monotonic() < deadline:
+            self.reap()
+            time.sleep(0.05)
+        for pid in list(self.workers) + list(self.retiring):
+            self._signal(pid, signal.SIGKILL)
+        while self.workers or self.retiring:
+            try:
+                os.waitpid(-1, 0)
+            except ChildProcessError:
+                break
+            self.reap()
+        self.write_status()
+
+    def status(self):
+        """
+        Return the health of the master and every worker as a dict.
+        """
+        rss, private = memory_usage()
+        return {
+            'master': {'pid': os.getpid(), 'rss': rss, 'private': private},
+            'workers': [state.as_dict() for state in self.workers.values()],
+            'retiring': sorted(self.retiring),
+        }
+
+    def health_report(self):
+        """
+        Return one line per worker for the logs.
+        """
+        lines = [f'{len(self.workers)} workers, {len(self.retiring)} retiring']
+        for state in self.workers.values():
+            info = state.as_dict()
+            rss = f"{info['rss'] / 2 ** 20:.1f} MiB" if info['rss'] else 'n/a'
+            lines.append(f"worker {info['pid']}: {info['requests']} requests, rss {rss}, "
+                         f"last heartbeat {info['last_seen_seconds_ago']}s ago")
+        return lines
+
+    def write_status(self):
+        if not self.status_file:
+            return
+        temporary = f'{self.status_file}.tmp'
+        with open(temporary, 'w') as output:
+            json.dump(self.status(), output)
+        os.replace(temporary, self.status_file)
+
+    @staticmethod
+    def _signal(pid, signum):
+        try:
+            os.kill(pid, signum)
+        except ProcessLookupError:
+            pass
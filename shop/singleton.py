@@ -1,10 +1,26 @@
 import threading
+import time
+
+from django.conf import settings
+from django.core.signals import request_finished
+from django.db import DEFAULT_DB_ALIAS, connections
+
+
+class ConnectionPoolTimeout(Exception):
+    """
+    Raised when no connection slot frees up within the pool timeout.
+    """
 
 
 class DatabaseConnectionSingleton:
     """
-    Thread-safe Singleton for managing database connection state.
-    Note: In Django, real DB management is handled by the ORM.
+    Thread-safe Singleton managing checkouts of the Django database connection.
+
+    Django keeps one connection per thread and reuses it for CONN_MAX_AGE
+    seconds. This manager limits how many threads may hold a checked-out
+    connection at once (SHOP_DB_POOL_SIZE), health checks a reused connection
+    when it is checked out and collects pool metrics. Checkouts are reentrant
+    per thread and released when the request finishes.
     """
 
     _instance = None
@@ -14,32 +30,153 @@ class DatabaseConnectionSingleton:
         if cls._instance is None:
             with cls._lock:
                 if cls._instance is None:  # double-checked locking
-                    cls._instance = super().__new__(cls)
-                    cls._instance._initialize_connection()
+                    instance = super().__new__(cls)
+                    instance._initialize_connection()
+                    cls._instance = instance
         return cls._instance
 
+    @classmethod
+    def reset(cls):
+        """
+        Drop the instance so the next access re-reads the pool settings.
+        """
+        with cls._lock:
+            cls._instance = None
+
     def _initialize_connection(self):
         """
-        Simulates initializing database connection settings.
+        Read the pool settings and set up the slot semaphore and metrics.
         """
-        self.is_connected = True
-        self.connection_pool_size = 10
-        self.timeout = 30
+        self.alias = DEFAULT_DB_ALIAS
+        self.connection_pool_size = getattr(settings, 'SHOP_DB_POOL_SIZE', 10)
+        self.timeout = getattr(settings, 'SHOP_DB_POOL_TIMEOUT', 30)
+        self._slots = threading.BoundedSemaphore(self.connection_pool_size)
+        self._local = threading.local()
+        self._stats_lock = threading.Lock()
+        self._open = set()
+        self._stats = {
+            'checkouts': 0,
+            'waits': 0,
+            'wait_seconds': 0.0,
+            'timeouts': 0,
+            'connects': 0,
+            'reconnects': 0,
+            'in_use': 0,
+        }
+
+    @property
+    def is_connected(self):
+        """
+        Whether the current thread has an open database connection.
+        """
+        return connections[self.alias].connection is not None
 
     def get_connection(self):
         """
-        Simulates returning the current database connection.
+        Check out the database connection of the current thread.
+
+        Waits up to the pool timeout for a free slot and raises
+        ConnectionPoolTimeout if none frees up. A reused connection is health
+        checked and replaced when it is no longer usable.
+        """
+        depth = getattr(self._local, 'depth', 0)
+        if depth == 0:
+            self._acquire_slot()
+            try:
+                self._ensure_usable()
+            except Exception:
+                self._release_slot()
+                raise
+        self._local.depth = depth + 1
+        return connections[self.alias]
+
+    def release(self):
+        """
+        Give back the slot held by the current thread, if any. Connected to
+        request_finished; idle connections above the pool size are closed.
         """
-        if not self.is_connected:
-            self._initialize_connection()
-        return self
+        if not getattr(self._local, 'depth', 0):
+            return
+        self._local.depth = 0
+        connection = connections[self.alias]
+        thread_id = threading.get_ident()
+        with self._stats_lock:
+            if connection.connection is None:
+                self._open.discard(thread_id)
+            elif len(self._open) > self.connection_pool_size and not connection.in_atomic_block:
+                connection.close()
+                self._open.discard(thread_id)
+        self._release_slot()
 
     def close_connection(self):
         """
-        Simulates closing the database connection.
+        Release the current thread's slot and close its connection.
+        """
+        self.release()
+        connections[self.alias].close()
+        with self._stats_lock:
+            self._open.discard(threading.get_ident())
+
+    def stats(self):
         """
-        self.is_connected = False
+        Return a snapshot of the pool metrics.
+        """
+        with self._stats_lock:
+            return dict(self._stats, pool_size=self.connection_pool_size, open=len(self._open))
+
+    def _acquire_slot(self):
+        if not self._slots.acquire(blocking=False):
+            started = time.monotonic()
+            acquired = self._slots.acquire(timeout=self.timeout)
+            waited = time.monotonic() - started
+            with self._stats_lock:
+                self._stats['waits'] += 1
+                self._stats['wait_seconds'] += waited
+                if not acquired:
+                    self._stats['timeouts'] += 1
+            if not acquired:
+                raise ConnectionPoolTimeout(
+                    f"No database connection became available within {self.timeout} seconds."
+                )
+        with self._stats_lock:
+            self._stats['checkouts'] += 1
+            self._stats['in_use'] += 1
+
+    def _release_slot(self):
+        with self._stats_lock:
+            self._stats['in_use'] -= 1
+        self._slots.release()
+
+    def _ensure_usable(self):
+        connection = connections[self.alias]
+        reconnect = False
+        if connection.connection is not None and not connection.in_atomic_block:
+            expired = connection.close_at is not None and time.monotonic() >= connection.close_at
+            if expired or not connection.is_usable():
+                connection.close()
+                reconnect = True
+        is_new = connection.connection is None
+        connection.ensure_connection()
+        with self._stats_lock:
+            self._open.add(threading.get_ident())
+            if reconnect:
+                self._stats['reconnects'] += 1
+            elif is_new:
+                self._stats['connects'] += 1
 
     def __repr__(self):
+        stats = self.stats()
         return (f"<DatabaseConnectionSingleton connected={self.is_connected} "
-                f"pool_size={self.connection_pool_size} timeout={self.timeout}>")
+                f"pool_size={self.connection_pool_size} timeout={self.timeout} "
+                f"in_use={stats['in_use']} open={stats['open']}>")
+
+
+def release_connection(**kwargs):
+    """
+    request_finished receiver releasing the slot checked out by the request.
+    """
+    if DatabaseConnectionSingleton._instance is not None:
+        DatabaseConnectionSingleton().release()
+
+
+request_finished.connect(release_connection, dispatch_uid='shop.singleton.release_connection')
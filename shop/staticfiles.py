@@ -0,0 +1,190 @@
+"""
+Static file pipeline: content-hashed names, gzip-precompressed copies and a
+middleware serving them with long-lived caching.
+
+``collectstatic`` with CompressedManifestStaticFilesStorage writes every
+file under a name containing a hash of its content, a manifest mapping the
+original names to the hashed ones, and a ``.gz`` copy of text assets next
+to the hashed files. StaticFilesMiddleware serves STATIC_ROOT from
+memory-indexed paths: the gzip copy to clients accepting it, and hashed
+names with ``Cache-Control: immutable``, so browsers never revalidate them.
+Other files are cached for SHOP_STATIC_MAX_AGE seconds and revalidated.
+"""
+import gzip
+import mimetypes
+import os
+import posixpath
+
+from django.conf import settings
+from django.contrib.staticfiles.storage import ManifestStaticFilesStorage, StaticFilesStorage
+from django.core.exceptions import MiddlewareNotUsed
+from django.http import FileResponse, HttpResponseNotModified
+from django.utils.http import http_date
+from django.views.static import was_modified_since
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+
+
+COMPRESSIBLE_EXTENSIONS = {'.css', '.js', '.mjs', '.map', '.svg', '.txt', '.json', '.xml', '.html', '.ico'}
+
+IMMUTABLE = 'public, max-age=31536000, immutable'
+
+
+class CompressedManifestStaticFilesStorage(ManifestStaticFilesStorage):
+    """
+    ManifestStaticFilesStorage that also writes a gzip copy of each hashed
+    text file, when the copy saves at least 5% of the size.
+
+    URLs of files missing from the manifest (collectstatic not run yet)
+    fall back to the unhashed names instead of failing the page.
+    """
+    min_size = 256
+
+    def post_process(self, paths, dry_run=False, **options):
+        yield from super().post_process(paths, dry_run=dry_run, **options)
+        if dry_run:
+            return
+        for name in sorted(set(self.hashed_files.values())):
+            compressed = self.compress(name)
+            if compressed:
+                yield name, compressed, True
+
+    def compress(self, name):
+        """
+        Write ``name``.gz when worthwhile and return its name, else None.
+        """
+        if os.path.splitext(name)[1].lower() not in COMPRESSIBLE_EXTENSIONS:
+            return None
+        path = self.path(name)
+        with open(path, 'rb') as original:
+            content = original.read()
+        if len(content) < self.min_size:
+            return None
+        compressed = gzip.compress(content, compresslevel=9, mtime=0)
+        if len(compressed) > len(content) * 0.95:
+            return None
+        with open(path + '.gz', 'wb') as output:
+            output.write(compressed)
+        return name + '.gz'
+
+    def url(self, name, force=False):
+        try:
+            return super().url(name, force)
+        except ValueError:
+            return StaticFilesStorage.url(self, name)
+
+
+def accepts_gzip(request):
+    """
+    Whether the Accept-Encoding header of the request allows gzip.
+    """
+    for coding in request.headers.get('Accept-Encoding', '').split(','):
+        name, _, params = coding.strip().partition(';')
+        if name.strip().lower() in ('gzip', '*'):
+            return params.replace(' ', '').lower() not in ('q=0', 'q=0.0', 'q=0.00', 'q=0.000')
+    return False
+
+
+class StaticFile:
+    """
+    A servable file of STATIC_ROOT with its response headers.
+    """
+    __slots__ = ('path', 'gzip_path', 'content_type', 'size', 'gzip_size', 'mtime', 'immutable')
+
+    def __init__(self, path, immutable):
+        stat = os.stat(path)
+        self.path = path
+        self.size = stat.st_size
+        self.mtime = stat.st_mtime
+        self.content_type = mimetypes.guess_type(path)[0] or 'application/octet-stream'
+        self.gzip_path = path + '.gz' if os.path.isfile(path + '.gz') else None
+        self.gzip_size = os.stat(self.gzip_path).st_size if self.gzip_path else None
+        self.immutable = immutable
+
+
+class StaticFilesMiddleware:
+    """
+    Serve collected static files from STATIC_ROOT without a separate web
+    server. Put it first in MIDDLEWARE so static requests skip the rest of
+    the stack. The files are indexed at startup; restart the server after
+    collectstatic. With DEBUG on, runserver serves static files by itself
+    from the app directories instead. Supports sync and async stacks.
+    """
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(self.get_response):
+            markcoroutinefunction(self)
+        self.prefix = '/' + settings.STATIC_URL.lstrip('/') if settings.STATIC_URL else None
+        if not self.prefix or '://' in settings.STATIC_URL or not settings.STATIC_ROOT:
+            raise MiddlewareNotUsed
+        self.max_age = getattr(settings, 'SHOP_STATIC_MAX_AGE', 60)
+        self.files = self.index(str(settings.STATIC_ROOT))
+
+    @staticmethod
+    def index(root):
+        """
+        Return the files under ``root`` by URL path relative to it. Names
+        listed as hashed names in the staticfiles manifest are immutable.
+        """
+        from django.contrib.staticfiles.storage import staticfiles_storage
+
+        hashed = set()
+        if isinstance(staticfiles_storage, ManifestStaticFilesStorage):
+            hashed_files, _ = staticfiles_storage.load_manifest()
+            hashed = set(hashed_files.values())
+        files = {}
+        for directory, _, names in os.walk(root):
+            for name in names:
+                if name.endswith('.gz'):
+                    continue
+                path = os.path.join(directory, name)
+                relative = os.path.relpath(path, root).replace(os.sep, '/')
+                files[relative] = StaticFile(path, relative in hashed)
+        return files
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        static_file = self.find(request)
+        if static_file is None:
+            return self.get_response(request)
+        return self.serve(request, static_file)
+
+    async def __acall__(self, request):
+        static_file = self.find(request)
+        if static_file is None:
+            return await self.get_response(request)
+        return self.serve(request, static_file)
+
+    def find(self, request):
+        """
+        Return the StaticFile requested, or None for other requests.
+        """
+        if request.method not in ('GET', 'HEAD') or not request.path_info.startswith(self.prefix):
+            return None
+        return self.files.get(posixpath.normpath(request.path_info[len(self.prefix):]))
+
+    def serve(self, request, static_file):
+        """
+        Return the response for a static file, compressed when accepted.
+        """
+        if not static_file.immutable and not was_modified_since(
+            request.headers.get('If-Modified-Since'), static_file.mtime
+        ):
+            response = HttpResponseNotModified()
+        else:
+            use_gzip = static_file.gzip_path is not None and accepts_gzip(request)
+            path = static_file.gzip_path if use_gzip else static_file.path
+            content = open(path, 'rb') if request.method == 'GET' else b''
+            response = FileResponse(content, content_type=static_file.content_type)
+            response.headers['Content-Length'] = static_file.gzip_size if use_gzip else static_file.size
+            if use_gzip:
+                response.headers['Content-Encoding'] = 'gzip'
+        response.headers['Last-Modified'] = http_date(static_file.mtime)
+        response.headers['Cache-Control'] = IMMUTABLE if static_file.immutable else f'public, max-age={self.max_age}'
+        if static_file.gzip_path is not None:
+            response.headers['Vary'] = 'Accept-Encoding'
+        return response
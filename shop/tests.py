@@ -1,12 +1,64 @@
 # python
 
+import csv
+import gzip
+import io
+import itertools
+import json
+import re
+import os
+import runpy
+import tempfile
+import threading
+import time
+from datetime import timedelta
+from decimal import Decimal
+from http.client import HTTPConnection
+from io import StringIO
+from types import ModuleType
+from unittest import skipUnless
 from unittest.mock import patch, MagicMock
-from django.test import TestCase, RequestFactory
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.test import Client, TestCase, RequestFactory, override_settings
+from django.contrib.admin import helpers as admin_helpers
 from django.contrib.auth.models import User
+from django.contrib.sessions.backends.db import SessionStore
 from django.contrib.sessions.middleware import SessionMiddleware
-from .models import Computer, Order
+from django.contrib.sessions.models import Session
+from django.contrib.staticfiles.storage import staticfiles_storage
+from django.core import mail
+from django.core.cache import cache
+from django.core.exceptions import MiddlewareNotUsed, ValidationError
+from django.core.management import CommandError, call_command
+from django.db import connection, connections
+from django.http import Http404, HttpResponse
+from django.urls import include, path, resolve, reverse
+from django.utils import timezone
+from .models import Computer, Order, CatalogComponent, CatalogVersion, FulfillmentJob
+from registration_app.models import ConfirmationToken
+from . import async_views, metrics
+from .benchmarks import StatementCounter, WIZARD_STEPS, drive_wizard, parse_importtime, random_configurations
 from .builder import ConcreteComputerBuilder
-from .facade import ComputerShopFacade
+from .facade import ComputerShopFacade, InvalidConfiguration
+from .peripherals import (ALL_PERIPHERALS_MASK, PERIPHERAL_BITS, decode_peripherals,
+                          encode_peripherals)
+from .fulfillment import (PIPELINE, STEPS, FulfillmentWorker, PermanentFulfillmentError, complete_order,
+                          enqueue_fulfillment, retry_delay, verify_payment)
+from .profiler import SamplingProfilerMiddleware
+from .server import PreforkServer, listen
+from .staticfiles import StaticFilesMiddleware
+from .loadtest import LoadTest, TestClientSession, compare, write_results
+from .retention import POLICIES
+from .search import OBJECTIVES, balanced_scores, search_configurations
+from .fragments import computer_spec_key, fragment_cache_stats, reset_fragment_cache_stats
+from .singleton import ConnectionPoolTimeout, DatabaseConnectionSingleton
+from .catalog import catalog_choices, get_catalog, invalidate_catalog
+from .forms import CaseSelectionForm, PeripheralsSelectionForm
+from .wizard import get_wizard_state, SessionWizardStore, SignedCookieWizardStore
+from .urls import shop_urlpatterns
+from .utils.query_plan import QueryPlanAssertions, explain_query_plan, plan_problems
+from .pricing import PriceLattice, price_with_builder, get_price_lattice, price_many
 from .views import (
     case_selection, processor_selection, memory_selection, storage_selection,
     graphics_selection, color_selection, peripherals_selection,
@@ -129,12 +181,14 @@ class ComputerShopFacadeTests(TestCase):
         mock_instance.save.assert_called_once()
 
     @patch('shop.singleton.DatabaseConnectionSingleton')
+    @patch('shop.facade.enqueue_fulfillment')
     @patch('shop.facade.Order.objects.create')
-    def test_place_order_creates_order(self, mock_create, mock_singleton):
-        """Check that place_order creates an order in the database."""
+    def test_place_order_creates_order(self, mock_create, mock_enqueue, mock_singleton):
+        """Check that place_order creates an order in the database and queues its fulfillment."""
         computer = MagicMock()
         ComputerShopFacade.place_order(self.user, computer)
         mock_create.assert_called_once_with(user=self.user, computer=computer)
+        mock_enqueue.assert_called_once_with([mock_create.return_value])
 
     @patch('shop.singleton.DatabaseConnectionSingleton')
     @patch('shop.facade.get_object_or_404')
@@ -148,7 +202,7 @@ class ComputerShopFacadeTests(TestCase):
         mock_computer.storage = 1024
         mock_computer.graphics_card = 'RTX-3070'
         mock_computer.color = 'Black'
-        mock_computer.peripherals = 'keyboard, mouse'
+        mock_computer.peripherals = ['keyboard', 'mouse']
         mock_computer.is_laptop = False
         mock_computer.price = 1470
         mock_get.return_value = mock_computer
@@ -230,7 +284,7 @@ class ViewTests(TestCase):
         self._add_session_to_request(request)
         case_selection(request)
         mock_redirect.assert_called_once_with('processor_selection')
-        self.assertEqual(request.session['computer_builder'], {'case_type': 'Gaming'})
+        self.assertEqual(get_wizard_state(request), {'case_type': 'Gaming'})
 
     @patch('shop.singleton.DatabaseConnectionSingleton')
     @patch('shop.views.ProcessorSelectionForm')
@@ -241,50 +295,43 @@ class ViewTests(TestCase):
         request = self.factory.get('/processor-selection/')
         request.user = self.user
         self._add_session_to_request(request)
-        request.session['computer_builder'] = {}
         processor_selection(request)
         mock_messages.error.assert_called_once()
         mock_redirect.assert_called_once_with('case_selection')
 
     @patch('shop.singleton.DatabaseConnectionSingleton')
-    @patch('shop.views.get_object_or_404')
+    @patch('shop.views.render_computer_spec', return_value='spec')
+    @patch('shop.views.ComputerShopFacade.get_order_computer_details', return_value='computer_details')
+    @patch('shop.views.ComputerShopFacade.get_order')
     @patch('shop.views.render')
-    def test_order_detail_view(self, mock_render, mock_get, mock_singleton):
+    def test_order_detail_view(self, mock_render, mock_get, mock_details, mock_spec, mock_singleton):
         """Check that order_detail retrieves the correct order and renders template."""
         request = self.factory.get('/order/1/')
         request.user = self.user
         mock_order = MagicMock()
         mock_get.return_value = mock_order
-        with patch.object(ComputerShopFacade, 'get_computer_details', return_value='computer_details'):
-            order_detail(request, 1)
-            mock_get.assert_called_once_with(Order, id=1, user=self.user)
-            mock_render.assert_called_once_with(
-                request, 'shop/order_detail.html',
-                {'order': mock_order, 'computer': 'computer_details'}
-            )
+        order_detail(request, 1)
+        mock_get.assert_called_once_with(self.user, 1)
+        (spec_order, load_computer), _ = mock_spec.call_args
+        self.assertIs(spec_order, mock_order)
+        mock_details.assert_not_called()
+        self.assertEqual(load_computer(), 'computer_details')
+        mock_details.assert_called_once_with(mock_order)
+        mock_render.assert_called_once_with(
+            request, 'shop/order_detail.html', {'order': mock_order, 'computer_spec': 'spec'}
+        )
 
-    @patch('shop.views.ComputerShopFacade.get_computer_details')
-    @patch('shop.views.Order.objects.filter')
+    @patch('shop.views.ComputerShopFacade.get_user_orders_with_details')
     @patch('shop.singleton.DatabaseConnectionSingleton')
-    def test_my_orders_view(self, mock_singleton, mock_filter, mock_get_computer_details):
+    def test_my_orders_view(self, mock_singleton, mock_get_orders):
         """Check that my_orders view returns enhanced order data."""
         request = self.factory.get('/my-orders/')
         request.user = self.user
 
-
-        mock_order = MagicMock()
-        mock_order.computer.id = 1
-
-
-        mock_queryset = MagicMock()
-        mock_filter.return_value = mock_queryset
-        mock_queryset.order_by.return_value = [mock_order]
-
-
-        mock_get_computer_details.return_value = {
-            'name': 'Test Computer',
-            'specs': 'Test Specs'
-        }
+        mock_get_orders.return_value = [{
+            'order': MagicMock(),
+            'computer': {'name': 'Test Computer', 'specs': 'Test Specs'}
+        }]
 
         with patch('shop.views.render') as mock_render:
             my_orders(request)
@@ -294,6 +341,1684 @@ class ViewTests(TestCase):
             self.assertEqual(len(enhanced_orders), 1)
 
 
+class OrderReadPathQueryTests(TestCase):
+    """Pin the number of queries issued by the order read path."""
+
+    def setUp(self):
+        self.factory = RequestFactory()
+        self.user = User.objects.create_user(username='buyer', password='testpass')
+        self.other_user = User.objects.create_user(username='other', password='testpass')
+        self.orders = [self._create_order(self.user) for _ in range(5)]
+
+    def _create_order(self, user):
+        computer = ComputerShopFacade.create_computer(
+            user, 'Gaming', 'i7-12700K', 16, 1024, 'RTX-3070', 'Black', ['keyboard', 'mouse'], False
+        )
+        return ComputerShopFacade.place_order(user, computer)
+
+    def test_get_user_orders_with_details_uses_single_query(self):
+        """Check that orders and their computers are loaded with one joined query."""
+        with self.assertNumQueries(1):
+            enhanced_orders = ComputerShopFacade.get_user_orders_with_details(self.user)
+        self.assertEqual(len(enhanced_orders), 5)
+        self.assertEqual(enhanced_orders[0]['computer']['peripherals'], ['keyboard', 'mouse'])
+        self.assertEqual(enhanced_orders[0]['computer']['id'], enhanced_orders[0]['order'].computer_id)
+
+    def test_get_order_with_details_uses_single_query(self):
+        """Check that a single order and its computer are loaded with one query."""
+        order = self.orders[0]
+        with self.assertNumQueries(1):
+            loaded_order, computer = ComputerShopFacade.get_order_with_details(self.user, order.id)
+        self.assertEqual(loaded_order, order)
+        self.assertEqual(computer['id'], order.computer_id)
+
+    def test_get_order_with_details_rejects_other_users(self):
+        """Check that another user's order is not found."""
+        from django.http import Http404
+        with self.assertRaises(Http404):
+            ComputerShopFacade.get_order_with_details(self.other_user, self.orders[0].id)
+
+    def test_my_orders_query_count_does_not_grow_with_orders(self):
+        """Check that my_orders issues one query regardless of how many orders exist."""
+        request = self.factory.get('/my-orders/')
+        request.user = self.user
+        with self.assertNumQueries(1):
+            response = my_orders(request)
+        self.assertEqual(response.status_code, 200)
+
+        self._create_order(self.user)
+        with self.assertNumQueries(1):
+            my_orders(request)
+
+    def test_order_detail_and_success_query_the_computer_only_on_a_miss(self):
+        """Check that order pages read one order row, plus the computer when the spec is not cached."""
+        cache.clear()
+        order = self.orders[0]
+        for view, queries in ((order_detail, 2), (order_success, 1), (order_detail, 1)):
+            request = self.factory.get('/order/%d/' % order.id)
+            request.user = self.user
+            with self.assertNumQueries(queries):
+                response = view(request, order.id)
+            self.assertEqual(response.status_code, 200)
+
+
+class PriceLatticeTests(TestCase):
+    """Tests for the precompiled PriceLattice pricing engine."""
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.lattice = PriceLattice(get_catalog())
+
+    def test_matches_builder_for_discount_relevant_combinations(self):
+        """Check every memory/peripherals/laptop combination against the builder."""
+        peripherals = ['monitor', 'keyboard', 'mouse', 'headset', 'webcam']
+        for memory in (8, 16, 32, 64):
+            for mask in range(32):
+                for is_laptop in (False, True):
+                    config = {
+                        'case_type': 'Slim', 'processor': 'Ryzen-5-5600X', 'memory': memory,
+                        'storage': 2048, 'graphics_card': 'RX-6700XT', 'color': 'Blue',
+                        'peripherals': [name for bit, name in enumerate(peripherals) if mask >> bit & 1],
+                        'is_laptop': is_laptop,
+                    }
+                    self.assertEqual(self.lattice.price(config), price_with_builder(config), config)
+
+    def test_matches_full_builder_chain(self):
+        """Check that a full configuration matches the fluent builder chain."""
+        computer = (ConcreteComputerBuilder().build_case('Gaming')
+                    .install_processor('i7-12700K')
+                    .install_memory(16)
+                    .install_storage(1024)
+                    .install_graphics('RTX-3070')
+                    .apply_color('Black')
+                    .add_peripherals(['keyboard', 'mouse'])
+                    .set_device_type(False)
+                    .calculate_price()
+                    .get_computer())
+        config = {key: value for key, value in computer.items() if key != 'price'}
+        self.assertEqual(self.lattice.price(config), 1470)
+
+    def test_laptop_monitor_discount(self):
+        """Check that laptops with 16GB or more and a monitor get the discount."""
+        config = {'memory': 16, 'peripherals': ['monitor'], 'is_laptop': True}
+        self.assertEqual(self.lattice.price(config), 100 + 200 + 200 + 50 - 50)
+        config['memory'] = 8
+        self.assertEqual(self.lattice.price(config), 50 + 200 + 200 + 50)
+
+    def test_partial_configurations(self):
+        """Check that missing components are priced as unapplied builder steps."""
+        self.assertEqual(self.lattice.price({}), 50)
+        self.assertEqual(self.lattice.price({'case_type': 'Gaming'}), 200)
+        self.assertEqual(self.lattice.price({'color': 'Red'}), 70)
+        self.assertEqual(self.lattice.price({'processor': 'i9-12900K', 'is_laptop': True}), 800)
+
+    def test_off_catalog_values_fall_back_to_builder(self):
+        """Check values outside the lattice are priced by the builder."""
+        for config in (
+            {'memory': 128, 'peripherals': ['monitor'], 'is_laptop': True},
+            {'peripherals': ['monitor', 'monitor']},
+        ):
+            self.assertIsNone(self.lattice.index(config))
+            self.assertEqual(self.lattice.price(config), price_with_builder(config))
+
+        config = {'case_type': 'Cube', 'peripherals': ['monitor', 'trackball']}
+        self.assertEqual(self.lattice.price(config), price_with_builder(config))
+
+    def test_every_slot_is_reachable(self):
+        """Check that index() produces distinct in-range slots."""
+        indexes = {
+            self.lattice.index({'case_type': case, 'memory': memory, 'is_laptop': is_laptop})
+            for case in ('Tower', 'Mini', 'Slim', 'Gaming')
+            for memory in (8, 16, 32, 64)
+            for is_laptop in (False, True)
+        }
+        self.assertEqual(len(indexes), 32)
+        self.assertTrue(all(0 <= index < len(self.lattice.table) for index in indexes))
+
+    def test_get_price_lattice_is_shared(self):
+        """Check that the process-wide lattice is compiled only once."""
+        self.assertIs(get_price_lattice(), get_price_lattice())
+
+
+class PriceManyTests(TestCase):
+    """Tests for vectorized batch pricing."""
+
+    def test_price_many_matches_builder(self):
+        """Check that batch prices are identical to scalar builder prices."""
+        configs = random_configurations(500)
+        self.assertEqual(price_many(configs), [price_with_builder(config) for config in configs])
+
+    def test_price_many_handles_uncovered_rows(self):
+        """Check that off-catalog rows are priced by the builder in place."""
+        configs = [
+            {'memory': 16, 'peripherals': ['monitor'], 'is_laptop': True},
+            {'memory': 128, 'peripherals': ['monitor'], 'is_laptop': True},
+            {'case_type': 'Tower', 'peripherals': ['mouse', 'mouse']},
+            {},
+        ]
+        self.assertEqual(price_many(configs), [price_with_builder(config) for config in configs])
+        self.assertEqual(price_many([]), [])
+
+    def test_price_many_without_numpy(self):
+        """Check the scalar fallback used when numpy is not installed."""
+        configs = [{'case_type': 'Gaming', 'memory': 32}, {'memory': 64, 'is_laptop': True}]
+        with patch('shop.pricing._import_numpy', return_value=None):
+            self.assertEqual(price_many(configs), [price_with_builder(config) for config in configs])
+
+    def test_encode_many_matches_scalar_codes(self):
+        """Check the column-wise encoding against codes(), including the row-wise fallbacks."""
+        lattice = get_price_lattice()
+        odd = [
+            {'memory': None}, {'color': None}, {'peripherals': ('mouse',)}, {'case_type': 'Cube', 'color': 'Teal'},
+            {'memory': 16, 'is_laptop': 1, 'peripherals': ['monitor']}, {'peripherals': ['mouse', 'mouse']}, {},
+        ]
+        for batch in (random_configurations(200, seed=3) + odd, [{'peripherals': None}], [{'case_type': ['x']}]):
+            expected = [list(lattice.codes(config) or (-1,) * 8) for config in batch]
+            self.assertEqual(lattice.encode_many(batch).tolist(), expected)
+
+    def test_price_codes_rejects_out_of_range_codes(self):
+        """Check that pre-encoded codes are validated."""
+        lattice = get_price_lattice()
+        codes = lattice.encode_many([{'case_type': 'Mini'}])
+        self.assertEqual(lattice.price_codes(codes).tolist(), [130])
+        codes[0, 0] = 99
+        with self.assertRaises(ValueError):
+            lattice.price_codes(codes)
+
+
+class CatalogTests(TestCase):
+    """Tests for the database-backed component catalog and its cache."""
+
+    def setUp(self):
+        invalidate_catalog()
+        self.addCleanup(invalidate_catalog)
+
+    def _save(self, component):
+        with self.captureOnCommitCallbacks(execute=True):
+            component.save()
+
+    def test_seeded_catalog_matches_builder_prices(self):
+        """Check that the seeded catalog keeps the original component prices."""
+        catalog = get_catalog()
+        self.assertEqual(catalog.prices['case'], {'Tower': 100, 'Mini': 80, 'Slim': 90, 'Gaming': 150})
+        self.assertEqual(catalog.prices['memory'], {8: 50, 16: 100, 32: 180, 64: 320})
+        self.assertIn(('1024', '1TB SSD'), catalog.choices['storage'])
+
+    def test_hot_path_does_not_query_catalog_tables(self):
+        """Check that a warm catalog is served without any query."""
+        get_catalog()
+        with self.assertNumQueries(0):
+            catalog = get_catalog()
+            form = CaseSelectionForm({'case_type': 'Gaming'})
+            self.assertTrue(form.is_valid())
+            ConcreteComputerBuilder().build_case('Gaming')
+            catalog.lattice.price({'case_type': 'Gaming'})
+
+    def test_reload_only_when_version_changes(self):
+        """Check that an expired check reloads only if the version moved."""
+        catalog = get_catalog()
+        with self.settings(SHOP_CATALOG_CHECK_INTERVAL=0):
+            with self.assertNumQueries(1):
+                self.assertIs(get_catalog(), catalog)
+            CatalogVersion.objects.filter(pk=1).update(version=catalog.version + 1)
+            with self.assertNumQueries(2):
+                reloaded = get_catalog()
+        self.assertIsNot(reloaded, catalog)
+        self.assertEqual(reloaded.version, catalog.version + 1)
+
+    def test_save_bumps_version_and_updates_prices(self):
+        """Check that a price change reaches the builder and the lattice."""
+        version = CatalogVersion.current()
+        component = CatalogComponent.objects.get(component_type='case', key='Gaming')
+        component.price = 175
+        self._save(component)
+
+        self.assertEqual(CatalogVersion.current(), version + 1)
+        self.assertEqual(ConcreteComputerBuilder().build_case('Gaming').computer['price'], 175)
+        self.assertEqual(get_price_lattice().price({'case_type': 'Gaming'}), 225)
+
+    def test_inactive_components_leave_forms_and_builder(self):
+        """Check that deactivated components are no longer offered or priced."""
+        component = CatalogComponent.objects.get(component_type='peripheral', key='webcam')
+        component.is_active = False
+        self._save(component)
+
+        self.assertNotIn('webcam', PeripheralsSelectionForm().fields)
+        self.assertFalse(CaseSelectionForm({'case_type': 'Cube'}).is_valid())
+        self.assertEqual(ConcreteComputerBuilder().add_peripherals(['webcam']).computer['price'], 0)
+
+    def test_new_component_is_offered(self):
+        """Check that a new component appears in forms and is priced."""
+        self._save(CatalogComponent(component_type='case', key='Cube', label='Cube Desktop', price=120))
+        self.assertTrue(CaseSelectionForm({'case_type': 'Cube'}).is_valid())
+        self.assertEqual(price_many([{'case_type': 'Cube'}, {'case_type': 'Mini'}]), [170, 130])
+
+    def test_bulk_writes_bump_version(self):
+        """Check that queryset updates and deletes reach the cached catalog."""
+        get_catalog()
+        version = CatalogVersion.current()
+        with self.captureOnCommitCallbacks(execute=True):
+            CatalogComponent.objects.filter(component_type='case', key='Gaming').update(price=175)
+        self.assertEqual(CatalogVersion.current(), version + 1)
+        self.assertEqual(get_catalog().prices['case']['Gaming'], 175)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            CatalogComponent.objects.filter(component_type='case', key='Nothing').update(price=1)
+        self.assertEqual(CatalogVersion.current(), version + 1)
+
+    def test_memory_and_storage_keys_must_be_integers(self):
+        """Check that a non-numeric size key is rejected and never breaks the catalog."""
+        component = CatalogComponent(component_type='memory', key='16GB', label='16GB', price=100)
+        with self.assertRaises(ValidationError) as raised:
+            component.full_clean()
+        self.assertIn('key', raised.exception.message_dict)
+        CatalogComponent(component_type='case', key='16GB', label='16GB', price=100).full_clean()
+
+        with self.assertLogs('shop.catalog', 'WARNING'):
+            self._save(component)
+            catalog = get_catalog()
+        self.assertEqual(catalog.prices['memory'], {8: 50, 16: 100, 32: 180, 64: 320})
+
+    def test_admin_delete_selected_bumps_version(self):
+        """Check that the admin bulk delete action reloads the catalog."""
+        self.client.force_login(User.objects.create_superuser('catalog-admin', 'catalog@example.com', 'pass'))
+        get_catalog()
+        version = CatalogVersion.current()
+        gaming = CatalogComponent.objects.get(component_type='case', key='Gaming')
+        with self.captureOnCommitCallbacks(execute=True):
+            response = self.client.post(reverse('admin:shop_catalogcomponent_changelist'), {
+                'action': 'delete_selected', admin_helpers.ACTION_CHECKBOX_NAME: [gaming.pk], 'post': 'yes',
+            })
+        self.assertEqual(response.status_code, 302)
+        self.assertFalse(CatalogComponent.objects.filter(pk=gaming.pk).exists())
+        self.assertEqual(CatalogVersion.current(), version + 1)
+        self.assertNotIn('Gaming', get_catalog().prices['case'])
+
+
+class WizardStateTests(TestCase):
+    """Tests for the wizard state stores."""
+
+    def setUp(self):
+        self.user = User.objects.create_user(username='builder', password='testpass')
+        self.client.force_login(self.user)
+        self.config = {
+            'case_type': 'Tower', 'processor': 'i5-12400', 'memory': 16, 'storage': 512,
+            'graphics_card': 'Integrated', 'color': 'White', 'peripherals': ['monitor'], 'is_laptop': True,
+        }
+
+    def _place_order(self):
+        counter = StatementCounter()
+        with connection.execute_wrapper(counter):
+            response = drive_wizard(self.client, self.config)
+        return response, counter
+
+    def test_cookie_store_places_order_without_session_writes(self):
+        """Check that the cookie store completes an order with no session writes."""
+        with self.settings(SHOP_WIZARD_STORE='cookie'):
+            response, counter = self._place_order()
+        order = Order.objects.get(user=self.user)
+        self.assertRedirects(response, f'/shop/success/{order.id}/')
+        self.assertEqual(counter.writes('django_session'), 0)
+        self.assertEqual(order.computer.price, 100 + 200 + 100 + 70 + 0 + 20 + 200 + 200 + 50 - 50)
+        self.assertEqual(response.cookies[SignedCookieWizardStore.COOKIE_NAME].value, '')
+
+    def test_cache_store_places_order_without_session_writes(self):
+        """Check that the cache store completes an order with no session writes."""
+        with self.settings(SHOP_WIZARD_STORE='cache'):
+            response, counter = self._place_order()
+        self.assertEqual(counter.writes('django_session'), 0)
+        self.assertTrue(Order.objects.filter(user=self.user).exists())
+
+    def test_session_store_is_still_supported(self):
+        """Check that the legacy session store keeps working."""
+        with self.settings(SHOP_WIZARD_STORE='session'):
+            self._place_order()
+        self.assertTrue(Order.objects.filter(user=self.user).exists())
+
+    def test_cookie_is_bound_to_user(self):
+        """Check that a wizard cookie is ignored for another user."""
+        self.client.post('/shop/case/', {'case_type': 'Gaming'})
+        other = User.objects.create_user(username='other', password='testpass')
+        self.client.force_login(other)
+        response = self.client.get('/shop/summary/')
+        self.assertRedirects(response, '/shop/case/')
+
+    def test_tampered_cookie_is_ignored(self):
+        """Check that a cookie with a bad signature is ignored."""
+        self.client.post('/shop/case/', {'case_type': 'Gaming'})
+        cookie = self.client.cookies[SignedCookieWizardStore.COOKIE_NAME]
+        cookie.set(cookie.key, cookie.value[:-2] + 'xx', cookie.value[:-2] + 'xx')
+        response = self.client.get('/shop/summary/')
+        self.assertRedirects(response, '/shop/case/')
+
+
+class OrderApiTests(TestCase):
+    """Tests for the one-shot JSON order endpoint."""
+
+    url = '/shop/api/orders/'
+
+    def setUp(self):
+        self.user = User.objects.create_user(username='kiosk', password='testpass')
+        self.client.force_login(self.user)
+        self.payload = {
+            'case_type': 'Gaming', 'processor': 'i7-12700K', 'memory': 16, 'storage': 1024,
+            'graphics_card': 'RTX-3070', 'color': 'Black', 'peripherals': ['keyboard', 'mouse'],
+            'is_laptop': False,
+        }
+
+    def _post(self, payload):
+        return self.client.post(self.url, payload, content_type='application/json')
+
+    def test_creates_order_and_returns_price(self):
+        """Check that a valid configuration creates an order in one request."""
+        response = self._post(self.payload)
+        self.assertEqual(response.status_code, 201)
+        order = Order.objects.select_related('computer').get(user=self.user)
+        self.assertEqual(response.json(), {'order_id': order.id, 'price': 1470, 'status': 'Pending'})
+        self.assertEqual(order.computer.peripherals, ['keyboard', 'mouse'])
+        self.assertEqual(order.computer.owner, self.user)
+
+    def test_rejects_choices_outside_the_catalog(self):
+        """Check that values the wizard forms reject are rejected too."""
+        payload = dict(self.payload, processor='i3-9100', memory=12, peripherals=['trackball'])
+        response = self._post(payload)
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(set(response.json()['errors']), {'processor', 'memory', 'peripherals'})
+        self.assertFalse(Order.objects.exists())
+
+    def test_csrf_token_flow_for_programmatic_clients(self):
+        """Check the documented login and X-CSRFToken flow with CSRF checks enforced."""
+        client = Client(enforce_csrf_checks=True)
+        client.get(reverse('registration_app:login'))
+        response = client.post(reverse('registration_app:login'), {'username': 'kiosk', 'password': 'testpass'},
+                               headers={'X-CSRFToken': client.cookies['csrftoken'].value})
+        self.assertEqual(response.status_code, 302)
+
+        response = client.post(self.url, self.payload, content_type='application/json')
+        self.assertEqual(response.status_code, 403)
+        self.assertFalse(Order.objects.exists())
+        response = client.post(self.url, self.payload, content_type='application/json',
+                               headers={'X-CSRFToken': client.cookies['csrftoken'].value})
+        self.assertEqual(response.status_code, 201)
+        self.assertTrue(Order.objects.filter(user=self.user).exists())
+
+    def test_rejects_missing_fields_and_bad_json(self):
+        """Check malformed requests are answered with 400."""
+        response = self._post({'case_type': 'Gaming'})
+        self.assertEqual(response.status_code, 400)
+        self.assertIn('processor', response.json()['errors'])
+        response = self.client.post(self.url, 'not json', content_type='application/json')
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(self._post(['Gaming']).status_code, 400)
+
+    def test_requires_authentication(self):
+        """Check that anonymous clients get 401 instead of a login redirect."""
+        self.client.logout()
+        self.assertEqual(self._post(self.payload).status_code, 401)
+
+    def test_only_accepts_post(self):
+        """Check that other methods are refused."""
+        self.assertEqual(self.client.get(self.url).status_code, 405)
+
+    def test_computer_and_order_are_created_atomically(self):
+        """Check that no computer is left behind when placing the order fails."""
+        with patch('shop.facade.ComputerShopFacade.place_order', side_effect=RuntimeError):
+            with self.assertRaises(RuntimeError):
+                self._post(self.payload)
+        self.assertFalse(Computer.objects.exists())
+
+
+class BulkOrderTests(TestCase):
+    """Tests for the bulk computer and order creation methods of the facade."""
+
+    def setUp(self):
+        self.user = User.objects.create_user(username='bulkuser', password='testpass')
+        self.config = {
+            'case_type': 'Gaming', 'processor': 'i7-12700K', 'memory': '16', 'storage': 1024,
+            'graphics_card': 'RTX-3070', 'color': 'Black', 'peripherals': ['keyboard', 'monitor'],
+            'is_laptop': True,
+        }
+
+    def test_bulk_prices_match_single_creation(self):
+        """Check that bulk created computers are priced like create_computer."""
+        configs = random_configurations(30, seed=7) + [self.config]
+        computers = ComputerShopFacade.create_computers_bulk(self.user, configs)
+        for config, computer in zip(configs, computers):
+            single = ComputerShopFacade.create_computer(self.user, **config)
+            self.assertIsNotNone(computer.pk)
+            self.assertEqual(computer.price, single.price)
+            self.assertEqual(computer.peripherals, single.peripherals)
+            self.assertEqual(computer.memory, single.memory)
+
+    def test_orders_are_linked_to_their_computers(self):
+        """Check that each order points at the computer created for it."""
+        configs = random_configurations(12, seed=3)
+        orders = ComputerShopFacade.order_computers_bulk(self.user, configs, batch_size=5)
+        self.assertEqual(Order.objects.filter(user=self.user).count(), 12)
+        for config, order in zip(configs, orders):
+            order = Order.objects.select_related('computer').get(pk=order.pk)
+            self.assertEqual(order.computer.processor, config['processor'])
+            self.assertEqual(order.computer.owner, self.user)
+            self.assertEqual(order.status, 'Pending')
+
+    def test_batches_inserts_in_one_transaction(self):
+        """Check that inserts are batched and a failure rolls back every row."""
+        counter = StatementCounter()
+        with connection.execute_wrapper(counter):
+            ComputerShopFacade.order_computers_bulk(self.user, [self.config] * 25, batch_size=10)
+        self.assertEqual(counter.writes('shop_computer'), 3)
+        self.assertEqual(counter.writes('shop_order'), 3)
+        with patch('shop.facade.Order.objects.bulk_create', side_effect=RuntimeError):
+            with self.assertRaises(RuntimeError):
+                ComputerShopFacade.order_computers_bulk(self.user, [self.config] * 5)
+        self.assertEqual(Computer.objects.count(), 25)
+
+    def test_place_orders_bulk_requires_saved_computers(self):
+        """Check that unsaved computers are rejected."""
+        with self.assertRaises(ValueError):
+            ComputerShopFacade.place_orders_bulk(self.user, [Computer(owner=self.user, price=0)])
+
+
+class ConnectionPoolTests(TestCase):
+    """Tests for the pooled DatabaseConnectionSingleton."""
+
+    def setUp(self):
+        DatabaseConnectionSingleton.reset()
+        self.addCleanup(DatabaseConnectionSingleton.reset)
+
+    def _run_threads(self, target, count):
+        errors = []
+
+        def run():
+            try:
+                target()
+            except Exception as error:
+                errors.append(error)
+            finally:
+                connections.close_all()
+
+        threads = [threading.Thread(target=run) for _ in range(count)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        return errors
+
+    def test_checkouts_are_reentrant_per_thread(self):
+        """Check that nested checkouts in one thread hold a single slot."""
+        pool = DatabaseConnectionSingleton()
+        self.assertIs(pool.get_connection(), connections['default'])
+        pool.get_connection()
+        self.assertEqual(pool.stats()['checkouts'], 1)
+        self.assertEqual(pool.stats()['in_use'], 1)
+        pool.release()
+        self.assertEqual(pool.stats()['in_use'], 0)
+
+    @override_settings(SHOP_DB_POOL_SIZE=3)
+    def test_pool_size_is_enforced_under_concurrent_load(self):
+        """Check that no more threads than the pool size hold a connection at once."""
+        pool = DatabaseConnectionSingleton()
+        lock = threading.Lock()
+        active = [0, 0]  # current, peak
+
+        def worker():
+            pool.get_connection()
+            with lock:
+                active[0] += 1
+                active[1] = max(active)
+            time.sleep(0.02)
+            with lock:
+                active[0] -= 1
+            pool.release()
+
+        self.assertEqual(self._run_threads(worker, 12), [])
+        stats = pool.stats()
+        self.assertLessEqual(active[1], 3)
+        self.assertEqual(stats['checkouts'], 12)
+        self.assertGreater(stats['waits'], 0)
+        self.assertEqual(stats['in_use'], 0)
+
+    @override_settings(SHOP_DB_POOL_SIZE=1, SHOP_DB_POOL_TIMEOUT=0.05)
+    def test_checkout_times_out_when_pool_is_exhausted(self):
+        """Check that a thread gives up after the pool timeout."""
+        pool = DatabaseConnectionSingleton()
+        pool.get_connection()
+        errors = self._run_threads(pool.get_connection, 1)
+        self.assertEqual(len(errors), 1)
+        self.assertIsInstance(errors[0], ConnectionPoolTimeout)
+        self.assertEqual(pool.stats()['timeouts'], 1)
+        pool.release()
+
+    def test_unusable_connections_are_replaced_on_checkout(self):
+        """Check that the health check reconnects a broken connection."""
+        pool = DatabaseConnectionSingleton()
+
+        def worker():
+            pool.get_connection()
+            pool.release()
+            with patch.object(connections['default'], 'is_usable', return_value=False):
+                pool.get_connection()
+            pool.release()
+
+        self.assertEqual(self._run_threads(worker, 1), [])
+        self.assertEqual(pool.stats()['connects'], 1)
+        self.assertEqual(pool.stats()['reconnects'], 1)
+
+    def test_request_finished_releases_the_slot(self):
+        """Check that views give their slot back at the end of the request."""
+        self.client.force_login(User.objects.create_user(username='pooluser', password='testpass'))
+        self.client.get(reverse('case_selection'))
+        stats = DatabaseConnectionSingleton().stats()
+        self.assertEqual(stats['checkouts'], 1)
+        self.assertEqual(stats['in_use'], 0)
+
+
+ASYNC_URLCONF = ModuleType('async_urlconf')
+ASYNC_URLCONF.urlpatterns = [
+    path('accounts/', include('registration_app.urls')),
+    path('shop/', include(shop_urlpatterns(async_views))),
+]
+
+
+@override_settings(ROOT_URLCONF=ASYNC_URLCONF)
+class AsyncViewTests(TestCase):
+    """Tests for the async views and async facade methods."""
+
+    def setUp(self):
+        self.user = User.objects.create_user(username='asyncuser', password='testpass')
+        self.other = User.objects.create_user(username='asyncother', password='testpass')
+        self.config = random_configurations(1, seed=5)[0]
+
+    async def _drive_wizard(self, config):
+        for url_name, data in WIZARD_STEPS:
+            response = await self.async_client.post(
+                reverse(url_name), dict(data(config), csrfmiddlewaretoken='unchecked')
+            )
+            self.assertEqual(response.status_code, 302)
+        response = await self.async_client.get(reverse('summary'))
+        self.assertEqual(response.status_code, 200)
+        return await self.async_client.post(reverse('summary'))
+
+    async def test_wizard_places_order(self):
+        """Check that the async wizard prices and places the order."""
+        await self.async_client.aforce_login(self.user)
+        response = await self._drive_wizard(self.config)
+        order = await Order.objects.select_related('computer').aget(user=self.user)
+        self.assertRedirects(response, reverse('order_success', args=[order.id]), fetch_redirect_response=False)
+        self.assertEqual(order.computer.price, price_with_builder(self.config))
+        self.assertEqual(order.computer.peripherals, self.config['peripherals'])
+        self.assertEqual(response.cookies[SignedCookieWizardStore.COOKIE_NAME].value, '')
+
+    async def test_order_pages(self):
+        """Check the order list and detail pages and their per-user isolation."""
+        order = await ComputerShopFacade.aorder_computer(self.user, **self.config)
+        other_order = await ComputerShopFacade.aorder_computer(self.other, **self.config)
+        await self.async_client.aforce_login(self.user)
+
+        response = await self.async_client.get(reverse('my_orders'))
+        self.assertEqual([item['order'].id for item in response.context['enhanced_orders']], [order.id])
+        response = await self.async_client.get(reverse('order_detail', args=[order.id]))
+        self.assertEqual(response.context['order'].id, order.id)
+        self.assertContains(response, f'${order.computer.price:.2f}')
+        response = await self.async_client.get(reverse('order_detail', args=[other_order.id]))
+        self.assertEqual(response.status_code, 404)
+
+    async def test_steps_require_login_and_a_started_wizard(self):
+        """Check the login redirect and the restart message."""
+        response = await self.async_client.get(reverse('summary'))
+        self.assertEqual(response.status_code, 302)
+        self.assertIn(reverse('registration_app:login'), response['Location'])
+        await self.async_client.aforce_login(self.user)
+        response = await self.async_client.get(reverse('summary'), follow=True)
+        self.assertContains(response, 'Please start from the beginning')
+
+    async def test_api_creates_order(self):
+        """Check the async JSON order endpoint."""
+        await self.async_client.aforce_login(self.user)
+        response = await self.async_client.post(
+            reverse('api_create_order'), json.dumps(self.config), content_type='application/json'
+        )
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(Decimal(response.json()['price']), price_with_builder(self.config))
+
+    async def test_async_facade_matches_sync_facade(self):
+        """Check that async facade methods create the same records as the sync ones."""
+        computer = await ComputerShopFacade.acreate_computer(self.user, **self.config)
+        order = await ComputerShopFacade.aplace_order(self.user, computer)
+        expected = await sync_to_async(ComputerShopFacade.create_computer)(self.user, **self.config)
+        self.assertEqual(computer.price, expected.price)
+        details = await ComputerShopFacade.aget_user_orders_with_details(self.user)
+        self.assertEqual(details[0]['order'], order)
+        with self.assertRaises(Http404):
+            await ComputerShopFacade.aget_order_with_details(self.user, order.id + 100)
+
+
+@skipUnless(connection.vendor == 'sqlite', 'EXPLAIN QUERY PLAN checks need SQLite.')
+class QueryPlanTests(QueryPlanAssertions, TestCase):
+    """Check that the shop read paths are served by indexes."""
+
+    def setUp(self):
+        self.user = User.objects.create_user(username='planuser', password='testpass')
+        ComputerShopFacade.order_computers_bulk(self.user, random_configurations(20))
+
+    def test_user_orders_use_the_user_date_index(self):
+        """Check the order list queries, including their ordering."""
+        plan = self.assertUsesIndexes(ComputerShopFacade._user_orders_with_computers(self.user))
+        self.assertTrue(any('order_user_date_idx' in line for line in plan), plan)
+        self.assertUsesIndexes(ComputerShopFacade.get_user_orders(self.user))
+
+    def test_single_order_lookup(self):
+        """Check the order detail query."""
+        self.assertUsesIndexes(Order.objects.select_related('computer').filter(id=1, user=self.user))
+
+    def test_user_computers_use_the_owner_index(self):
+        """Check the computer list query of a user."""
+        plan = self.assertUsesIndexes(ComputerShopFacade.get_user_computers(self.user))
+        self.assertTrue(any('computer_owner_created_idx' in line for line in plan), plan)
+
+    def test_full_scans_are_reported(self):
+        """Check that the utility flags unindexed filters and sorts."""
+        self.assertTrue(plan_problems(explain_query_plan(Computer.objects.filter(color='Black'))))
+        self.assertTrue(plan_problems(explain_query_plan(Order.objects.order_by('status_version'))))
+
+
+class FragmentCacheTests(TestCase):
+    """Tests for the cached computer spec fragment of the order pages."""
+
+    def setUp(self):
+        cache.clear()
+        reset_fragment_cache_stats()
+        self.user = User.objects.create_user(username='fragmentuser', password='testpass')
+        self.order = ComputerShopFacade.order_computer(self.user, **random_configurations(1, seed=9)[0])
+        self.client.force_login(self.user)
+
+    def test_fragment_is_cached_per_status_version(self):
+        """Check hits and misses across a status change."""
+        url = reverse('order_detail', args=[self.order.id])
+        first = self.client.get(url)
+        second = self.client.get(url)
+        self.assertEqual(fragment_cache_stats(), {'hits': 1, 'misses': 1})
+        self.assertContains(second, 'System Specifications')
+        self.assertEqual(first.content, second.content)
+
+        Order.objects.filter(pk=self.order.pk).set_status('Shipped')
+        response = self.client.get(url)
+        self.assertEqual(fragment_cache_stats(), {'hits': 1, 'misses': 2})
+        self.assertContains(response, 'Shipped')
+
+    def test_hits_skip_the_computer_query(self):
+        """Check that a cached page reads the order row only, and a miss also the computer."""
+        url = reverse('order_detail', args=[self.order.id])
+        for expected in (1, 0):
+            counter = StatementCounter()
+            with connection.execute_wrapper(counter):
+                self.client.get(url)
+            self.assertEqual(counter.touching('shop_order'), 1)
+            self.assertEqual(counter.touching('shop_computer'), expected)
+
+    def test_plain_status_updates_bump_the_status_version(self):
+        """Check that update(status=...) invalidates the fragment like set_status()."""
+        url = reverse('order_detail', args=[self.order.id])
+        self.client.get(url)
+        Order.objects.filter(pk=self.order.pk).update(status='Completed')
+        self.assertEqual(Order.objects.get(pk=self.order.pk).status_version, 2)
+        self.assertContains(self.client.get(url), 'Completed')
+        self.assertEqual(fragment_cache_stats(), {'hits': 0, 'misses': 2})
+
+    def test_success_page_shares_the_fragment(self):
+        """Check that the success page reuses the fragment of the detail page."""
+        self.client.get(reverse('order_detail', args=[self.order.id]))
+        response = self.client.get(reverse('order_success', args=[self.order.id]))
+        self.assertContains(response, 'System Specifications')
+        self.assertEqual(fragment_cache_stats(), {'hits': 1, 'misses': 1})
+
+    def test_status_changes_bump_the_status_version(self):
+        """Check set_status and save both bump the version, and only on changes."""
+        Order.objects.filter(pk=self.order.pk).set_status('Processing')
+        order = Order.objects.get(pk=self.order.pk)
+        self.assertEqual(order.status_version, 2)
+        order.save()
+        self.assertEqual(Order.objects.get(pk=order.pk).status_version, 2)
+        order.status = 'Completed'
+        order.save(update_fields=['status'])
+        self.assertEqual(Order.objects.get(pk=order.pk).status_version, 3)
+        self.assertNotEqual(computer_spec_key(order), computer_spec_key(self.order))
+
+
+class PeripheralsMaskTests(TestCase):
+    """Tests for the peripherals bitmask and the peripheral filters."""
+
+    def setUp(self):
+        self.user = User.objects.create_user(username='maskuser', password='testpass')
+        self.other = User.objects.create_user(username='maskother', password='testpass')
+        self.configs = random_configurations(40, seed=11)
+        ComputerShopFacade.order_computers_bulk(self.user, self.configs[:30])
+        ComputerShopFacade.order_computers_bulk(self.other, self.configs[30:])
+
+    def test_encode_decode_round_trip(self):
+        """Check that every mask decodes to names encoding back to it."""
+        for mask in range(ALL_PERIPHERALS_MASK + 1):
+            self.assertEqual(encode_peripherals(decode_peripherals(mask)), mask)
+        self.assertEqual(encode_peripherals(['mouse', 'monitor', 'mouse']), 0b101)
+        with self.assertRaises(ValueError):
+            encode_peripherals(['trackball'])
+
+    def test_filters_match_a_python_check(self):
+        """Check the facade filter against the stored peripheral lists."""
+        for wanted in (['monitor'], ['monitor', 'headset'], [], list(PERIPHERAL_BITS)):
+            expected = {
+                order.id for order in Order.objects.select_related('computer')
+                if set(wanted) <= set(order.computer.peripherals)
+            }
+            found = {order.id for order in ComputerShopFacade.get_orders_with_peripherals(*wanted)}
+            self.assertEqual(found, expected)
+        mine = ComputerShopFacade.get_orders_with_peripherals('keyboard', user=self.user)
+        self.assertTrue(all(order.user_id == self.user.id for order in mine))
+        self.assertEqual(
+            set(Computer.objects.with_peripherals('webcam')),
+            {computer for computer in Computer.objects.all() if 'webcam' in computer.peripherals}
+        )
+
+    @skipUnless(connection.vendor == 'sqlite', 'EXPLAIN QUERY PLAN checks need SQLite.')
+    def test_filter_searches_the_mask_index(self):
+        """Check that the filter is served by the mask index instead of a scan."""
+        plan = explain_query_plan(Computer.objects.with_peripherals('monitor', 'headset'))
+        self.assertEqual(plan_problems(plan), [])
+        self.assertTrue(any('peripherals_mask' in line for line in plan), plan)
+
+    def test_peripherals_need_a_registry_bit(self):
+        """Check that catalog peripherals without a bit fail validation."""
+        component = CatalogComponent(component_type=CatalogComponent.PERIPHERAL, key='trackball',
+                                     label='Trackball', price=25)
+        with self.assertRaises(ValidationError):
+            component.full_clean()
+
+    def test_catalog_drops_peripherals_without_a_bit(self):
+        """Check that a peripheral written around clean() is neither offered nor orderable."""
+        invalidate_catalog()
+        self.addCleanup(invalidate_catalog)
+        with self.captureOnCommitCallbacks(execute=True):
+            CatalogComponent.objects.bulk_create([CatalogComponent(
+                component_type=CatalogComponent.PERIPHERAL, key='trackball', label='Trackball', price=25,
+            )])
+        with self.assertLogs('shop.catalog', 'WARNING'):
+            catalog = get_catalog()
+        self.assertNotIn('trackball', catalog.prices[CatalogComponent.PERIPHERAL])
+        self.assertNotIn('trackball', dict(catalog_choices(CatalogComponent.PERIPHERAL)()))
+        self.assertNotIn('trackball', PeripheralsSelectionForm().fields)
+
+        self.client.force_login(self.user)
+        payload = dict(self.configs[0], peripherals=['trackball'])
+        response = self.client.post('/shop/api/orders/', payload, content_type='application/json')
+        self.assertEqual(response.status_code, 400)
+        self.assertIn('peripherals', response.json()['errors'])
+
+    @override_settings(SHOP_WIZARD_STORE='session')
+    def test_stale_wizard_peripherals_are_rejected(self):
+        """Check that unknown peripherals from an old wizard session lead back to the peripherals step."""
+        with self.assertRaises(InvalidConfiguration):
+            ComputerShopFacade.order_computer(self.user, **dict(self.configs[0], peripherals=['trackball']))
+
+        self.client.force_login(self.user)
+        session = self.client.session
+        session[SessionWizardStore.SESSION_KEY] = dict(self.configs[0], peripherals=['monitor', 'trackball'])
+        session.save()
+        orders = Order.objects.count()
+        response = self.client.post('/shop/summary/')
+        self.assertRedirects(response, '/shop/peripherals/', fetch_redirect_response=False)
+        self.assertEqual(Order.objects.count(), orders)
+        response = self.client.get(response['Location'])
+        self.assertContains(response, 'Unknown peripherals: trackball.')
+
+
+class FulfillmentTests(TestCase):
+    """Tests for the fulfillment job queue and worker."""
+
+    def setUp(self):
+        self.user = User.objects.create_user(username='fulfilluser', password='testpass',
+                                             email='fulfill@example.com')
+        self.orders = ComputerShopFacade.order_computers_bulk(self.user, random_configurations(3, seed=5))
+
+    def drain(self, worker):
+        while worker.run_once():
+            pass
+
+    def test_placing_an_order_queues_the_first_step(self):
+        """Check that placed orders stay pending with their first step queued."""
+        order = ComputerShopFacade.order_computer(self.user, **random_configurations(1, seed=6)[0])
+        self.assertEqual(order.status, Order.PENDING)
+        job = FulfillmentJob.objects.get(order=order)
+        self.assertEqual((job.step, job.state), (PIPELINE[0][0], FulfillmentJob.QUEUED))
+        enqueue_fulfillment([order])
+        self.assertEqual(FulfillmentJob.objects.filter(order=order).count(), 1)
+
+    def test_worker_runs_every_step(self):
+        """Check that the worker completes orders and sends one email each."""
+        worker = FulfillmentWorker(batch_size=2)
+        self.drain(worker)
+        for order in self.orders:
+            order.refresh_from_db()
+            self.assertEqual(order.status, Order.COMPLETED)
+            self.assertEqual(order.status_version, 3)
+        self.assertEqual(FulfillmentJob.objects.filter(state=FulfillmentJob.DONE).count(), 3 * len(PIPELINE))
+        self.assertEqual(len(mail.outbox), 3)
+        self.assertEqual(worker.stats(), {'done': 9, 'retried': 0, 'failed': 0, 'lost': 0})
+
+    @override_settings(SHOP_FULFILLMENT_MAX_ATTEMPTS=2)
+    def test_failing_steps_are_retried_then_failed(self):
+        """Check that errors are retried after a backoff and fail the order after the last attempt."""
+        worker = FulfillmentWorker()
+        with patch.dict(STEPS, notify_customer=MagicMock(side_effect=ConnectionError('SMTP down'))), \
+                self.assertLogs('shop.fulfillment', 'WARNING'):
+            self.drain(worker)
+            retried = FulfillmentJob.objects.filter(step='notify_customer')
+            self.assertTrue(all(job.state == FulfillmentJob.QUEUED for job in retried))
+            self.assertTrue(all(job.run_at > timezone.now() for job in retried))
+            self.assertIn('SMTP down', retried[0].last_error)
+
+            retried.update(run_at=timezone.now())
+            self.drain(worker)
+        self.assertEqual(worker.stats()['retried'], 3)
+        self.assertEqual(worker.stats()['failed'], 3)
+        self.assertEqual(set(Order.objects.values_list('status', flat=True)), {Order.FAILED})
+        self.assertFalse(FulfillmentJob.objects.filter(step='complete_order').exists())
+
+    def test_steps_are_idempotent(self):
+        """Check that repeating a step is harmless and unexpected statuses fail permanently."""
+        order = Order.objects.select_related('computer').get(pk=self.orders[0].pk)
+        verify_payment(order)
+        verify_payment(order)
+        order.refresh_from_db()
+        self.assertEqual((order.status, order.status_version), (Order.PROCESSING, 2))
+
+        Order.objects.filter(pk=order.pk).set_status(Order.CANCELLED)
+        order.refresh_from_db()
+        with self.assertRaises(PermanentFulfillmentError):
+            complete_order(order)
+
+    def test_expired_leases_are_taken_over(self):
+        """Check that a job whose lease expired moves to another worker and runs to completion once."""
+        slow, fast = FulfillmentWorker(batch_size=1), FulfillmentWorker(batch_size=1)
+        job, = slow.claim()
+        FulfillmentJob.objects.filter(pk=job.pk).update(lease_expires_at=timezone.now() - timedelta(seconds=1))
+        taken, = fast.claim()
+        self.assertEqual((taken.pk, taken.attempts), (job.pk, 2))
+
+        self.assertEqual(slow.run_job(job), 'lost')
+        self.assertEqual(fast.run_job(taken), 'done')
+        self.assertEqual(Order.objects.get(pk=job.order_id).status, Order.PROCESSING)
+        self.assertEqual(FulfillmentJob.objects.filter(order_id=job.order_id, step='notify_customer').count(), 1)
+
+    def test_cancelled_orders_are_not_marked_failed(self):
+        """Check that failing the job of a cancelled order, or exhausting its lease, keeps it cancelled."""
+        worker = FulfillmentWorker(batch_size=1)
+        Order.objects.filter(pk__in=[order.pk for order in self.orders]).set_status(Order.CANCELLED)
+
+        job, = worker.claim()
+        self.assertEqual(worker.run_job(job), 'failed')
+        self.assertEqual(FulfillmentJob.objects.get(pk=job.pk).state, FulfillmentJob.FAILED)
+        self.assertEqual(Order.objects.get(pk=job.order_id).status, Order.CANCELLED)
+
+        job, = worker.claim()
+        FulfillmentJob.objects.filter(pk=job.pk).update(attempts=worker.max_attempts,
+                                                        lease_expires_at=timezone.now() - timedelta(seconds=1))
+        worker.claim()
+        self.assertEqual(FulfillmentJob.objects.get(pk=job.pk).state, FulfillmentJob.FAILED)
+        self.assertEqual(Order.objects.get(pk=job.order_id).status, Order.CANCELLED)
+
+    def test_retry_delay_grows_exponentially_up_to_the_cap(self):
+        """Check the backoff bounds."""
+        with override_settings(SHOP_FULFILLMENT_RETRY_DELAY=2, SHOP_FULFILLMENT_MAX_RETRY_DELAY=30):
+            for attempts, ceiling in ((1, 2), (2, 4), (3, 8), (10, 30)):
+                delay = retry_delay(attempts).total_seconds()
+                self.assertTrue(ceiling / 2 <= delay <= ceiling, (attempts, delay))
+
+
+class RetentionTests(TestCase):
+    """Tests for the chunked retention policies and command."""
+
+    def make_session(self, data, expires_in):
+        store = SessionStore()
+        store.update(data)
+        store.set_expiry(expires_in)
+        store.save()
+        return store.session_key
+
+    def test_expired_sessions_are_deleted_in_chunks(self):
+        """Check that only expired sessions are deleted, one DELETE per chunk."""
+        Session.objects.bulk_create(
+            Session(session_key=f'expired{index}', session_data='', expire_date=timezone.now() - timedelta(days=1))
+            for index in range(7)
+        )
+        live = {self.make_session({'k': 'v'}, 3600) for _ in range(3)}
+
+        dry = POLICIES['sessions'].run(chunk_size=2, dry_run=True)
+        self.assertEqual((dry.rows, dry.chunks, Session.objects.count()), (7, 4, 10))
+
+        counter = StatementCounter()
+        with connection.execute_wrapper(counter):
+            result = POLICIES['sessions'].run(chunk_size=2)
+        self.assertEqual((result.rows, result.chunks), (7, 4))
+        self.assertEqual(counter.writes('django_session'), 4)
+        self.assertEqual(set(Session.objects.values_list('pk', flat=True)), live)
+
+    def test_spent_confirmation_tokens_are_deleted(self):
+        """Check that used and expired tokens go and valid ones stay."""
+        user = User.objects.create_user(username='tokenretention', password='testpass')
+        valid = ConfirmationToken.objects.create(user=user)
+        ConfirmationToken.objects.create(user=user, is_used=True)
+        expired = ConfirmationToken.objects.create(user=user)
+        ConfirmationToken.objects.filter(pk=expired.pk).update(expires_at=timezone.now() - timedelta(minutes=1))
+
+        result = POLICIES['tokens'].run(chunk_size=500)
+        self.assertEqual(result.rows, 2)
+        self.assertEqual(list(ConfirmationToken.objects.all()), [valid])
+
+    @override_settings(SHOP_WIZARD_MAX_AGE=3600)
+    def test_abandoned_wizard_state_is_removed_from_live_sessions(self):
+        """Check that only configurations older than the wizard max age are dropped."""
+        now = int(time.time())
+        abandoned = self.make_session({'_auth_user_id': '1', SessionWizardStore.SESSION_KEY: {'case_type': 'Gaming'},
+                                       SessionWizardStore.SAVED_AT_KEY: now - 7200}, 3600)
+        recent = self.make_session({SessionWizardStore.SESSION_KEY: {'case_type': 'Office'},
+                                    SessionWizardStore.SAVED_AT_KEY: now - 60}, 3600)
+
+        self.assertEqual(POLICIES['wizard'].run(chunk_size=1, dry_run=True).rows, 1)
+        self.assertIn(SessionWizardStore.SESSION_KEY, SessionStore(abandoned).load())
+        self.assertEqual(POLICIES['wizard'].run(chunk_size=1).rows, 1)
+        self.assertEqual(SessionStore(abandoned).load(), {'_auth_user_id': '1', '_session_expiry': 3600})
+        self.assertIn(SessionWizardStore.SESSION_KEY, SessionStore(recent).load())
+
+    def test_wizard_state_without_timestamp_is_removed(self):
+        """Check that configurations saved before the timestamp existed are purged."""
+        legacy = self.make_session({'_auth_user_id': '1', SessionWizardStore.SESSION_KEY: {'case_type': 'Gaming'}},
+                                   3600)
+        unrelated = self.make_session({'_auth_user_id': '2'}, 3600)
+
+        self.assertEqual(POLICIES['wizard'].run(chunk_size=500).rows, 1)
+        self.assertEqual(SessionStore(legacy).load(), {'_auth_user_id': '1', '_session_expiry': 3600})
+        self.assertEqual(SessionStore(unrelated).load(), {'_auth_user_id': '2', '_session_expiry': 3600})
+
+    def test_command_reports_rows_per_second(self):
+        """Check the command output and policy validation."""
+        out = StringIO()
+        call_command('retention', 'sessions', 'tokens', '--dry-run', stdout=out)
+        self.assertIn('sessions: would purge 0 rows', out.getvalue())
+        self.assertIn('rows/s', out.getvalue())
+        with self.assertRaises(CommandError):
+            call_command('retention', 'logs')
+
+
+class LoadTestTests(TestCase):
+    """Tests for the load test flows and reports."""
+
+    def run_flows(self, users, login=False):
+        load_test = LoadTest(TestClientSession, users=users, concurrency=1, login=login)
+        if login:
+            load_test.create_users()
+        load_test.server.connect()
+        try:
+            for index in range(users):
+                load_test.run_flow(index)
+        finally:
+            load_test.server.disconnect()
+        return load_test.results(elapsed=1.0)
+
+    def test_register_flow_places_an_order(self):
+        """Check that a full flow succeeds and every view is measured with its queries."""
+        results = self.run_flows(2)
+        self.assertEqual(results['failed_flows'], 0)
+        self.assertEqual(Order.objects.filter(user__username__startswith='load').count(), 2)
+        self.assertIn('POST summary', results['views'])
+        self.assertIn('GET device_type_selection', results['views'])
+        for key, view in results['views'].items():
+            self.assertEqual((view['requests'], view['errors']), (2, 0), key)
+            self.assertIsNotNone(view['queries'], key)
+        self.assertEqual(results['requests'], 2 * (2 + 2 * len(WIZARD_STEPS) + 4))
+
+    def test_login_flow_and_comparison(self):
+        """Check the login flow, the JSON results file and the comparison report."""
+        results = self.run_flows(1, login=True)
+        self.assertEqual(results['failed_flows'], 0)
+        self.assertIn('POST login', results['views'])
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, 'results.json')
+            write_results(results, path)
+            with open(path) as saved:
+                baseline = json.load(saved)
+        lines = compare(results, baseline)
+        self.assertIn('(+0.0%)', lines[0])
+        self.assertEqual(len(lines), 1 + len(results['views']))
+
+
+class MetricsTests(TestCase):
+    """Tests for the per-view metrics middleware and the /metrics endpoint."""
+
+    def setUp(self):
+        metrics.reset()
+        self.user = User.objects.create_user(username='metricsuser', password='testpass')
+        self.staff = User.objects.create_user(username='metricsstaff', password='testpass', is_staff=True)
+
+    def series(self, name):
+        """Return the samples of a metric as a dict of label strings to values."""
+        samples = {}
+        for line in metrics.render_metrics().splitlines():
+            if line.startswith(name + '{'):
+                labels, value = line[len(name):].rsplit(' ', 1)
+                samples[labels] = float(value)
+        return samples
+
+    def test_records_requests_latency_and_queries_per_view(self):
+        """Check the request, histogram and SQL series of a view."""
+        self.client.force_login(self.user)
+        counter = StatementCounter()
+        with connection.execute_wrapper(counter):
+            self.client.get(reverse('my_orders'))
+            self.client.get(reverse('my_orders'))
+        self.client.get('/no-such-page/')
+
+        requests = self.series('shop_http_requests_total')
+        self.assertEqual(requests['{view="my_orders",method="GET",status="2xx"}'], 2)
+        self.assertEqual(requests['{view="<unmatched>",method="GET",status="4xx"}'], 1)
+        buckets = self.series('shop_http_request_duration_seconds_bucket')
+        self.assertEqual(buckets['{view="my_orders",method="GET",le="+Inf"}'], 2)
+        self.assertEqual(self.series('shop_db_queries_total')['{view="my_orders",method="GET"}'],
+                         len(counter.statements))
+        self.assertGreater(self.series('shop_db_query_seconds_total')['{view="my_orders",method="GET"}'], 0)
+
+    def test_wrapper_installed_inside_an_execute_wrapper_block(self):
+        """Check that a connection opened inside execute_wrapper() keeps record_sql after the block."""
+        fresh = connections.create_connection('default')
+        try:
+            def wrapper(execute, sql, params, many, context):
+                return execute(sql, params, many, context)
+            with fresh.execute_wrapper(wrapper):
+                fresh.ensure_connection()
+                self.assertEqual(fresh.execute_wrappers, [metrics.record_sql, wrapper])
+            self.assertEqual(fresh.execute_wrappers, [metrics.record_sql])
+        finally:
+            fresh.close()
+
+    def test_unknown_methods_share_one_label(self):
+        """Check that arbitrary request methods do not create new series."""
+        self.client.generic('PURGE', '/no-such-page/')
+        self.client.generic('X-ANYTHING', '/no-such-page/')
+        requests = self.series('shop_http_requests_total')
+        self.assertEqual(requests['{view="<unmatched>",method="OTHER",status="4xx"}'], 2)
+        self.assertFalse(any('PURGE' in labels for labels in requests))
+
+    async def test_counts_queries_of_async_requests(self):
+        """Check that queries run in sync_to_async threads are counted."""
+        await self.async_client.aforce_login(self.user)
+        response = await self.async_client.get(reverse('my_orders'))
+        self.assertEqual(response.status_code, 200)
+        queries = self.series('shop_db_queries_total')['{view="my_orders",method="GET"}']
+        self.assertGreater(queries, 0)
+
+    def test_threads_write_their_own_shards(self):
+        """Check that counters from several threads, including exited ones, are summed."""
+        def work():
+            for _ in range(100):
+                metrics.record('summary', 'POST', 302, 0.02, 3, 0.001)
+
+        threads = [threading.Thread(target=work) for _ in range(4)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        work()
+        stats = metrics.snapshot()[('summary', 'POST')]
+        self.assertEqual(stats.statuses, {'3xx': 500})
+        self.assertEqual(stats.queries, 1500)
+        self.assertEqual(sum(stats.buckets), 500)
+        self.assertEqual(metrics.snapshot()[('summary', 'POST')].queries, 1500)
+
+    @override_settings(SHOP_METRICS_TOKEN='scrape-secret')
+    def test_endpoint_is_staff_or_token_only(self):
+        """Check who may read /metrics and its content type."""
+        url = reverse('metrics')
+        self.assertEqual(self.client.get(url).status_code, 403)
+        self.assertEqual(self.client.get(url, HTTP_AUTHORIZATION='Bearer wrong').status_code, 403)
+        self.client.force_login(self.user)
+        self.assertEqual(self.client.get(url).status_code, 403)
+
+        self.client.force_login(self.staff)
+        response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response['Content-Type'].startswith('text/plain; version=0.0.4'))
+        self.assertIn(b'# TYPE shop_http_request_duration_seconds histogram', response.content)
+        self.assertIn(b'shop_fragment_cache_requests_total{result="hit"}', response.content)
+
+        self.client.logout()
+        response = self.client.get(url, HTTP_AUTHORIZATION='Bearer scrape-secret')
+        self.assertEqual(response.status_code, 200)
+
+
+def slow_view_work(seconds):
+    """Busy loop standing in for a slow view in the profiler tests."""
+    deadline = time.perf_counter() + seconds
+    while time.perf_counter() < deadline:
+        pass
+
+
+class ProfilerTests(TestCase):
+    """Tests for the sampling profiler middleware."""
+
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.directory = directory.name
+        self.staff = User.objects.create_user(username='profilestaff', password='testpass', is_staff=True)
+        self.user = User.objects.create_user(username='profileuser', password='testpass')
+
+    def middleware(self, **options):
+        def get_response(request):
+            slow_view_work(0.05)
+            request.resolver_match = resolve(reverse('registration_app:login'))
+            return HttpResponse('ok')
+
+        options = dict(SHOP_PROFILER_DIR=self.directory, SHOP_PROFILER_INTERVAL=0.001, **options)
+        with override_settings(**options):
+            return SamplingProfilerMiddleware(get_response)
+
+    def request(self, user, **headers):
+        request = RequestFactory().get('/', **headers)
+        request.user = user
+        return request
+
+    def profiles(self):
+        return sorted(os.listdir(self.directory))
+
+    def test_removed_from_stack_when_disabled(self):
+        """Check that the middleware is not used with both triggers off."""
+        with self.assertRaises(MiddlewareNotUsed):
+            self.middleware(SHOP_PROFILER_SAMPLE_RATE=0, SHOP_PROFILER_HEADER='')
+
+    def test_staff_header_writes_collapsed_stacks(self):
+        """Check the profile file, its stacks and the Server-Timing header."""
+        middleware = self.middleware(SHOP_PROFILER_SAMPLE_RATE=0, SHOP_PROFILER_HEADER='X-Profile')
+        response = middleware(self.request(self.staff, HTTP_X_PROFILE='1'))
+
+        profile_id = re.fullmatch(r'profile;desc="(\w+)";dur=[\d.]+', response['Server-Timing']).group(1)
+        [name] = self.profiles()
+        self.assertTrue(name.endswith(f'-registration_app.login-{profile_id}.collapsed'))
+        with open(os.path.join(self.directory, name)) as profile:
+            lines = profile.read().splitlines()
+        self.assertTrue(lines)
+        for line in lines:
+            stack, count = line.rsplit(' ', 1)
+            self.assertTrue(stack.startswith('registration_app:login;'))
+            self.assertGreater(int(count), 0)
+        self.assertTrue(any('slow_view_work (shop/tests.py:' in line for line in lines))
+
+    def test_header_ignored_for_non_staff(self):
+        """Check that other users cannot trigger profiles."""
+        middleware = self.middleware(SHOP_PROFILER_SAMPLE_RATE=0, SHOP_PROFILER_HEADER='X-Profile')
+        response = middleware(self.request(self.user, HTTP_X_PROFILE='1'))
+        self.assertNotIn('Server-Timing', response)
+        self.assertEqual(self.profiles(), [])
+
+    def test_sample_rate_and_rotation(self):
+        """Check that sampled requests are profiled and only the newest files are kept."""
+        middleware = self.middleware(SHOP_PROFILER_SAMPLE_RATE=1, SHOP_PROFILER_HEADER='',
+                                     SHOP_PROFILER_MAX_FILES=2)
+        ids = [middleware(self.request(self.user))['Server-Timing'].split('"')[1] for _ in range(3)]
+        self.assertEqual([name.rsplit('-', 1)[1] for name in self.profiles()],
+                         [f'{profile_id}.collapsed' for profile_id in ids[1:]])
+
+
+class StaticFilesTests(TestCase):
+    """Tests for the hashed, precompressed static files and their middleware."""
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.directory = tempfile.TemporaryDirectory()
+        cls.addClassCleanup(cls.directory.cleanup)
+        cls.root = cls.directory.name
+        with override_settings(STATIC_ROOT=cls.root):
+            call_command('collectstatic', interactive=False, verbosity=0)
+
+    def setUp(self):
+        settings_override = override_settings(STATIC_ROOT=self.root, DEBUG=False)
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+        self.url = staticfiles_storage.url('css/shop.css')
+        self.middleware = StaticFilesMiddleware(lambda request: HttpResponse('passed through'))
+
+    def get(self, path, method='get', **headers):
+        return self.middleware(getattr(RequestFactory(), method)(path, **headers))
+
+    def test_collectstatic_writes_hashed_names_and_gzip_copies(self):
+        """Check the manifest entry and that the gzip copy holds the same content."""
+        self.assertRegex(self.url, r'^/static/css/shop\.[0-9a-f]{12}\.css$')
+        path = os.path.join(self.root, self.url[len('/static/'):])
+        with open(path, 'rb') as original, gzip.open(path + '.gz') as compressed:
+            self.assertEqual(compressed.read(), original.read())
+        self.assertLess(os.path.getsize(path + '.gz'), os.path.getsize(path) / 2)
+
+    def test_hashed_files_are_immutable_and_precompressed(self):
+        """Check gzip negotiation and caching headers of a hashed file."""
+        response = self.get(self.url, HTTP_ACCEPT_ENCODING='br, gzip;q=0.8')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response['Content-Encoding'], 'gzip')
+        self.assertEqual(response['Content-Type'], 'text/css')
+        self.assertEqual(response['Cache-Control'], 'public, max-age=31536000, immutable')
+        self.assertEqual(response['Vary'], 'Accept-Encoding')
+        body = b''.join(response.streaming_content)
+        self.assertEqual(int(response['Content-Length']), len(body))
+        self.assertIn(b':root', gzip.decompress(body))
+
+        for accept_encoding in ('', 'gzip;q=0', 'identity'):
+            response = self.get(self.url, HTTP_ACCEPT_ENCODING=accept_encoding)
+            self.assertNotIn('Content-Encoding', response)
+            self.assertIn(b':root', b''.join(response.streaming_content))
+
+    def test_unhashed_files_are_revalidated(self):
+        """Check the short max-age and conditional requests for unhashed names."""
+        response = self.get('/static/css/shop.css')
+        self.assertEqual(response['Cache-Control'], 'public, max-age=60')
+        response.close()
+        response = self.get('/static/css/shop.css', HTTP_IF_MODIFIED_SINCE=response['Last-Modified'])
+        self.assertEqual(response.status_code, 304)
+
+    def test_other_requests_pass_through(self):
+        """Check that unknown files, traversal attempts and POSTs reach the app."""
+        for path, method in (('/static/css/missing.css', 'get'), ('/static/../manage.py', 'get'),
+                             (self.url, 'post'), ('/shop/', 'get')):
+            self.assertEqual(self.get(path, method=method).content, b'passed through')
+
+    def test_urls_fall_back_to_unhashed_names_without_manifest(self):
+        """Check that pages still render before collectstatic has run."""
+        with tempfile.TemporaryDirectory() as empty, override_settings(STATIC_ROOT=empty):
+            self.assertEqual(staticfiles_storage.url('css/shop.css'), '/static/css/shop.css')
+
+
+def pid_application(environ, start_response):
+    """WSGI application answering with the pid of the worker process."""
+    start_response('200 OK', [('Content-Type', 'text/plain')])
+    return [str(os.getpid()).encode()]
+
+
+@skipUnless(hasattr(os, 'fork'), 'The serve command needs os.fork().')
+class PreforkServerTests(TestCase):
+    """Tests for the pre-forking server behind the serve command."""
+
+    def get(self, port):
+        client = HTTPConnection('127.0.0.1', port, timeout=10)
+        try:
+            client.request('GET', '/')
+            response = client.getresponse()
+            return response.status, int(response.read())
+        finally:
+            client.close()
+
+    def test_check_loads_the_application(self):
+        """Check that --check imports the project application and exits."""
+        out = StringIO()
+        call_command('serve', '--check', stdout=out)
+        self.assertIn('Application loaded.', out.getvalue())
+
+    def test_workers_serve_recycle_and_stop(self):
+        """Check that forked workers serve, are replaced after max_requests and stop."""
+        sock = listen(('127.0.0.1', 0))
+        self.addCleanup(sock.close)
+        port = sock.getsockname()[1]
+        server = PreforkServer(pid_application, sock, workers=2, max_requests=3, timeout=10, graceful_timeout=5)
+        thread = threading.Thread(target=server.run)
+        thread.start()
+        try:
+            responses = [self.get(port) for _ in range(12)]
+        finally:
+            server.stop()
+            thread.join(timeout=30)
+        self.assertFalse(thread.is_alive())
+        self.assertEqual({status for status, _ in responses}, {200})
+        pids = {pid for _, pid in responses}
+        self.assertGreaterEqual(len(pids), 4)
+        self.assertNotIn(os.getpid(), pids)
+        self.assertEqual(server.workers, {})
+        for pid in pids:
+            with self.assertRaises(ProcessLookupError):
+                os.kill(pid, 0)
+
+    def test_status_reports_worker_health(self):
+        """Check the per-worker health reported through the heartbeats."""
+        sock = listen(('127.0.0.1', 0))
+        self.addCleanup(sock.close)
+        server = PreforkServer(pid_application, sock, workers=1, timeout=10, graceful_timeout=5)
+        thread = threading.Thread(target=server.run)
+        thread.start()
+        try:
+            _, pid = self.get(sock.getsockname()[1])
+            deadline = time.monotonic() + 10
+            while time.monotonic() < deadline and not server.status()['workers'][0]['requests']:
+                time.sleep(0.1)
+            status = server.status()
+        finally:
+            server.stop()
+            thread.join(timeout=30)
+        [worker] = status['workers']
+        self.assertEqual((worker['pid'], worker['requests']), (pid, 1))
+        self.assertEqual(status['master']['pid'], os.getpid())
+        if os.path.exists('/proc/self/smaps_rollup'):
+            self.assertGreater(worker['rss'], worker['private'])
+
+
+class SearchTests(TestCase):
+    """Tests for the budget-constrained configuration search."""
+
+    def brute_force(self, budget, objective, require, limit):
+        """Rank every configuration allowed by ``require`` with the builder."""
+        catalog = get_catalog()
+        primary, secondary = OBJECTIVES[objective](catalog), balanced_scores(catalog)
+        prices = catalog.prices
+        peripherals = list(prices['peripheral'])
+        options = [
+            require.get('case_type', list(prices['case'])),
+            require.get('processor', list(prices['processor'])),
+            require.get('memory', list(prices['memory'])),
+            require.get('storage', list(prices['storage'])),
+            require.get('graphics_card', list(prices['graphics'])),
+            require.get('color', list(prices['color'])),
+            [[name for bit, name in enumerate(peripherals) if mask & (1 << bit)]
+             for mask in range(1 << len(peripherals))],
+            [require['is_laptop']] if 'is_laptop' in require else [False, True],
+        ]
+        points = []
+        for values in itertools.product(*options):
+            config = dict(zip(('case_type', 'processor', 'memory', 'storage', 'graphics_card', 'color',
+                               'peripherals', 'is_laptop'), values))
+            price = price_with_builder(config)
+            if price <= budget:
+                points.append((price, tuple(sum(scores.get(key, {}).get(config[key], 0) for key in scores)
+                                            for scores in (primary, secondary))))
+        frontier = []
+        for price, score in sorted(points, key=lambda point: (point[0], tuple(-value for value in point[1]))):
+            if not frontier or score > frontier[-1][1]:
+                frontier.append((price, score))
+        return list(reversed(frontier[-limit:]))
+
+    def test_agrees_with_builder_brute_force(self):
+        """Check the results against ranking every configuration priced by the builder."""
+        require = {'case_type': ['Mini', 'Gaming'], 'memory': [8, 16, 32], 'color': ['Red'], 'is_laptop': True}
+        for objective in ('balanced', 'memory', 'graphics'):
+            for budget in (700, 1300, 2400):
+                with self.subTest(objective=objective, budget=budget):
+                    results = search_configurations(budget, require, objective, limit=4)
+                    self.assertEqual([(result['price'], (result['score'], result['tiers'])) for result in results],
+                                     self.brute_force(budget, objective, require, 4))
+                    for result in results:
+                        self.assertEqual(price_with_builder(result['configuration']), result['price'])
+
+    def test_requirements_and_errors(self):
+        """Check required components, an unaffordable budget and invalid queries."""
+        [best] = search_configurations(2000, {'processor': 'i9-12900K', 'peripherals': ['monitor', 'webcam']},
+                                       'memory', limit=1)
+        self.assertEqual(best['configuration']['processor'], 'i9-12900K')
+        self.assertEqual(best['configuration']['peripherals'], ['monitor', 'webcam'])
+        self.assertEqual(best['score'], 64)
+        self.assertEqual(search_configurations(100), [])
+        with self.assertRaises(ValueError):
+            search_configurations(1500, objective='cheapest')
+        with self.assertRaises(ValueError):
+            search_configurations(1500, {'price': 10})
+
+    def test_api(self):
+        """Check the search endpoint and its validation errors."""
+        response = self.client.get('/shop/api/search/', {
+            'budget': 1500, 'objective': 'graphics', 'memory': [16, 32], 'peripherals': 'monitor',
+            'is_laptop': 'true', 'limit': 2,
+        })
+        self.assertEqual(response.status_code, 200)
+        data = response.json()
+        self.assertEqual(data['results'], search_configurations(
+            1500, {'memory': [16, 32], 'peripherals': ['monitor'], 'is_laptop': True}, 'graphics', limit=2
+        ))
+        self.assertEqual([result['price'] for result in data['results']], [1490, 1470])
+        response = self.client.get('/shop/api/search/', {'budget': 'lots', 'objective': 'cheapest'})
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(set(response.json()['errors']), {'budget', 'objective'})
+
+    @override_settings(ROOT_URLCONF=ASYNC_URLCONF)
+    async def test_async_api(self):
+        """Check that the async view returns the same results."""
+        response = await self.async_client.get('/shop/api/search/', {'budget': 1200, 'objective': 'storage'})
+        self.assertEqual(response.status_code, 200)
+        expected = await sync_to_async(search_configurations)(1200, objective='storage')
+        self.assertEqual(response.json()['results'], expected)
+
+
+class ExportTests(TestCase):
+    """Tests for the streaming order export endpoint and command."""
+
+    url = '/shop/export/orders/'
+
+    def setUp(self):
+        self.staff = User.objects.create_user(username='accounting', password='testpass', is_staff=True)
+        self.alice = User.objects.create_user(username='alice', password='testpass', email='alice@example.com')
+        self.bob = User.objects.create_user(username='bob', password='testpass')
+        configs = random_configurations(3, seed=8)
+        self.orders = [ComputerShopFacade.order_computer(user, **config)
+                       for user, config in zip((self.alice, self.bob, self.alice), configs)]
+        Order.objects.filter(pk=self.orders[1].pk).set_status(Order.COMPLETED)
+        Order.objects.filter(pk=self.orders[2].pk).update(order_date=timezone.now() - timedelta(days=40))
+
+    def read(self, response):
+        return b''.join(response.streaming_content).decode()
+
+    def test_csv_export(self):
+        """Check that staff users get every order joined with its computer as CSV."""
+        self.client.force_login(self.staff)
+        response = self.client.get(self.url)
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response.streaming)
+        self.assertEqual(response['Content-Type'], 'text/csv; charset=utf-8')
+        self.assertIn('attachment; filename="orders-', response['Content-Disposition'])
+        rows = list(csv.DictReader(io.StringIO(self.read(response))))
+        self.assertEqual([int(row['order_id']) for row in rows], [order.pk for order in self.orders])
+        first, computer = rows[0], self.orders[0].computer
+        self.assertEqual((first['username'], first['email'], first['status']),
+                         ('alice', 'alice@example.com', 'Pending'))
+        self.assertEqual(first['processor'], computer.processor)
+        self.assertEqual(first['peripherals'], ';'.join(computer.peripherals))
+        self.assertEqual(first['price'], f'{computer.price:.2f}')
+
+    def test_jsonl_filters(self):
+        """Check the JSON Lines format and the date, status and user filters."""
+        self.client.force_login(self.staff)
+        since = (timezone.now() - timedelta(days=1)).isoformat()
+
+        def export(**params):
+            response = self.client.get(self.url, dict(params, format='jsonl'))
+            self.assertEqual(response['Content-Type'], 'application/x-ndjson; charset=utf-8')
+            return [json.loads(line) for line in self.read(response).splitlines()]
+
+        self.assertEqual([row['order_id'] for row in export(user='alice')], [self.orders[0].pk, self.orders[2].pk])
+        self.assertEqual([row['order_id'] for row in export(user=str(self.bob.pk))], [self.orders[1].pk])
+        self.assertEqual([row['order_id'] for row in export(since=since, user='alice')], [self.orders[0].pk])
+        self.assertEqual([row['order_id'] for row in export(until=since)], [self.orders[2].pk])
+        [row] = export(status='Completed')
+        self.assertEqual((row['order_id'], row['status']), (self.orders[1].pk, 'Completed'))
+        self.assertEqual(row['peripherals'], self.orders[1].computer.peripherals)
+        self.assertIsInstance(row['is_laptop'], bool)
+        self.assertEqual(len(export(status=['Completed', 'Pending'])), 3)
+
+    @override_settings(SHOP_EXPORT_CHUNK_SIZE=2)
+    def test_reads_in_chunks(self):
+        """Check that orders are read with one query per chunk."""
+        self.client.force_login(self.staff)
+        response = self.client.get(self.url)
+        with self.assertNumQueries(3):  # two chunks and the empty one ending the export
+            self.assertEqual(len(self.read(response).splitlines()), 4)
+
+    @override_settings(SHOP_EXPORT_TOKEN='partner-secret')
+    def test_access(self):
+        """Check that only staff users and token holders may export, with valid parameters."""
+        self.assertEqual(self.client.get(self.url).status_code, 403)
+        self.assertEqual(self.client.get(self.url, HTTP_AUTHORIZATION='Bearer wrong').status_code, 403)
+        self.client.force_login(self.alice)
+        self.assertEqual(self.client.get(self.url).status_code, 403)
+        self.client.logout()
+        response = self.client.get(self.url, HTTP_AUTHORIZATION='Bearer partner-secret')
+        self.assertEqual(len(self.read(response).splitlines()), 4)
+        self.client.force_login(self.staff)
+        response = self.client.get(self.url, {'format': 'xml', 'since': 'yesterday', 'status': 'Lost'})
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(set(response.json()['errors']), {'format', 'since', 'status'})
+
+    @override_settings(ROOT_URLCONF=ASYNC_URLCONF, SHOP_EXPORT_CHUNK_SIZE=2)
+    async def test_async_export(self):
+        """Check that the async view streams the same export."""
+        await self.async_client.aforce_login(self.staff)
+        response = await self.async_client.get(self.url, {'format': 'jsonl'})
+        self.assertEqual(response.status_code, 200)
+        content = b''.join([piece async for piece in response.streaming_content]).decode()
+        self.assertEqual([json.loads(line)['order_id'] for line in content.splitlines()],
+                         [order.pk for order in self.orders])
+
+    def test_command(self):
+        """Check that the command writes the filtered export to a file."""
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, 'orders.csv')
+            call_command('export_orders', '--user', 'alice', '--status', 'Pending', '--chunk-size', '1',
+                         '--output', path, stderr=StringIO())
+            with open(path, newline='') as exported:
+                rows = list(csv.DictReader(exported))
+        self.assertEqual([int(row['order_id']) for row in rows], [self.orders[0].pk, self.orders[2].pk])
+        out = StringIO()
+        call_command('export_orders', '--format', 'jsonl', stdout=out, stderr=StringIO())
+        self.assertEqual(len(out.getvalue().splitlines()), 3)
+        with self.assertRaises(CommandError):
+            call_command('export_orders', '--since', 'last week', stderr=StringIO())
+
+
+class AdminTests(QueryPlanAssertions, TestCase):
+    """Tests for the computer and order admins."""
+
+    def setUp(self):
+        self.admin = User.objects.create_superuser(username='admin', password='testpass', email='a@example.com')
+        self.customer = User.objects.create_user(username='customer', password='testpass')
+        self.client.force_login(self.admin)
+        self.orders = ComputerShopFacade.order_computers_bulk(self.customer, random_configurations(6, seed=3))
+
+    def changelist(self, model, params=None):
+        counter = StatementCounter()
+        with connection.execute_wrapper(counter):
+            response = self.client.get(reverse(f'admin:shop_{model}_changelist'), params or {})
+        self.assertEqual(response.status_code, 200)
+        return response, counter
+
+    def test_list_queries_do_not_grow_with_rows(self):
+        """Check that users and computers are joined into the list query."""
+        self.changelist('order')  # loads the cached user
+        for model in ('order', 'computer'):
+            _, few = self.changelist(model)
+            other = User.objects.create_user(username=f'other-{model}', password='testpass')
+            ComputerShopFacade.order_computers_bulk(other, random_configurations(20, seed=4))
+            response, more = self.changelist(model)
+            self.assertEqual(len(more.statements), len(few.statements), more.statements)
+            self.assertContains(response, 'other-' + model)
+
+    @override_settings(SHOP_ADMIN_COUNT_LIMIT=4)
+    def test_large_tables_are_not_counted(self):
+        """Check the estimated count of unfiltered lists and the capped count of filtered ones."""
+        response, counter = self.changelist('order')
+        self.assertEqual(response.context['cl'].result_count, max(order.pk for order in self.orders))
+        self.assertFalse([sql for sql in counter.statements if 'COUNT(' in sql.upper()], counter.statements)
+        response, _ = self.changelist('order', {'status': 'Pending'})
+        self.assertEqual(response.context['cl'].result_count, 4)
+        with override_settings(SHOP_ADMIN_COUNT_LIMIT=100):
+            response, _ = self.changelist('order', {'status': 'Pending'})
+        self.assertEqual(response.context['cl'].result_count, 6)
+
+    def test_filters(self):
+        """Check the status, device type and catalog processor filters."""
+        Order.objects.filter(pk=self.orders[0].pk).set_status(Order.COMPLETED)
+        response, _ = self.changelist('order', {'status': 'Completed'})
+        self.assertEqual([order.pk for order in response.context['cl'].result_list], [self.orders[0].pk])
+        processor = self.orders[1].computer.processor
+        response, counter = self.changelist('computer', {'processor': processor, 'is_laptop': '1'})
+        expected = Computer.objects.filter(processor=processor, is_laptop=True).order_by('-id')
+        self.assertEqual(list(response.context['cl'].result_list), list(expected))
+        self.assertFalse([sql for sql in counter.statements if 'DISTINCT' in sql.upper()], counter.statements)
+
+    @skipUnless(connection.vendor == 'sqlite', 'EXPLAIN QUERY PLAN checks need SQLite.')
+    def test_filtered_pages_use_indexes(self):
+        """Check that filtered pages are read in id order from the filter indexes."""
+        for queryset, index in (
+            (Order.objects.filter(status='Pending').order_by('-id'), 'order_status_idx'),
+            (Computer.objects.filter(processor='i5-12400').order_by('-id'), 'computer_processor_idx'),
+            (Computer.objects.filter(is_laptop__in=[True]).order_by('-id'), 'computer_is_laptop_idx'),
+        ):
+            plan = self.assertUsesIndexes(queryset[:100])
+            self.assertTrue(any(index in line for line in plan), plan)
+
+    def test_status_action_issues_one_update(self):
+        """Check that the bulk status action changes every selected order with one UPDATE."""
+        selected = [order.pk for order in self.orders[:4]]
+        counter = StatementCounter()
+        with connection.execute_wrapper(counter):
+            response = self.client.post(reverse('admin:shop_order_changelist'), {
+                'action': 'mark_cancelled', admin_helpers.ACTION_CHECKBOX_NAME: selected,
+            })
+        self.assertEqual(response.status_code, 302)
+        self.assertEqual(counter.writes('shop_order'), 1)
+        self.assertEqual(
+            list(Order.objects.filter(pk__in=selected).values_list('status', 'status_version').distinct()),
+            [(Order.CANCELLED, 2)],
+        )
+        self.assertEqual(Order.objects.filter(status=Order.PENDING).count(), 2)
+
+
+class StartupTests(TestCase):
+    """Tests for the startup profiles and the import time parser."""
+
+    def test_parse_importtime(self):
+        """Check that import self times are summed per top-level package."""
+        stderr = (
+            'import time: self [us] | cumulative | imported package\n'
+            'import time:       100 |        100 |     django.utils\n'
+            'import time:       250 |        350 |   django.conf\n'
+            'import time:        50 |         50 | shop\n'
+            'Traceback: unrelated\n'
+        )
+        self.assertEqual(parse_importtime(stderr), (400, {'django': 350, 'shop': 50}))
+
+    def test_fast_profile_leaves_out_dev_apps(self):
+        """Check the apps and middleware of both startup profiles."""
+        loaded = {}
+        for profile in ('fast', 'full'):
+            with patch.dict(os.environ, {'DJANGO_STARTUP_PROFILE': profile}):
+                loaded[profile] = runpy.run_path(str(settings.BASE_DIR / 'ARCH_2' / 'settings.py'))
+        fast, full = loaded['fast'], loaded['full']
+        self.assertEqual(fast['STARTUP_PROFILE'], 'fast')
+        self.assertFalse(set(fast['DEV_APPS']) & set(fast['INSTALLED_APPS']))
+        self.assertEqual(full['INSTALLED_APPS'], fast['INSTALLED_APPS'] + full['DEV_APPS'])
+        self.assertEqual(fast['MIDDLEWARE'], full['MIDDLEWARE'])
+
+
+@skipUnless(os.environ.get('SHOP_STARTUP_TESTS'),
+            'Starts manage.py processes; set SHOP_STARTUP_TESTS=1 to run.')
+class StartupBenchmarkTests(TestCase):
+    """Tests for the startup benchmark, which starts fresh processes."""
+
+    def test_fast_profile_starts_without_dev_apps(self):
+        """Check that the fast profile serves the first request without the dev-only apps."""
+        out = StringIO()
+        call_command('benchmark', 'startup', '--runs', '1', '--profile', 'fast', '--budget-ms', '60000',
+                     '--top', '1000', stdout=out)
+        self.assertIn('time to first resp.', out.getvalue())
+        self.assertNotIn('django_extensions', out.getvalue())
+        self.assertNotIn('pygments', out.getvalue())
+
+    def test_over_budget_fails(self):
+        """Check that a startup slower than the budget fails the benchmark."""
+        with self.assertRaisesMessage(CommandError, 'Startup regressed'):
+            call_command('benchmark', 'startup', '--runs', '1', '--budget-ms', '1', stdout=StringIO())
+
+
 if __name__ == "__main__":
     import unittest
     unittest.main()
\ No newline at end of file
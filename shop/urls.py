@@ -1,21 +1,35 @@
+from importlib import import_module
+
+from django.conf import settings
 from django.urls import path
-from . import views
 
 
+def shop_urlpatterns(views):
+    """
+    Return the shop URL patterns routed to a views module; shop.views and
+    shop.async_views provide the same views.
+    """
+    return [
+        path('', views.index, name='index'),
+        path('case/', views.case_selection, name='case_selection'),
+        path('processor/', views.processor_selection, name='processor_selection'),
+        path('memory/', views.memory_selection, name='memory_selection'),
+        path('storage/', views.storage_selection, name='storage_selection'),
+        path('graphics/', views.graphics_selection, name='graphics_selection'),
+        path('color/', views.color_selection, name='color_selection'),
+        path('peripherals/', views.peripherals_selection, name='peripherals_selection'),
+        path('device-type/', views.device_type_selection, name='device_type_selection'),
+        path('summary/', views.summary, name='summary'),
+        path('success/<int:order_id>/', views.order_success, name='order_success'),
+        path('my-orders/', views.my_orders, name='my_orders'),
+        path('order/<int:order_id>/', views.order_detail, name='order_detail'),
+        path('api/orders/', views.api_create_order, name='api_create_order'),
+        path('api/search/', views.api_search_configurations, name='api_search_configurations'),
+        path('export/orders/', views.export_orders, name='export_orders'),
+    ]
 
 
-urlpatterns = [
-    path('', views.index, name='index'),
-    path('case/', views.case_selection, name='case_selection'),
-    path('processor/', views.processor_selection, name='processor_selection'),
-    path('memory/', views.memory_selection, name='memory_selection'),
-    path('storage/', views.storage_selection, name='storage_selection'),
-    path('graphics/', views.graphics_selection, name='graphics_selection'),
-    path('color/', views.color_selection, name='color_selection'),
-    path('peripherals/', views.peripherals_selection, name='peripherals_selection'),
-    path('device-type/', views.device_type_selection, name='device_type_selection'),
-    path('summary/', views.summary, name='summary'),
-    path('success/<int:order_id>/', views.order_success, name='order_success'),
-    path('my-orders/', views.my_orders, name='my_orders'),
-    path('order/<int:order_id>/', views.order_detail, name='order_detail'),
-]
\ No newline at end of file
+# Only the views module in use is imported.
+urlpatterns = shop_urlpatterns(import_module(
+    'shop.async_views' if getattr(settings, 'SHOP_ASYNC_VIEWS', False) else 'shop.views'
+))
@@ -0,0 +1,44 @@
+from django.db import connections
+
+
+def explain_query_plan(queryset):
+    """
+    Return the SQLite EXPLAIN QUERY PLAN detail lines of a queryset.
+    """
+    connection = connections[queryset.db]
+    if connection.vendor != 'sqlite':
+        raise NotImplementedError("EXPLAIN QUERY PLAN is only available on SQLite.")
+    sql, params = queryset.query.sql_with_params()
+    with connection.cursor() as cursor:
+        cursor.execute(f'EXPLAIN QUERY PLAN {sql}', params)
+        return [row[-1] for row in cursor.fetchall()]
+
+
+def plan_problems(plan):
+    """
+    Return the plan lines showing a full table scan or a sort that no index serves.
+    """
+    return [
+        line for line in plan
+        if (line.startswith('SCAN ') and ' USING ' not in line) or line.startswith('USE TEMP B-TREE')
+    ]
+
+
+class QueryPlanAssertions:
+    """
+    TestCase mixin checking that key queries are answered through indexes.
+    """
+
+    def assertUsesIndexes(self, queryset):
+        """
+        Fail if the query plan of ``queryset`` scans a whole table or sorts
+        rows in a temporary b-tree.
+        """
+        plan = explain_query_plan(queryset)
+        problems = plan_problems(plan)
+        if problems:
+            self.fail(
+                f"Query is not fully served by indexes: {'; '.join(problems)}\n"
+                f"SQL: {queryset.query}\nPlan: {'; '.join(plan)}"
+            )
+        return plan
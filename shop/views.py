@@ -1,26 +1,34 @@
-from django.shortcuts import render, redirect, get_object_or_404
+import json
+from functools import partial
+
+from django.http import HttpResponseForbidden, JsonResponse, StreamingHttpResponse
+from django.shortcuts import render, redirect
 from django.contrib.auth.decorators import login_required
 from django.contrib import messages
 from .forms import (CaseSelectionForm, ProcessorSelectionForm, MemorySelectionForm,
                     StorageSelectionForm, GraphicsSelectionForm, ColorSelectionForm,
-                    PeripheralsSelectionForm, DeviceTypeSelectionForm)
-from .facade import ComputerShopFacade
-from .models import Order
-from .builder import ConcreteComputerBuilder
+                    PeripheralsSelectionForm, DeviceTypeSelectionForm, OrderConfigurationForm,
+                    ConfigurationSearchForm, OrderExportForm)
+from .export import CONTENT_TYPES, export_filename, export_queryset, has_export_token, stream_export
+from .facade import ComputerShopFacade, InvalidConfiguration
+from .fragments import render_computer_spec
+from .pricing import price_configuration
 from .utils.db import get_db_connection
+from .wizard import get_wizard_state, set_wizard_state, update_wizard_state, clear_wizard_state
 from django.views.decorators.http import require_safe
 from django.views.decorators.http import require_http_methods
+from django.views.decorators.http import require_POST
 
 @require_http_methods(["GET", "POST"])
 def check_computer_builder_session(request, key, redirect_url='case_selection'):
     """
-    Checks if a specific key exists in the 'computer_builder' session data.
+    Checks if a specific key exists in the wizard state of the current user.
     If the key is missing, redirects the user to the specified URL with an error message.
 
 
     """
     get_db_connection()
-    if key not in request.session.get('computer_builder', {}):
+    if key not in get_wizard_state(request):
         messages.error(request, "Please start from the beginning")
         return redirect(redirect_url)
     return None
@@ -40,14 +48,14 @@ def index(request):
 def case_selection(request):
     """
     Handles the case selection step in the computer building process.
-    Displays a form for selecting the case type and saves the selection to the session.
+    Displays a form for selecting the case type and saves the selection to the wizard state.
 
 
     """
     get_db_connection()
     form = CaseSelectionForm(request.POST or None)
     if request.method == 'POST' and form.is_valid():
-        request.session['computer_builder'] = {'case_type': form.cleaned_data['case_type']}
+        set_wizard_state(request, {'case_type': form.cleaned_data['case_type']})
         return redirect('processor_selection')
     return render(request, 'shop/case_selection.html', {'form': form})
 
@@ -56,7 +64,7 @@ def case_selection(request):
 def processor_selection(request):
     """
     Handles the processor selection step in the computer building process.
-    Displays a form for selecting the processor and saves the selection to the session.
+    Displays a form for selecting the processor and saves the selection to the wizard state.
     """
     result = check_computer_builder_session(request, 'case_type')
     if result:
@@ -64,8 +72,7 @@ def processor_selection(request):
 
     form = ProcessorSelectionForm(request.POST or None)
     if request.method == 'POST' and form.is_valid():
-        request.session['computer_builder']['processor'] = form.cleaned_data['processor']
-        request.session.modified = True
+        update_wizard_state(request, processor=form.cleaned_data['processor'])
         return redirect('memory_selection')
     return render(request, 'shop/processor_selection.html', {'form': form})
 
@@ -74,7 +81,7 @@ def processor_selection(request):
 def memory_selection(request):
     """
     Handles the memory selection step in the computer building process.
-    Displays a form for selecting the memory size and saves the selection to the session.
+    Displays a form for selecting the memory size and saves the selection to the wizard state.
 
 
     """
@@ -85,8 +92,7 @@ def memory_selection(request):
     form = MemorySelectionForm(request.POST or None)
     if form.is_valid():
         memory = form.cleaned_data['memory']
-        request.session['computer_builder']['memory'] = int(memory)
-        request.session.modified = True
+        update_wizard_state(request, memory=int(memory))
         return redirect('storage_selection')
     return render(request, 'shop/memory_selection.html', {'form': form})
 
@@ -95,7 +101,7 @@ def memory_selection(request):
 def storage_selection(request):
     """
     Handles the storage selection step in the computer building process.
-    Displays a form for selecting the storage size and saves the selection to the session.
+    Displays a form for selecting the storage size and saves the selection to the wizard state.
 
 
     """
@@ -106,8 +112,7 @@ def storage_selection(request):
     form = StorageSelectionForm(request.POST or None)
     if form.is_valid():
         storage = form.cleaned_data['storage']
-        request.session['computer_builder']['storage'] = int(storage)
-        request.session.modified = True
+        update_wizard_state(request, storage=int(storage))
         return redirect('graphics_selection')
     return render(request, 'shop/storage_selection.html', {'form': form})
 
@@ -116,7 +121,7 @@ def storage_selection(request):
 def graphics_selection(request):
     """
     Handles the graphics card selection step in the computer building process.
-    Displays a form for selecting the graphics card and saves the selection to the session.
+    Displays a form for selecting the graphics card and saves the selection to the wizard state.
 
 
     """
@@ -126,8 +131,7 @@ def graphics_selection(request):
 
     form = GraphicsSelectionForm(request.POST or None)
     if form.is_valid():
-        request.session['computer_builder']['graphics_card'] = form.cleaned_data['graphics_card']
-        request.session.modified = True
+        update_wizard_state(request, graphics_card=form.cleaned_data['graphics_card'])
         return redirect('color_selection')
     return render(request, 'shop/graphics_selection.html', {'form': form})
 
@@ -136,7 +140,7 @@ def graphics_selection(request):
 def color_selection(request):
     """
     Handles the color selection step in the computer building process.
-    Displays a form for selecting the color and saves the selection to the session.
+    Displays a form for selecting the color and saves the selection to the wizard state.
 
     """
     result = check_computer_builder_session(request, 'case_type')
@@ -145,8 +149,7 @@ def color_selection(request):
 
     form = ColorSelectionForm(request.POST or None)
     if form.is_valid():
-        request.session['computer_builder']['color'] = form.cleaned_data['color']
-        request.session.modified = True
+        update_wizard_state(request, color=form.cleaned_data['color'])
         return redirect('peripherals_selection')
     return render(request, 'shop/color_selection.html', {'form': form})
 
@@ -155,7 +158,7 @@ def color_selection(request):
 def peripherals_selection(request):
     """
     Handles the peripherals selection step in the computer building process.
-    Displays a form for selecting peripherals and saves the selection to the session.
+    Displays a form for selecting peripherals and saves the selection to the wizard state.
 
     """
     result = check_computer_builder_session(request, 'case_type')
@@ -165,8 +168,7 @@ def peripherals_selection(request):
     form = PeripheralsSelectionForm(request.POST or None)
     if form.is_valid():
         peripherals = [key for key, value in form.cleaned_data.items() if value]
-        request.session['computer_builder']['peripherals'] = peripherals
-        request.session.modified = True
+        update_wizard_state(request, peripherals=peripherals)
         return redirect('device_type_selection')
     return render(request, 'shop/peripherals_selection.html', {'form': form})
 
@@ -175,7 +177,7 @@ def peripherals_selection(request):
 def device_type_selection(request):
     """
     Handles the device type selection step in the computer building process.
-    Displays a form for selecting the device type (laptop or desktop) and saves the selection to the session.
+    Displays a form for selecting the device type (laptop or desktop) and saves the selection to the wizard state.
 
     """
     result = check_computer_builder_session(request, 'case_type')
@@ -184,8 +186,7 @@ def device_type_selection(request):
 
     form = DeviceTypeSelectionForm(request.POST or None)
     if form.is_valid():
-        request.session['computer_builder']['is_laptop'] = form.cleaned_data['is_laptop']
-        request.session.modified = True
+        update_wizard_state(request, is_laptop=form.cleaned_data['is_laptop'])
         return redirect('summary')
     return render(request, 'shop/device_type_selection.html', {'form': form})
 
@@ -202,13 +203,15 @@ def summary(request):
         return result
 
     if request.method == 'POST':
-        computer = ComputerShopFacade.create_computer(request.user, **request.session['computer_builder'])
-        order = ComputerShopFacade.place_order(request.user, computer)
-        del request.session['computer_builder']
+        try:
+            order = ComputerShopFacade.order_computer(request.user, **get_wizard_state(request))
+        except InvalidConfiguration as exc:
+            messages.error(request, f"{exc} Please choose your peripherals again.")
+            return redirect('peripherals_selection')
+        clear_wizard_state(request)
         return redirect('order_success', order_id=order.id)
 
-    builder = ConcreteComputerBuilder()
-    config = request.session['computer_builder']
+    config = get_wizard_state(request)
 
     try:
         memory = int(config['memory'])
@@ -217,19 +220,19 @@ def summary(request):
         memory = 8
         storage = 512
 
-    computer_preview = (builder.build_case(config['case_type'])
-                        .install_processor(config['processor'])
-                        .install_memory(memory)
-                        .install_storage(storage)
-                        .install_graphics(config['graphics_card'])
-                        .apply_color(config['color'])
-                        .add_peripherals(config['peripherals'])
-                        .set_device_type(config['is_laptop'])
-                        .calculate_price()
-                        .get_computer())
+    estimated_price = price_configuration({
+        'case_type': config['case_type'],
+        'processor': config['processor'],
+        'memory': memory,
+        'storage': storage,
+        'graphics_card': config['graphics_card'],
+        'color': config['color'],
+        'peripherals': config['peripherals'],
+        'is_laptop': config['is_laptop'],
+    })
 
     context = config.copy()
-    context['estimated_price'] = computer_preview['price']
+    context['estimated_price'] = estimated_price
 
     return render(request, 'shop/summary.html', context)
 
@@ -242,9 +245,11 @@ def order_success(request, order_id):
 
     """
     get_db_connection()
-    order = get_object_or_404(Order, id=order_id, user=request.user)
-    computer_details = ComputerShopFacade.get_computer_details(order.computer.id)
-    return render(request, 'shop/order_success.html', {'order': order, 'computer': computer_details})
+    order = ComputerShopFacade.get_order(request.user, order_id)
+    return render(request, 'shop/order_success.html', {
+        'order': order,
+        'computer_spec': render_computer_spec(order, partial(ComputerShopFacade.get_order_computer_details, order)),
+    })
 
 @require_http_methods(["GET", "POST"])
 @login_required
@@ -254,16 +259,7 @@ def my_orders(request):
 
     """
     get_db_connection()
-    orders = ComputerShopFacade.get_user_orders(request.user)
-
-    enhanced_orders = []
-    for order in orders:
-        computer_details = ComputerShopFacade.get_computer_details(order.computer.id)
-        enhanced_orders.append({
-            'order': order,
-            'computer': computer_details
-        })
-
+    enhanced_orders = ComputerShopFacade.get_user_orders_with_details(request.user)
     return render(request, 'shop/my_orders.html', {'enhanced_orders': enhanced_orders})
 
 @require_http_methods(["GET", "POST"])
@@ -273,6 +269,80 @@ def order_detail(request, order_id):
     Displays the details of a specific order.
     """
     get_db_connection()
-    order = get_object_or_404(Order, id=order_id, user=request.user)
-    computer_details = ComputerShopFacade.get_computer_details(order.computer.id)
-    return render(request, 'shop/order_detail.html', {'order': order, 'computer': computer_details})
\ No newline at end of file
+    order = ComputerShopFacade.get_order(request.user, order_id)
+    return render(request, 'shop/order_detail.html', {
+        'order': order,
+        'computer_spec': render_computer_spec(order, partial(ComputerShopFacade.get_order_computer_details, order)),
+    })
+
+@require_POST
+def api_create_order(request):
+    """
+    Creates a computer from a JSON configuration and places an order for it in
+    one request. Validates against the same choices as the wizard forms and
+    responds with the order id and price. Uses the session login, so clients
+    send the csrftoken cookie value in the X-CSRFToken header (see README).
+
+    """
+    if not request.user.is_authenticated:
+        return JsonResponse({'error': 'Authentication required.'}, status=401)
+
+    try:
+        payload = json.loads(request.body)
+    except (ValueError, UnicodeDecodeError):
+        return JsonResponse({'error': 'Request body must be valid JSON.'}, status=400)
+    if not isinstance(payload, dict):
+        return JsonResponse({'error': 'Request body must be a JSON object.'}, status=400)
+
+    form = OrderConfigurationForm(payload)
+    if not form.is_valid():
+        return JsonResponse({'errors': form.errors.get_json_data()}, status=400)
+
+    get_db_connection()
+    try:
+        order = ComputerShopFacade.order_computer(request.user, **form.get_configuration())
+    except InvalidConfiguration as exc:
+        return JsonResponse({'error': str(exc)}, status=400)
+    return JsonResponse(
+        {'order_id': order.id, 'price': order.computer.price, 'status': order.status},
+        status=201
+    )
+
+
+@require_safe
+def api_search_configurations(request):
+    """
+    Returns the best configurations within a budget as JSON, e.g.
+    ``?budget=1500&objective=memory&processor=i7-12700K&peripherals=monitor``.
+    Component parameters may repeat to allow several components.
+    """
+    form = ConfigurationSearchForm(request.GET)
+    if not form.is_valid():
+        return JsonResponse({'errors': form.errors.get_json_data()}, status=400)
+    search = form.get_search()
+    return JsonResponse({
+        'budget': search['budget'],
+        'objective': search['objective'],
+        'results': ComputerShopFacade.search_configurations(**search),
+    })
+
+
+@require_safe
+def export_orders(request):
+    """
+    Streams orders joined with their computers as CSV (default) or JSON
+    Lines, filtered by ``since``, ``until``, ``status`` and ``user``, e.g.
+    ``?format=jsonl&since=2025-01-01&until=2025-02-01&status=Completed``.
+    For staff users or partners sending
+    ``Authorization: Bearer <SHOP_EXPORT_TOKEN>``; see shop.export.
+    """
+    if not has_export_token(request) and not (request.user.is_active and request.user.is_staff):
+        return HttpResponseForbidden()
+    form = OrderExportForm(request.GET)
+    if not form.is_valid():
+        return JsonResponse({'errors': form.errors.get_json_data()}, status=400)
+    output_format, filters = form.get_export()
+    response = StreamingHttpResponse(stream_export(export_queryset(**filters), output_format),
+                                     content_type=CONTENT_TYPES[output_format])
+    response.headers['Content-Disposition'] = f'attachment; filename="{export_filename(output_format)}"'
+    return response
@@ -0,0 +1,212 @@
+import time
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction, sync_to_async
+from django.conf import settings
+from django.core import signing
+from django.core.cache import caches
+
+
+class WizardStore:
+    """
+    Base class for storing the in-progress computer configuration of a user.
+    Stores that do blocking I/O are called from async code through sync_to_async.
+    """
+    blocking = True
+
+    def load(self, request):
+        """
+        Return the stored configuration dict, or an empty dict.
+        """
+        raise NotImplementedError
+
+    def save(self, request, response, state):
+        """
+        Persist the configuration dict; an empty dict clears it.
+        """
+        raise NotImplementedError
+
+
+class SessionWizardStore(WizardStore):
+    """
+    Keeps the configuration in the Django session (one session write per step).
+    The save time is stored next to it so the retention command can drop
+    configurations abandoned for longer than SHOP_WIZARD_MAX_AGE.
+    """
+    SESSION_KEY = 'computer_builder'
+    SAVED_AT_KEY = 'computer_builder_saved_at'
+
+    def load(self, request):
+        return request.session.get(self.SESSION_KEY, {})
+
+    def save(self, request, response, state):
+        if state:
+            request.session[self.SESSION_KEY] = state
+            request.session[self.SAVED_AT_KEY] = int(time.time())
+        else:
+            request.session.pop(self.SESSION_KEY, None)
+            request.session.pop(self.SAVED_AT_KEY, None)
+
+
+class SignedCookieWizardStore(WizardStore):
+    """
+    Keeps the configuration in a compact signed cookie bound to the user.
+    The server stores nothing, so wizard steps cause no database writes.
+    """
+    blocking = False
+    COOKIE_NAME = 'shop_wizard'
+    SALT = 'shop.wizard'
+
+    def load(self, request):
+        value = request.COOKIES.get(self.COOKIE_NAME)
+        if not value:
+            return {}
+        try:
+            payload = signing.loads(value, salt=self.SALT, max_age=_max_age())
+        except signing.BadSignature:
+            return {}
+        if payload.get('u') != request.user.pk:
+            return {}
+        return payload.get('s', {})
+
+    def save(self, request, response, state):
+        if not state:
+            response.delete_cookie(self.COOKIE_NAME, samesite=settings.SESSION_COOKIE_SAMESITE)
+            return
+        response.set_cookie(
+            self.COOKIE_NAME,
+            signing.dumps({'u': request.user.pk, 's': state}, salt=self.SALT, compress=True),
+            max_age=_max_age(),
+            secure=settings.SESSION_COOKIE_SECURE,
+            httponly=True,
+            samesite=settings.SESSION_COOKIE_SAMESITE,
+        )
+
+
+class CacheWizardStore(WizardStore):
+    """
+    Keeps the configuration in a cache keyed by user.
+    Writes are deferred to the end of the request and skipped when nothing
+    changed. Use a shared cache backend when running several processes.
+    """
+    KEY_PREFIX = 'shop:wizard:'
+
+    def load(self, request):
+        return self._cache().get(self._key(request), {})
+
+    def save(self, request, response, state):
+        if state:
+            self._cache().set(self._key(request), state, _max_age())
+        else:
+            self._cache().delete(self._key(request))
+
+    def _cache(self):
+        return caches[getattr(settings, 'SHOP_WIZARD_CACHE_ALIAS', 'default')]
+
+    def _key(self, request):
+        return f'{self.KEY_PREFIX}{request.user.pk}'
+
+
+WIZARD_STORES = {
+    'session': SessionWizardStore,
+    'cookie': SignedCookieWizardStore,
+    'cache': CacheWizardStore,
+}
+
+
+def _max_age():
+    return getattr(settings, 'SHOP_WIZARD_MAX_AGE', 60 * 60 * 24)
+
+
+def get_wizard_store():
+    """
+    Return the store selected by the SHOP_WIZARD_STORE setting.
+    """
+    return WIZARD_STORES[getattr(settings, 'SHOP_WIZARD_STORE', 'cookie')]()
+
+
+def get_wizard_state(request):
+    """
+    Return the configuration of the current request, loading it once.
+    """
+    if not hasattr(request, '_wizard_state'):
+        store = get_wizard_store()
+        _attach_wizard_state(request, store, store.load(request))
+    return request._wizard_state
+
+
+async def aget_wizard_state(request):
+    """
+    Async variant of get_wizard_state(). Once it has been awaited, the other
+    helpers of this module no longer block and can be called from async views.
+    """
+    if not hasattr(request, '_wizard_state'):
+        store = get_wizard_store()
+        if store.blocking:
+            state = await sync_to_async(store.load)(request)
+        else:
+            state = store.load(request)
+        _attach_wizard_state(request, store, state)
+    return request._wizard_state
+
+
+def _attach_wizard_state(request, store, state):
+    request._wizard_store = store
+    request._wizard_state = state
+    request._wizard_modified = False
+
+
+def set_wizard_state(request, state):
+    """
+    Replace the configuration; it is persisted when the response is sent.
+    """
+    get_wizard_state(request)
+    request._wizard_state = state
+    request._wizard_modified = True
+
+
+def update_wizard_state(request, **values):
+    """
+    Add or change values of the configuration.
+    """
+    state = dict(get_wizard_state(request))
+    state.update(values)
+    set_wizard_state(request, state)
+
+
+def clear_wizard_state(request):
+    """
+    Remove the configuration once the order has been placed.
+    """
+    set_wizard_state(request, {})
+
+
+class WizardStateMiddleware:
+    """
+    Persist wizard state changes made while handling the request.
+    Must come after AuthenticationMiddleware. Supports sync and async stacks.
+    """
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(self.get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        response = self.get_response(request)
+        if getattr(request, '_wizard_modified', False):
+            request._wizard_store.save(request, response, request._wizard_state)
+        return response
+
+    async def __acall__(self, request):
+        response = await self.get_response(request)
+        if getattr(request, '_wizard_modified', False):
+            store = request._wizard_store
+            if store.blocking:
+                await sync_to_async(store.save)(request, response, request._wizard_state)
+            else:
+                store.save(request, response, request._wizard_state)
+        return response